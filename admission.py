@@ -0,0 +1,279 @@
+"""
+Controle de admissão dos uploads
+Limita quantas requisições de upload processam PDFs ao mesmo tempo e
+quantas podem esperar por uma vaga; o restante recebe 503 na hora, com
+Retry-After, em vez de acumular até o worker estourar o tempo limite. Cada
+IP tem ainda um balde de fichas (token bucket): rajadas acima do limite
+recebem 429.
+
+As vagas e os lugares na fila são arquivos com trava exclusiva (flock) em
+ADMISSION_FOLDER, compartilhados por todos os workers do servidor e
+liberados pelo sistema se um processo morrer. Sem fcntl (Windows), o
+limite vale por processo. Os baldes por IP ficam na memória de cada
+processo: com N workers, um cliente pode chegar a N vezes o limite.
+A contagem de vagas ocupadas (/api/stats) lê /proc/locks, sem travar as
+vagas. No modo assíncrono, a vaga acompanha o job até o fim da extração.
+
+Configuração:
+    ADMISSION_ENABLED           ativa o controle (padrão 1)
+    MAX_CONCURRENT_EXTRACTIONS  uploads processados ao mesmo tempo (padrão: núcleos)
+    ADMISSION_QUEUE_SIZE        uploads aguardando vaga (padrão: 2x as vagas)
+    ADMISSION_QUEUE_TIMEOUT     espera máxima por uma vaga, em segundos (padrão 10)
+    RATE_LIMIT_PER_MINUTE       uploads por minuto por IP (padrão 60; 0 desativa)
+    RATE_LIMIT_BURST            rajada permitida por IP (padrão 10)
+"""
+
+import os
+import math
+import time
+import random
+import threading
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    FCNTL_AVAILABLE = False
+
+ADMISSION_ENABLED = os.environ.get('ADMISSION_ENABLED', '1').lower() not in ('0', 'false', 'nao', 'não')
+ADMISSION_FOLDER = os.environ.get('ADMISSION_FOLDER', 'admissao')
+MAX_CONCURRENT_EXTRACTIONS = int(os.environ.get('MAX_CONCURRENT_EXTRACTIONS', os.cpu_count() or 1))
+ADMISSION_QUEUE_SIZE = int(os.environ.get('ADMISSION_QUEUE_SIZE', 2 * MAX_CONCURRENT_EXTRACTIONS))
+ADMISSION_QUEUE_TIMEOUT = float(os.environ.get('ADMISSION_QUEUE_TIMEOUT', 10))
+RATE_LIMIT_PER_MINUTE = float(os.environ.get('RATE_LIMIT_PER_MINUTE', 60))
+RATE_LIMIT_BURST = float(os.environ.get('RATE_LIMIT_BURST', 10))
+
+# Travas ativas de todo o sistema (Linux), lidas para contar vagas sem disputá-las
+PROC_LOCKS = '/proc/locks'
+
+# Baldes sem uso há mais tempo que isso são descartados quando há muitos IPs
+BUCKET_IDLE_SECONDS = 600
+MAX_BUCKETS = 10000
+
+# Arquivos de vaga abertos neste processo. Um fork (workers do sandbox, pool
+# de extração) herda os descritores e manteria a trava viva no filho.
+_held = set()
+_held_lock = threading.Lock()
+
+
+def _close_inherited():
+    for handle in list(_held):
+        handle.close()
+    _held.clear()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_close_inherited)
+
+
+class RateLimiter:
+    """Balde de fichas por chave (IP): `rate` fichas por segundo, no máximo `burst`"""
+
+    def __init__(self, per_minute=RATE_LIMIT_PER_MINUTE, burst=RATE_LIMIT_BURST):
+        self.rate = per_minute / 60.0
+        self.burst = max(burst, 1.0)
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def take(self, key):
+        """Consome uma ficha; retorna 0 se permitido ou os segundos até a próxima ficha"""
+        if self.rate <= 0:
+            return 0
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.get(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                wait = 0
+            else:
+                self._buckets[key] = (tokens, now)
+                wait = (1 - tokens) / self.rate
+            if len(self._buckets) > MAX_BUCKETS:
+                self._prune(now)
+        return wait
+
+    def _prune(self, now):
+        for key, (_, last) in list(self._buckets.items()):
+            if now - last > BUCKET_IDLE_SECONDS:
+                del self._buckets[key]
+
+
+def _flock_holders():
+    """(major, minor, inode) dos arquivos com flock concedido; None sem /proc/locks"""
+    try:
+        with open(PROC_LOCKS, 'r') as f:
+            lines = f.readlines()
+    except OSError:
+        return None
+    held = set()
+    for line in lines:
+        # "1: FLOCK  ADVISORY  WRITE 1234 fe:00:13533247 0 EOF"; quem espera aparece como "1: -> FLOCK ..."
+        fields = line.split()
+        if len(fields) < 6 or fields[1] != 'FLOCK':
+            continue
+        major, minor, inode = fields[5].split(':')
+        held.add((int(major, 16), int(minor, 16), int(inode)))
+    return held
+
+
+class _SlotFiles:
+    """Conjunto de N vagas entre processos: cada vaga é um arquivo com flock"""
+
+    def __init__(self, directory, prefix, size):
+        self.paths = [os.path.join(directory, f"{prefix}_{i}.lock") for i in range(size)]
+
+    def try_acquire(self):
+        """Trava uma vaga livre; retorna o arquivo aberto (a vaga) ou None"""
+        start = random.randrange(len(self.paths)) if self.paths else 0
+        for i in range(len(self.paths)):
+            handle = open(self.paths[(start + i) % len(self.paths)], 'a')
+            try:
+                fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                handle.close()
+                continue
+            with _held_lock:
+                _held.add(handle)
+            return handle
+        return None
+
+    @staticmethod
+    def release(handle):
+        with _held_lock:
+            _held.discard(handle)
+        handle.close()  # Fechar o arquivo libera o flock
+
+    def in_use(self):
+        """Vagas ocupadas neste momento (por qualquer processo), sem tomar as vagas
+
+        Com /proc/locks, nenhuma trava é feita. Sem ele, cada vaga é testada
+        com uma trava compartilhada desfeita em seguida: uma aquisição no mesmo
+        instante pula essa vaga, mas nenhuma consulta a mantém presa.
+        """
+        holders = _flock_holders()
+        busy = 0
+        for path in self.paths:
+            if holders is not None:
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                busy += (os.major(st.st_dev), os.minor(st.st_dev), st.st_ino) in holders
+                continue
+            with open(path, 'a') as handle:
+                try:
+                    fcntl.flock(handle, fcntl.LOCK_SH | fcntl.LOCK_NB)
+                except OSError:
+                    busy += 1
+        return busy
+
+
+class _Slot:
+    """Vaga obtida; release() devolve a vaga (idempotente)"""
+
+    def __init__(self, controller, handle):
+        self._controller = controller
+        self._handle = handle
+        self.started = time.monotonic()
+
+    def release(self):
+        if self._controller is not None:
+            self._controller._release(self)
+            self._controller = None
+
+
+class AdmissionController:
+    """Vagas de processamento e fila de espera limitadas, compartilhadas entre processos"""
+
+    def __init__(self, max_concurrent=MAX_CONCURRENT_EXTRACTIONS, queue_size=ADMISSION_QUEUE_SIZE,
+                 queue_timeout=ADMISSION_QUEUE_TIMEOUT, directory=ADMISSION_FOLDER):
+        self.max_concurrent = max(max_concurrent, 1)
+        self.queue_size = max(queue_size, 0)
+        self.queue_timeout = queue_timeout
+        # Duração média de um upload admitido (média móvel), para o Retry-After
+        self._service_time = 1.0
+        self._lock = threading.Lock()
+        if FCNTL_AVAILABLE:
+            os.makedirs(directory, exist_ok=True)
+            self._slots = _SlotFiles(directory, 'vaga', self.max_concurrent)
+            self._queue = _SlotFiles(directory, 'fila', self.queue_size)
+        else:
+            self._semaphore = threading.BoundedSemaphore(self.max_concurrent)
+            self._waiting = 0
+
+    def retry_after(self, waiting=None):
+        """Segundos sugeridos até haver vaga: duração média x filas de espera à frente"""
+        waiting = self.queue_size if waiting is None else waiting
+        estimate = self._service_time * (waiting / self.max_concurrent + 1)
+        return int(min(max(math.ceil(estimate), 1), 60))
+
+    def acquire(self, on_wait=None):
+        """Obtém uma vaga, esperando na fila se preciso
+
+        Retorna (vaga, None) ou, se a fila estiver cheia ou a espera passar de
+        queue_timeout, (None, motivo) com motivo 'fila_cheia' ou 'tempo_fila'.
+        on_wait(delta) é chamado com +1 ao entrar na fila e -1 ao sair.
+        """
+        if not FCNTL_AVAILABLE:
+            return self._acquire_local(on_wait)
+        handle = self._slots.try_acquire()
+        if handle is not None:
+            return _Slot(self, handle), None
+
+        place = self._queue.try_acquire() if self.queue_size else None
+        if place is None:
+            return None, 'fila_cheia'
+        if on_wait:
+            on_wait(1)
+        try:
+            deadline = time.monotonic() + self.queue_timeout
+            delay = 0.005
+            while True:
+                handle = self._slots.try_acquire()
+                if handle is not None:
+                    return _Slot(self, handle), None
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None, 'tempo_fila'
+                time.sleep(min(delay, remaining))
+                delay = min(delay * 2, 0.05)
+        finally:
+            _SlotFiles.release(place)
+            if on_wait:
+                on_wait(-1)
+
+    def _acquire_local(self, on_wait):
+        with self._lock:
+            if self._semaphore.acquire(blocking=False):
+                return _Slot(self, None), None
+            if self._waiting >= self.queue_size:
+                return None, 'fila_cheia'
+            self._waiting += 1
+        if on_wait:
+            on_wait(1)
+        try:
+            if not self._semaphore.acquire(timeout=self.queue_timeout):
+                return None, 'tempo_fila'
+            return _Slot(self, None), None
+        finally:
+            with self._lock:
+                self._waiting -= 1
+            if on_wait:
+                on_wait(-1)
+
+    def _release(self, slot):
+        elapsed = time.monotonic() - slot.started
+        with self._lock:
+            self._service_time = 0.8 * self._service_time + 0.2 * elapsed
+        if slot._handle is not None:
+            _SlotFiles.release(slot._handle)
+        elif not FCNTL_AVAILABLE:
+            self._semaphore.release()
+
+    def state(self):
+        """Vagas ocupadas e uploads na fila (todos os processos, com flock)"""
+        if FCNTL_AVAILABLE:
+            return {'vagas': self.max_concurrent, 'em_processamento': self._slots.in_use(),
+                    'fila_maxima': self.queue_size, 'na_fila': self._queue.in_use()}
+        return {'vagas': self.max_concurrent, 'fila_maxima': self.queue_size, 'na_fila': self._waiting}
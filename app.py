@@ -1,220 +1,62 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, Response, stream_with_context, g
 import os
 import json
+import time
 import logging
 from datetime import datetime
-import PyPDF2
-from werkzeug.utils import secure_filename
+from functools import partial
 import uuid
 import re
-
-# Bibliotecas adicionais para melhor extração de PDF
-try:
-    import pdfplumber
-    PDFPLUMBER_AVAILABLE = True
-except ImportError:
-    PDFPLUMBER_AVAILABLE = False
-
-try:
-    import fitz  # PyMuPDF
-    PYMUPDF_AVAILABLE = True
-except ImportError:
-    PYMUPDF_AVAILABLE = False
+import sqlite3
+from concurrent.futures import wait, FIRST_COMPLETED
+from jobs import ExtractionJobQueue, STATUS_CONCLUIDO, STATUS_ERRO
+from upload_stream import StreamingRequest, check_pdf_envelope, iter_zip_pdfs, spool_stream
+from snapshot import SnapshotManager
+from export import FORMATS as EXPORT_FORMATS, export_filename
+# Configuração, armazenamentos e etapas do processamento (compartilhados com bulk_ingest.py)
+from pipeline import (
+    UPLOAD_FOLDER, MAX_FILE_SIZE, RECORDS_DB,
+    pdf_store, extraction_cache, record_store, stats_store, search_index, db_sink, field_extractor,
+    allowed_file, extracted_data, new_log_entry, save_entries, save_data_to_log, process_pdf_job
+)
+import metrics
+import admission
+from structured_logging import request_id_var, lazy
 
 app = Flask(__name__)
+# Uploads são gravados em disco em blocos durante o parsing do multipart
+app.request_class = StreamingRequest
 app.secret_key = os.environ.get('SECRET_KEY', 'sua_chave_secreta_aqui_mude_para_producao')
 
-# Configuração de logging melhorada
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('sistema_logs.log', encoding='utf-8'),
-        logging.StreamHandler()
-    ]
-)
-
 logger = logging.getLogger(__name__)
 
 # Configurações
-UPLOAD_FOLDER = 'uploads'
-ALLOWED_EXTENSIONS = {'pdf'}
-MAX_FILE_SIZE = 16 * 1024 * 1024  # 16MB
-DATA_FILE = 'dados_coletados.json'
+# Envio em lote (/upload/lote): vários PDFs ou um ZIP por requisição
+MAX_BATCH_SIZE = int(os.environ.get('MAX_BATCH_SIZE', 512 * 1024 * 1024))
+MAX_BATCH_FILES = int(os.environ.get('MAX_BATCH_FILES', 500))
+PAGE_SIZE = 50  # Registros por página em /visualizar
+MAX_PAGE_SIZE = 200
+JOBS_FOLDER = os.environ.get('JOBS_FOLDER', 'jobs')
+# Modo de ingestão: 'sync' extrai dentro da requisição, 'async' apenas enfileira
+INGEST_MODE = os.environ.get('INGEST_MODE', 'sync')
+EXTRACTION_WORKERS = int(os.environ.get('EXTRACTION_WORKERS', os.cpu_count() or 1))
+# Snapshots incrementais do armazenamento (intervalo e rotação em snapshot.py)
+BACKUP_FOLDER = os.environ.get('BACKUP_FOLDER', 'backups')
+SNAPSHOTS_ENABLED = os.environ.get('SNAPSHOTS_ENABLED', '1').lower() not in ('0', 'false', 'nao', 'não')
+# Controle de admissão: vagas, fila de espera e limite por IP dos uploads (ver admission.py)
+ADMISSION_ENDPOINTS = ('upload_file', 'upload_lote')
 
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = MAX_FILE_SIZE
 
-# Criar pasta de uploads se não existir
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-
-def allowed_file(filename):
-    """Verifica se o arquivo é permitido"""
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+StreamingRequest.upload_folder = UPLOAD_FOLDER
+StreamingRequest.batch_endpoints = ('upload_lote',)
+StreamingRequest.batch_max_content_length = MAX_BATCH_SIZE
 
-def extract_text_from_pdf(pdf_path):
-    """Extrai texto de um arquivo PDF usando múltiplas bibliotecas para melhor compatibilidade"""
-    extracted_text = ""
-    extraction_methods = []
-    
-    # Método 1: PyMuPDF (melhor para PDFs complexos e escaneados)
-    if PYMUPDF_AVAILABLE:
-        try:
-            logger.info("Tentando extração com PyMuPDF")
-            doc = fitz.open(pdf_path)
-            text_pymupdf = ""
-            
-            for page_num in range(len(doc)):
-                page = doc.load_page(page_num)
-                page_text = page.get_text()
-                if page_text.strip():
-                    text_pymupdf += f"\n--- Página {page_num + 1} (PyMuPDF) ---\n{page_text}\n"
-            
-            doc.close()
-            
-            if text_pymupdf.strip():
-                extracted_text = text_pymupdf
-                extraction_methods.append("PyMuPDF")
-                logger.info(f"PyMuPDF extraiu {len(text_pymupdf)} caracteres")
-            
-        except Exception as e:
-            logger.warning(f"PyMuPDF falhou: {str(e)}")
-    
-    # Método 2: pdfplumber (excelente para tabelas e layout complexo)
-    if PDFPLUMBER_AVAILABLE and not extracted_text:
-        try:
-            logger.info("Tentando extração com pdfplumber")
-            with pdfplumber.open(pdf_path) as pdf:
-                text_plumber = ""
-                
-                for page_num, page in enumerate(pdf.pages, 1):
-                    page_text = page.extract_text()
-                    if page_text:
-                        text_plumber += f"\n--- Página {page_num} (pdfplumber) ---\n{page_text}\n"
-                    
-                    # Também tenta extrair tabelas se houver
-                    tables = page.extract_tables()
-                    if tables:
-                        for table_num, table in enumerate(tables, 1):
-                            text_plumber += f"\n--- Tabela {table_num} da Página {page_num} ---\n"
-                            for row in table:
-                                if row:
-                                    text_plumber += " | ".join([str(cell) if cell else "" for cell in row]) + "\n"
-                
-                if text_plumber.strip():
-                    extracted_text = text_plumber
-                    extraction_methods.append("pdfplumber")
-                    logger.info(f"pdfplumber extraiu {len(text_plumber)} caracteres")
-                    
-        except Exception as e:
-            logger.warning(f"pdfplumber falhou: {str(e)}")
-    
-    # Método 3: PyPDF2 (fallback padrão)
-    if not extracted_text:
-        try:
-            logger.info("Tentando extração com PyPDF2")
-            with open(pdf_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                text_pypdf2 = ""
-                total_pages = len(pdf_reader.pages)
-                
-                logger.info(f"Processando PDF com {total_pages} páginas usando PyPDF2")
-                
-                for page_num, page in enumerate(pdf_reader.pages, 1):
-                    try:
-                        page_text = page.extract_text()
-                        if page_text:
-                            text_pypdf2 += f"\n--- Página {page_num} (PyPDF2) ---\n{page_text}\n"
-                    except Exception as e:
-                        logger.warning(f"Erro ao extrair texto da página {page_num} com PyPDF2: {str(e)}")
-                        text_pypdf2 += f"\n--- Página {page_num} ---\n[Erro ao extrair texto desta página]\n"
-                
-                if text_pypdf2.strip():
-                    extracted_text = text_pypdf2
-                    extraction_methods.append("PyPDF2")
-                    logger.info(f"PyPDF2 extraiu {len(text_pypdf2)} caracteres")
-                    
-        except Exception as e:
-            logger.error(f"PyPDF2 também falhou: {str(e)}")
-    
-    # Método 4: Tentativa de OCR básico com PyMuPDF se texto não foi extraído
-    if PYMUPDF_AVAILABLE and not extracted_text:
-        try:
-            logger.info("Tentando extração de imagem/OCR com PyMuPDF")
-            doc = fitz.open(pdf_path)
-            ocr_text = ""
-            
-            for page_num in range(len(doc)):
-                page = doc.load_page(page_num)
-                
-                # Tenta extrair texto de imagens na página
-                image_list = page.get_images()
-                if image_list:
-                    ocr_text += f"\n--- Página {page_num + 1} (Imagens detectadas) ---\n"
-                    ocr_text += f"[PDF contém {len(image_list)} imagem(s) - texto pode estar em formato de imagem]\n"
-                
-                # Extrai qualquer texto visível mesmo que seja pouco
-                all_text = page.get_text("text")
-                if all_text.strip():
-                    ocr_text += all_text + "\n"
-            
-            doc.close()
-            
-            if ocr_text.strip():
-                extracted_text = ocr_text
-                extraction_methods.append("PyMuPDF-OCR")
-                logger.info(f"PyMuPDF-OCR extraiu {len(ocr_text)} caracteres")
-                
-        except Exception as e:
-            logger.warning(f"Extração de imagem falhou: {str(e)}")
-    
-    # Resultado final
-    if extracted_text:
-        # Adiciona informações sobre o método usado
-        method_info = f"[Métodos de extração utilizados: {', '.join(extraction_methods)}]\n\n"
-        final_text = method_info + extracted_text.strip()
-        
-        logger.info(f"Extração concluída com sucesso usando: {', '.join(extraction_methods)}")
-        logger.info(f"Total de caracteres extraídos: {len(final_text)}")
-        
-        return final_text
-    else:
-        logger.error("Todas as tentativas de extração de texto falharam")
-        return "[PDF processado mas não foi possível extrair texto legível com nenhum método disponível]"
-
-def save_data_to_log(data):
-    """Salva os dados em log estruturado com backup automático"""
-    try:
-        timestamp = datetime.now()
-        log_entry = {
-            "timestamp": timestamp.isoformat(),
-            "id": str(uuid.uuid4()),
-            "data": data,
-            "created_at": timestamp.strftime("%Y-%m-%d %H:%M:%S"),
-            "version": "1.0"
-        }
-        
-        # Salva em arquivo JSON estruturado
-        with open(DATA_FILE, 'a', encoding='utf-8') as f:
-            f.write(json.dumps(log_entry, ensure_ascii=False, indent=2) + "\n")
-        
-        # Cria backup diário se não existir
-        backup_filename = f"backup_{timestamp.strftime('%Y%m%d')}.json"
-        if not os.path.exists(backup_filename):
-            try:
-                with open(backup_filename, 'w', encoding='utf-8') as backup_f:
-                    backup_f.write(json.dumps(log_entry, ensure_ascii=False, indent=2) + "\n")
-                logger.info(f"Backup diário criado: {backup_filename}")
-            except Exception as e:
-                logger.warning(f"Erro ao criar backup: {str(e)}")
-        
-        # Log para acompanhamento
-        logger.info(f"Dados salvos com ID: {log_entry['id']}")
-        return log_entry['id']
-        
-    except Exception as e:
-        logger.error(f"Erro ao salvar dados: {str(e)}")
-        return None
+# Backups em segundo plano: só os registros novos desde o último snapshot
+snapshots = SnapshotManager(record_store, BACKUP_FOLDER)
+if SNAPSHOTS_ENABLED:
+    snapshots.start()
 
 def validate_form_data(data):
     """Valida se um arquivo PDF foi enviado"""
@@ -232,23 +74,126 @@ def sanitize_filename(filename):
     name = re.sub(r'[^a-zA-Z0-9._-]', '_', filename)
     return name[:100]  # Limita o tamanho
 
-def validate_pdf_file(file):
-    """Valida se o arquivo PDF é válido"""
-    try:
-        # Tenta ler o PDF para verificar se está válido
-        pdf_reader = PyPDF2.PdfReader(file)
-        num_pages = len(pdf_reader.pages)
-        
-        if num_pages == 0:
-            return False, "PDF não contém páginas"
-        
-        if num_pages > 100:
-            return False, "PDF muito grande (máximo 100 páginas)"
-            
-        return True, None
-    except Exception as e:
-        logger.error(f"Erro ao validar PDF: {str(e)}")
-        return False, "Arquivo PDF inválido ou corrompido"
+def save_job_result(job, result):
+    """Grava o registro de um job concluído através de save_data_to_log()"""
+    contexto = job['contexto']
+    processed_data = {
+        **extracted_data(result['pdf_content'], result['extraction_methods'], contexto['arquivo']['nome_original']),
+        'arquivo': contexto['arquivo'],
+        'status': 'processado',
+        'ip_address': contexto.get('ip_address'),
+        'user_agent': contexto.get('user_agent')
+    }
+    with metrics.timer(metrics.STAGE_SECONDS, etapa='gravacao'):
+        record_id = save_data_to_log(processed_data)
+    if not record_id:
+        raise RuntimeError('Erro ao salvar dados')
+    # O texto completo fica no registro; o job guarda apenas o tamanho
+    result['caracteres_extraidos'] = len(result.pop('pdf_content'))
+    if result['cache_hit']:
+        logger.info(f"Job {job['id']} atendido pelo cache de extração")
+    return record_id
+
+def discard_job_pdf(job, error):
+    """Remove o PDF de um job rejeitado na validação, se ele foi gravado por esse envio"""
+    arquivo = job['contexto'].get('arquivo') or {}
+    # ValueError vem de process_pdf_job (PDF inválido); outras falhas mantêm o PDF para nova tentativa
+    if isinstance(error, ValueError) and job['contexto'].get('novo') and arquivo.get('sha256'):
+        pdf_store.remove(arquivo['sha256'])
+        logger.debug("PDF rejeitado removido do armazenamento: %s", arquivo['sha256'][:12])
+
+job_queue = ExtractionJobQueue(
+    process_pdf_job,
+    jobs_dir=JOBS_FOLDER,
+    max_workers=EXTRACTION_WORKERS,
+    on_complete=save_job_result,
+    on_error=discard_job_pdf
+)
+
+admission_controller = admission.AdmissionController() if admission.ADMISSION_ENABLED else None
+rate_limiter = admission.RateLimiter() if admission.ADMISSION_ENABLED else None
+
+@app.before_request
+def assign_request_id():
+    """ID da requisição (do cabeçalho X-Request-ID ou gerado) anexado a todos os logs"""
+    g.request_id = (request.headers.get('X-Request-ID') or uuid.uuid4().hex)[:64]
+    g.request_id_token = request_id_var.set(g.request_id)
+
+@app.after_request
+def add_request_id_header(response):
+    if 'request_id' in g:
+        response.headers['X-Request-ID'] = g.request_id
+    return response
+
+@app.teardown_request
+def clear_request_id(exc):
+    if 'request_id_token' in g:
+        request_id_var.reset(g.request_id_token)
+
+@app.before_request
+def metrics_request_start():
+    """Início da requisição: gauge de requisições em andamento"""
+    if metrics.registry.enabled:
+        g.metrics_endpoint = request.endpoint or 'desconhecido'
+        g.metrics_start = time.perf_counter()
+        metrics.gauge_add(metrics.IN_FLIGHT, 1, endpoint=g.metrics_endpoint)
+
+@app.after_request
+def metrics_request_status(response):
+    if metrics.registry.enabled and 'metrics_endpoint' in g:
+        metrics.inc(metrics.REQUESTS, endpoint=g.metrics_endpoint, status=response.status_code)
+    return response
+
+@app.teardown_request
+def metrics_request_end(exc):
+    """Fim da requisição (inclusive respostas transmitidas): duração e gauge"""
+    if metrics.registry.enabled and 'metrics_endpoint' in g:
+        metrics.observe(metrics.REQUEST_SECONDS, time.perf_counter() - g.metrics_start, endpoint=g.metrics_endpoint)
+        metrics.gauge_add(metrics.IN_FLIGHT, -1, endpoint=g.metrics_endpoint)
+
+def admission_rejected(reason, retry_after):
+    """Resposta imediata a um upload recusado (429 por IP, 503 por sobrecarga) com Retry-After"""
+    metrics.inc(metrics.ADMISSION_REJECTED, motivo=reason)
+    logger.warning("Upload recusado pelo controle de admissão",
+                   extra={'evento': 'admissao_recusada', 'motivo': reason, 'ip': request.remote_addr})
+    if reason == 'limite_ip':
+        status, message = 429, 'Muitos envios deste endereço. Aguarde antes de enviar novamente.'
+    elif reason == 'tempo_fila':
+        status, message = 503, 'Servidor ocupado: tempo de espera por processamento esgotado. Tente novamente em instantes.'
+    else:
+        status, message = 503, 'Servidor ocupado: muitos PDFs em processamento. Tente novamente em instantes.'
+    response = jsonify({'success': False, 'errors': [message]})
+    response.status_code = status
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
+@app.before_request
+def admit_upload():
+    """Limite por IP e vaga de processamento antes de o corpo do upload ser lido"""
+    if admission_controller is None or request.endpoint not in ADMISSION_ENDPOINTS:
+        return None
+    wait = rate_limiter.take(request.remote_addr)
+    if wait:
+        return admission_rejected('limite_ip', int(wait) + 1)
+
+    start = time.perf_counter()
+    slot, reason = admission_controller.acquire(
+        on_wait=lambda delta: metrics.gauge_add(metrics.ADMISSION_QUEUE, delta))
+    if slot is None:
+        return admission_rejected(reason, admission_controller.retry_after())
+    metrics.observe(metrics.ADMISSION_WAIT_SECONDS, time.perf_counter() - start)
+    metrics.gauge_add(metrics.ADMISSION_ACTIVE, 1)
+    g.admission_slot = slot
+
+def release_admission_slot(slot):
+    if slot is not None:
+        slot.release()
+        metrics.gauge_add(metrics.ADMISSION_ACTIVE, -1)
+
+@app.teardown_request
+def release_upload(exc):
+    """Devolve a vaga ao fim da requisição (inclusive respostas transmitidas do lote)"""
+    release_admission_slot(g.pop('admission_slot', None))
 
 @app.route('/')
 def index():
@@ -259,76 +204,115 @@ def index():
 def upload_file():
     """Processa o upload de arquivo PDF e extrai dados automaticamente"""
     try:
-        logger.info("Iniciando processamento de upload de PDF")
-        logger.info(f"Arquivos recebidos: {list(request.files.keys())}")
+        # O corpo multipart é lido e gravado em disco no primeiro acesso a request.files
+        with metrics.timer(metrics.STAGE_SECONDS, etapa='recebimento'):
+            files = request.files
+        logger.debug("Arquivos recebidos: %s", lazy(list, files.keys()))
         
         # Verifica se arquivo PDF foi enviado
-        if 'pdf_file' not in request.files:
+        if 'pdf_file' not in files:
             return jsonify({'success': False, 'errors': ['Nenhum arquivo PDF foi enviado']}), 400
         
-        file = request.files['pdf_file']
+        file = files['pdf_file']
         
         if not file or file.filename == '':
             return jsonify({'success': False, 'errors': ['Arquivo PDF é obrigatório']}), 400
         
-        logger.info(f"Arquivo PDF encontrado: {file.filename}, tamanho: {len(file.read())} bytes")
-        file.seek(0)  # Reset após ler o tamanho
+        # O corpo já foi gravado em disco em blocos, com tamanho e hash calculados
+        upload = file.stream
+        if not hasattr(upload, 'persist'):
+            upload = spool_stream(upload, app.config['UPLOAD_FOLDER'])
+        logger.debug("Arquivo PDF encontrado: %s, tamanho: %s bytes", file.filename, upload.size)
         
         # Validação do tipo de arquivo
         if not allowed_file(file.filename):
             error_msg = f'Tipo de arquivo não permitido: {file.filename}. Use apenas PDF.'
-            logger.error(error_msg)
+            logger.warning(error_msg)
             return jsonify({'success': False, 'errors': [error_msg]}), 400
         
-        # Validação do PDF
-        file.seek(0)  # Reset file pointer
-        is_valid, validation_error = validate_pdf_file(file)
+        # Cabeçalho e trailer verificados durante o recebimento, sem abrir o documento
+        with metrics.timer(metrics.STAGE_SECONDS, etapa='validacao'):
+            is_valid, validation_error = check_pdf_envelope(upload)
         if not is_valid:
             error_msg = f'PDF inválido: {validation_error}'
-            logger.error(error_msg)
+            logger.warning(error_msg)
             return jsonify({'success': False, 'errors': [error_msg]}), 400
         
-        # Salvamento do arquivo
-        file.seek(0)  # Reset file pointer again
-        filename = sanitize_filename(secure_filename(file.filename))
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"{timestamp}_{filename}"
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+        # Salvamento pelo hash (move o temporário; reenvios do mesmo PDF não gravam outra cópia)
+        sha256 = upload.sha256
+        with metrics.timer(metrics.STAGE_SECONDS, etapa='persistencia'):
+            filepath, novo = pdf_store.put(upload)
+        logger.debug("Arquivo %s: %s", 'salvo' if novo else 'já armazenado', filepath)
         
-        file.save(filepath)
-        logger.info(f"Arquivo salvo: {filepath}")
+        # Informações do arquivo
+        arquivo_info = {
+            'nome_original': file.filename,
+            'nome_salvo': os.path.basename(filepath),
+            'tamanho': upload.size,
+            'caminho': filepath,
+            'sha256': sha256
+        }
         
-        # Extração de texto do PDF
-        pdf_text = extract_text_from_pdf(filepath)
+        if INGEST_MODE == 'async':
+            # A vaga de admissão acompanha o job e só é devolvida quando a extração termina
+            slot = g.pop('admission_slot', None)
+            try:
+                job_id = job_queue.submit(filepath, sha256, context={
+                    'arquivo': arquivo_info,
+                    'novo': novo,
+                    'ip_address': request.remote_addr,
+                    'user_agent': request.user_agent.string
+                }, on_done=lambda job: release_admission_slot(slot))
+            except Exception:
+                release_admission_slot(slot)
+                raise
+            return jsonify({
+                'success': True,
+                'message': 'Arquivo recebido e enfileirado para extração',
+                'job_id': job_id,
+                'status_url': url_for('api_job_status', job_id=job_id),
+                'arquivo': file.filename
+            }), 202
+        
+        # Cache por conteúdo; sem acerto, o PDF é validado na mesma abertura que extrai o texto
+        try:
+            result = process_pdf_job(filepath, sha256)
+        except ValueError as e:
+            if novo:
+                pdf_store.remove(sha256)
+            return jsonify({'success': False, 'errors': [str(e)]}), 400
+        pdf_text, extraction_methods = result['pdf_content'], result['extraction_methods']
+        if result['cache_hit']:
+            logger.debug("Cache de extração: acerto para %s", sha256[:12])
         if pdf_text is None:
             error_msg = 'Erro ao processar PDF - não foi possível extrair texto'
             logger.error(error_msg)
             return jsonify({'success': False, 'errors': [error_msg]}), 400
         
-        # Informações do arquivo
-        arquivo_info = {
-            'nome_original': file.filename,
-            'nome_salvo': filename,
-            'tamanho': os.path.getsize(filepath),
-            'caminho': filepath
-        }
+        with metrics.timer(metrics.STAGE_SECONDS, etapa='campos'):
+            extracted = extracted_data(pdf_text, extraction_methods, arquivo_info['nome_original'])
         
         # Estrutura final dos dados (apenas dados extraídos do PDF)
         processed_data = {
-            'pdf_content': pdf_text,
+            **extracted,
             'arquivo': arquivo_info,
             'status': 'processado',
             'ip_address': request.remote_addr,
             'user_agent': request.user_agent.string
         }
         
-        logger.info(f"Dados processados: {len(str(processed_data))} caracteres")
-        
         # Salva os dados
-        record_id = save_data_to_log(processed_data)
+        with metrics.timer(metrics.STAGE_SECONDS, etapa='gravacao'):
+            record_id = save_data_to_log(processed_data)
         
         if record_id:
-            logger.info(f"Processamento concluído com sucesso. ID: {record_id}")
+            # Um registro INFO por upload, com os dados do processamento em campos próprios
+            logger.info("Upload processado: %s", record_id, extra={
+                'arquivo': arquivo_info['nome_original'],
+                'tamanho': upload.size,
+                'caracteres': len(pdf_text),
+                'cache_hit': result['cache_hit']
+            })
             return jsonify({
                 'success': True, 
                 'message': 'Dados extraídos e salvos com sucesso!',
@@ -344,60 +328,323 @@ def upload_file():
         logger.error(f"Erro no upload: {str(e)}", exc_info=True)
         return jsonify({'success': False, 'errors': [f'Erro interno do servidor: {str(e)}']}), 500
 
+def iter_batch_uploads(files):
+    """PDFs enviados diretamente ou dentro de ZIPs; gera (nome, SpooledUpload ou None, erro)"""
+    count = 0
+    for file in files:
+        upload = file.stream
+        if not hasattr(upload, 'persist'):
+            upload = spool_stream(upload, app.config['UPLOAD_FOLDER'])
+        if file.filename.lower().endswith('.zip'):
+            items = iter_zip_pdfs(upload, app.config['UPLOAD_FOLDER'], MAX_FILE_SIZE, MAX_BATCH_FILES)
+        elif allowed_file(file.filename):
+            items = [(file.filename, upload, None)]
+        else:
+            items = [(file.filename, None, 'Tipo de arquivo não permitido. Use apenas PDF.')]
+        try:
+            for nome, member, erro in items:
+                count += 1
+                if erro is None and count > MAX_BATCH_FILES:
+                    member.close()
+                    member, erro = None, f'Limite de {MAX_BATCH_FILES} arquivos por lote excedido'
+                yield nome, member, erro
+        finally:
+            # O ZIP (ou um PDF não aproveitado) não deixa arquivo temporário para trás
+            upload.close()
+
+def store_batch_upload(nome, upload):
+    """Valida o envelope e guarda o PDF pelo hash; retorna (arquivo_info, novo, erro)"""
+    if upload.size > MAX_FILE_SIZE:
+        upload.close()
+        return None, False, 'Arquivo muito grande. Máximo 16MB'
+    is_valid, validation_error = check_pdf_envelope(upload)
+    if not is_valid:
+        upload.close()
+        return None, False, f'PDF inválido: {validation_error}'
+    sha256 = upload.sha256
+    filepath, novo = pdf_store.put(upload)
+    return {
+        'nome_original': nome,
+        'nome_salvo': os.path.basename(filepath),
+        'tamanho': upload.size,
+        'caminho': filepath,
+        'sha256': sha256
+    }, novo, None
+
+@app.route('/upload/lote', methods=['POST'])
+def upload_lote():
+    """Recebe vários PDFs ou um ZIP e transmite o resultado de cada arquivo em NDJSON"""
+    files = [f for key in request.files for f in request.files.getlist(key) if f and f.filename]
+    if not files:
+        return jsonify({'success': False, 'errors': ['Nenhum arquivo foi enviado']}), 400
+    
+    ip_address = request.remote_addr
+    user_agent = request.user_agent.string
+    logger.info("Envio em lote iniciado: %s arquivo(s) recebido(s)", len(files))
+    
+    def line(item):
+        return json.dumps(item, ensure_ascii=False) + "\n"
+    
+    def generate():
+        inicio = time.monotonic()
+        resumo = {'total': 0, 'sucesso': 0, 'falhas': 0}
+        uploads = iter_batch_uploads(files)
+        pending = {}
+        exhausted = False
+        
+        while not exhausted or pending:
+            # Mantém o pool ocupado sem descompactar o lote inteiro de uma vez
+            while not exhausted and len(pending) < EXTRACTION_WORKERS * 2:
+                item = next(uploads, None)
+                if item is None:
+                    exhausted = True
+                    break
+                nome, upload, erro = item
+                resumo['total'] += 1
+                arquivo_info = None
+                if erro is None:
+                    arquivo_info, novo, erro = store_batch_upload(nome, upload)
+                if erro is not None:
+                    resumo['falhas'] += 1
+                    yield line({'arquivo': nome, 'success': False, 'errors': [erro]})
+                    continue
+                future = job_queue.submit_task(arquivo_info['caminho'], arquivo_info['sha256'])
+                pending[future] = (arquivo_info, novo)
+            
+            if not pending:
+                continue
+            
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            completed, lines = [], []
+            for future in done:
+                arquivo_info, novo = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    # Só descarta o PDF se ele foi gravado por este envio
+                    if novo:
+                        pdf_store.remove(arquivo_info['sha256'])
+                    resumo['falhas'] += 1
+                    lines.append({'arquivo': arquivo_info['nome_original'], 'success': False, 'errors': [str(e)]})
+                    continue
+                entry = new_log_entry({
+                    **extracted_data(result['pdf_content'], result['extraction_methods'],
+                                     arquivo_info['nome_original']),
+                    'arquivo': arquivo_info,
+                    'status': 'processado',
+                    'ip_address': ip_address,
+                    'user_agent': user_agent
+                })
+                completed.append((entry, result))
+            
+            # Os arquivos concluídos juntos são gravados em uma única transação
+            if completed:
+                try:
+                    with metrics.timer(metrics.STAGE_SECONDS, etapa='gravacao'):
+                        save_entries([entry for entry, _ in completed])
+                    saved = True
+                except Exception as e:
+                    logger.error(f"Erro ao salvar lote: {str(e)}")
+                    saved = False
+                for entry, result in completed:
+                    nome = entry['data']['arquivo']['nome_original']
+                    if saved:
+                        resumo['sucesso'] += 1
+                        lines.append({
+                            'arquivo': nome,
+                            'success': True,
+                            'record_id': entry['id'],
+                            'caracteres_extraidos': len(result['pdf_content']),
+                            'cache_hit': result['cache_hit']
+                        })
+                    else:
+                        resumo['falhas'] += 1
+                        lines.append({'arquivo': nome, 'success': False, 'errors': ['Erro ao salvar dados']})
+            
+            for item in lines:
+                yield line(item)
+        
+        resumo['tempo'] = round(time.monotonic() - inicio, 3)
+        logger.info("Envio em lote concluído: %s", resumo)
+        yield line({'resumo': resumo})
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+def parse_listing_args(args):
+    """Lê filtros e paginação da query string; retorna (filtros, cursor, limite)"""
+    filtros = {}
+    for campo, chave in (('date_from', 'de'), ('date_to', 'ate')):
+        valor = args.get(chave, '').strip()
+        if valor:
+            # Valida o formato AAAA-MM-DD
+            datetime.strptime(valor, '%Y-%m-%d')
+            filtros[campo] = valor
+    if args.get('nome', '').strip():
+        filtros['nome'] = args['nome'].strip()
+    if args.get('status', '').strip():
+        filtros['status'] = args['status'].strip()
+    
+    limite = min(max(args.get('limite', PAGE_SIZE, type=int), 1), MAX_PAGE_SIZE)
+    return filtros, args.get('cursor') or None, limite
+
 @app.route('/visualizar')
 def visualizar():
     """Página para visualizar dados coletados com paginação e filtros"""
     try:
-        dados = []
-        if os.path.exists(DATA_FILE):
-            with open(DATA_FILE, 'r', encoding='utf-8') as f:
-                for line in f:
-                    if line.strip():
-                        try:
-                            dados.append(json.loads(line))
-                        except json.JSONDecodeError as e:
-                            logger.warning(f"Linha JSON inválida ignorada: {e}")
+        filtros, cursor, limite = parse_listing_args(request.args)
         
-        # Ordenar por timestamp (mais recente primeiro)
-        dados.sort(key=lambda x: x.get('timestamp', ''), reverse=True)
+        # Apenas metadados e um trecho do texto; o conteúdo completo é carregado sob demanda
+        dados, proximo_cursor = record_store.list_page(limit=limite, cursor=cursor, **filtros)
+        for item in dados:
+            item['conteudo_url'] = url_for('api_registro_conteudo', record_id=item['id'])
         
         logger.info(f"Carregados {len(dados)} registros para visualização")
-        return render_template('visualizar.html', dados=dados)
+        return render_template(
+            'visualizar.html',
+            dados=dados,
+            filtros=request.args,
+            proximo_cursor=proximo_cursor,
+            limite=limite
+        )
         
     except Exception as e:
         logger.error(f"Erro ao carregar dados: {str(e)}")
         flash('Erro ao carregar dados', 'error')
         return redirect(url_for('index'))
 
+@app.route('/api/registros')
+def api_registros():
+    """Listagem paginada de registros (metadados e trecho do texto)"""
+    try:
+        filtros, cursor, limite = parse_listing_args(request.args)
+        dados, proximo_cursor = record_store.list_page(limit=limite, cursor=cursor, **filtros)
+    except ValueError as e:
+        return jsonify({'success': False, 'errors': [f'Parâmetro inválido: {str(e)}']}), 400
+    
+    for item in dados:
+        item['conteudo_url'] = url_for('api_registro_conteudo', record_id=item['id'])
+    
+    return jsonify({
+        'registros': dados,
+        'proximo_cursor': proximo_cursor,
+        'proxima_pagina': url_for('api_registros', **{**request.args.to_dict(), 'cursor': proximo_cursor}) if proximo_cursor else None
+    })
+
+@app.route('/api/registros/<record_id>/conteudo')
+def api_registro_conteudo(record_id):
+    """Texto completo extraído de um registro"""
+    conteudo = record_store.get_content(record_id)
+    if conteudo is None:
+        return jsonify({'success': False, 'errors': ['Registro não encontrado']}), 404
+    
+    return jsonify({'record_id': record_id, 'pdf_content': conteudo, 'caracteres': len(conteudo)})
+
+@app.route('/api/export/<formato>')
+def api_export(formato):
+    """Exportação em fluxo (ndjson, csv ou sql) com os filtros da listagem (de, ate, status, nome)"""
+    if formato not in EXPORT_FORMATS:
+        return jsonify({'success': False, 'errors': [f'Formato inválido: {formato}. Use ndjson, csv ou sql']}), 400
+    try:
+        filtros, _, _ = parse_listing_args(request.args)
+    except ValueError as e:
+        return jsonify({'success': False, 'errors': [f'Parâmetro inválido: {str(e)}']}), 400
+    
+    generator, mimetype, _ = EXPORT_FORMATS[formato]
+    if formato == 'sql':
+        # Campos estruturados tipados conforme as regras carregadas
+        generator = partial(generator, field_types=field_extractor.types)
+    logger.info(f"Exportação {formato} iniciada com filtros {filtros}")
+    # Registros lidos em lotes e enviados à medida que são convertidos
+    return Response(
+        stream_with_context(generator(record_store.iter_chronological(**filtros))),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename="{export_filename(formato)}"'}
+    )
+
+@app.route('/api/search')
+def api_search():
+    """Busca textual no conteúdo extraído (frases entre aspas, prefixos com *)"""
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'success': False, 'errors': ['Parâmetro q é obrigatório']}), 400
+    
+    limite = min(max(request.args.get('limite', 20, type=int), 1), MAX_PAGE_SIZE)
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    try:
+        resultados, total = search_index.search(query, limit=limite, offset=offset)
+    except sqlite3.OperationalError as e:
+        logger.warning(f"Consulta de busca inválida '{query}': {str(e)}")
+        return jsonify({'success': False, 'errors': ['Consulta de busca inválida']}), 400
+    
+    for resultado in resultados:
+        resultado['conteudo_url'] = url_for('api_registro_conteudo', record_id=resultado['record_id'])
+    
+    return jsonify({'query': query, 'total': total, 'resultados': resultados})
+
 @app.route('/api/stats')
 def api_stats():
     """API para estatísticas do sistema"""
     try:
-        total_registros = 0
-        total_pdfs = 0
-        
-        if os.path.exists(DATA_FILE):
-            with open(DATA_FILE, 'r', encoding='utf-8') as f:
-                for line in f:
-                    if line.strip():
-                        try:
-                            data = json.loads(line)
-                            total_registros += 1
-                            if data.get('data', {}).get('pdf_content'):
-                                total_pdfs += 1
-                        except json.JSONDecodeError:
-                            continue
-        
-        return jsonify({
-            'total_registros': total_registros,
-            'total_pdfs': total_pdfs,
+        # Agregados mantidos incrementalmente: custo constante, independente do histórico
+        estatisticas = stats_store.snapshot()
+        estatisticas.update({
+            'cache_extracao': extraction_cache.stats(),
+            'sink_banco': db_sink.stats if db_sink is not None else None,
+            'admissao': admission_controller.state() if admission_controller is not None else None,
             'uptime': datetime.now().isoformat()
         })
+        return jsonify(estatisticas)
         
     except Exception as e:
         logger.error(f"Erro ao gerar estatísticas: {str(e)}")
         return jsonify({'error': 'Erro interno'}), 500
 
+@app.route('/api/metrics')
+def api_metrics():
+    """Métricas de desempenho no formato texto do Prometheus (todos os workers)"""
+    if not metrics.registry.enabled:
+        return jsonify({'success': False, 'errors': ['Métricas desativadas (METRICS_ENABLED=0)']}), 404
+    return Response(metrics.registry.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/jobs/<job_id>')
+def api_job_status(job_id):
+    """Status de um job de extração assíncrona"""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'errors': ['Job não encontrado']}), 404
+    
+    return jsonify({
+        'job_id': job['id'],
+        'status': job['status'],
+        'criado_em': job.get('criado_em'),
+        'iniciado_em': job.get('iniciado_em'),
+        'finalizado_em': job.get('finalizado_em'),
+        'arquivo': job['contexto'].get('arquivo', {}).get('nome_original'),
+        'record_id': job.get('record_id'),
+        'erro': job.get('erro')
+    })
+
+@app.route('/api/jobs/<job_id>/resultado')
+def api_job_result(job_id):
+    """Resultado de um job de extração concluído"""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'errors': ['Job não encontrado']}), 404
+    
+    if job['status'] == STATUS_ERRO:
+        return jsonify({'success': False, 'status': job['status'], 'errors': [job['erro']]}), 422
+    
+    if job['status'] != STATUS_CONCLUIDO:
+        return jsonify({'success': False, 'status': job['status']}), 202
+    
+    return jsonify({
+        'success': True,
+        'status': job['status'],
+        'record_id': job['record_id'],
+        'arquivo': job['contexto']['arquivo']['nome_original'],
+        'caracteres_extraidos': job['resultado']['caracteres_extraidos']
+    })
+
 # Tratamento de erros globais
 @app.errorhandler(413)
 def too_large(e):
@@ -415,7 +662,8 @@ def internal_error(e):
 if __name__ == '__main__':
     logger.info("Iniciando Sistema de Coleta de Dados")
     logger.info(f"Pasta de uploads: {UPLOAD_FOLDER}")
-    logger.info(f"Arquivo de dados: {DATA_FILE}")
+    logger.info(f"Armazenamento de registros: {RECORDS_DB}")
+    logger.info(f"Modo de ingestão: {INGEST_MODE}")
     logger.info("Sistema disponível em: http://localhost:5000")
     
     # Modo debug apenas em desenvolvimento
@@ -0,0 +1,299 @@
+"""
+Benchmark reprodutível da extração de texto
+Gera um corpus sintético determinístico (somente texto, tabelas,
+digitalizado/só imagem e 100 páginas) e mede tempo de parede, tempo de CPU,
+pico de RSS e caracteres/s de cada motor, do pipeline completo
+(extract_text_and_methods) e do /upload pelo cliente de testes do Flask.
+Cada caso roda em um processo novo, para que o pico de RSS seja só dele.
+
+Uso:
+    python benchmark.py corpus [--dir bench_corpus]
+    python benchmark.py executar [--dir bench_corpus] [--repeticoes 3] [--saida benchmark_resultado.json]
+                                 [--base benchmark_base.json] [--limite 0.25] [--gravar-base]
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import hashlib
+import platform
+import argparse
+import statistics
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import resource
+    RESOURCE_AVAILABLE = True
+except ImportError:  # Windows
+    RESOURCE_AVAILABLE = False
+
+import sandbox
+import pdf_extraction
+from extraction_engines import ENGINES, configured_order
+from pdf_extraction import ENGINE_VERSIONS, extract_text_and_methods
+
+DEFAULT_CORPUS_DIR = 'bench_corpus'
+DEFAULT_RESULT_FILE = 'benchmark_resultado.json'
+DEFAULT_BASELINE_FILE = 'benchmark_base.json'
+DEFAULT_THRESHOLD = 0.25  # Regressão: 25% mais lento (ou mais memória) que a base
+
+WORDS = (
+    'conta energia consumo leitura medidor fatura vencimento referência tarifa bandeira '
+    'cliente endereço unidade instalação valor total pagamento imposto icms pis cofins '
+    'são paulo rua avenida número período anterior atual média histórico kwh'
+).split()
+
+# nome do documento -> (páginas, tipo)
+CORPUS = {
+    'texto': (5, 'texto'),
+    'tabelas': (5, 'tabelas'),
+    'digitalizado': (3, 'imagem'),
+    'longo_100_paginas': (100, 'texto')
+}
+
+
+def _text_lines(rng, count):
+    lines = []
+    for _ in range(count):
+        words = [rng.choice(WORDS) for _ in range(rng.randint(5, 10))]
+        lines.append(' '.join(words).capitalize() + f' {rng.randint(1, 99999)},{rng.randint(0, 99):02d}')
+    return lines
+
+
+def _draw_text_page(page, rng, page_num):
+    text = f'Fatura sintética - página {page_num}\n' + '\n'.join(_text_lines(rng, 45))
+    page.insert_text((40, 50), text, fontsize=9)
+
+
+def _draw_table_page(page, rng, page_num):
+    page.insert_text((40, 40), f'Demonstrativo de consumo - página {page_num}', fontsize=11)
+    cols, rows = 5, 25
+    x0, y0, width, height = 40, 60, 103, 26
+    for r in range(rows):
+        for c in range(cols):
+            rect = ENGINES['PyMuPDF'].load().Rect(x0 + c * width, y0 + r * height,
+                                                  x0 + (c + 1) * width, y0 + (r + 1) * height)
+            page.draw_rect(rect, width=0.6)
+            cell = rng.choice(WORDS) if c == 0 or r == 0 else f'{rng.randint(0, 9999)},{rng.randint(0, 99):02d}'
+            page.insert_text((rect.x0 + 4, rect.y0 + 16), cell, fontsize=8)
+
+
+def build_document(path, pages, kind):
+    """Gera um PDF determinístico (mesma semente e sem /ID aleatório: bytes idênticos)"""
+    fitz = ENGINES['PyMuPDF'].load()
+    rng = random.Random(os.path.basename(path))
+    doc = fitz.open()
+    for page_num in range(1, pages + 1):
+        page = doc.new_page()
+        if kind == 'tabelas':
+            _draw_table_page(page, rng, page_num)
+        elif kind == 'imagem':
+            # Página "digitalizada": texto rasterizado inserido como imagem, sem camada de texto
+            source = fitz.open()
+            _draw_text_page(source.new_page(), rng, page_num)
+            pixmap = source[0].get_pixmap(dpi=100, colorspace=fitz.csGRAY)
+            page.insert_image(page.rect, pixmap=pixmap)
+            source.close()
+        else:
+            _draw_text_page(page, rng, page_num)
+    doc.save(path, garbage=3, deflate=True, no_new_id=True)
+    doc.close()
+
+
+def build_corpus(directory):
+    """Gera o corpus no diretório; retorna {nome: caminho}"""
+    if not ENGINES['PyMuPDF'].available:
+        raise RuntimeError("PyMuPDF é necessário para gerar o corpus (pip install PyMuPDF)")
+    os.makedirs(directory, exist_ok=True)
+    paths = {}
+    for name, (pages, kind) in CORPUS.items():
+        path = os.path.join(directory, f'{name}.pdf')
+        if not os.path.exists(path):
+            build_document(path, pages, kind)
+        paths[name] = os.path.abspath(path)
+    return paths
+
+
+def _sha256(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def _engine_cases():
+    """Motores disponíveis: nome -> função (caminho, páginas) que retorna o total de caracteres"""
+    def chars_of(engine):
+        return lambda path, pages: sum(len(item[1] or '') for item in engine.extract(path, pages))
+
+    return {name: chars_of(engine) for name, engine in ENGINES.items() if engine.available}
+
+
+def _upload_client(workdir):
+    """Cliente de testes do Flask com armazenamento isolado e cache de extração desativado"""
+    os.chdir(workdir)
+    os.environ['EXTRACTION_CACHE_MAX_BYTES'] = '0'
+    os.environ.pop('DATABASE_URL', None)
+    import logging
+    import app as app_module
+    for handler in logging.getLogger().handlers:
+        if isinstance(handler, logging.StreamHandler) and not isinstance(handler, logging.FileHandler):
+            handler.setLevel(logging.WARNING)
+    return app_module.app.test_client()
+
+
+def _run_case(case, path, pages, repetitions, workdir):
+    """Executado em um processo novo: uma rodada de aquecimento e `repetitions` medições"""
+    if case == 'upload':
+        client = _upload_client(workdir)
+
+        def func():
+            with open(path, 'rb') as f:
+                response = client.post('/upload', data={'pdf_file': (f, os.path.basename(path))},
+                                       content_type='multipart/form-data')
+            return response.get_json()['caracteres_extraidos']
+    elif case == 'pipeline':
+        def func():
+            return len(extract_text_and_methods(path, pages)[0])
+    else:
+        engine = _engine_cases()[case]
+
+        def func():
+            return engine(path, list(range(pages)))
+
+    func()
+    walls, cpus = [], []
+    chars = 0
+    for _ in range(repetitions):
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        chars = func()
+        walls.append(time.perf_counter() - wall_start)
+        cpus.append(time.process_time() - cpu_start)
+
+    wall = statistics.median(walls)
+    peak_rss = None
+    if RESOURCE_AVAILABLE:
+        # A extração roda nos workers do sandbox: encerrados, entram em RUSAGE_CHILDREN
+        sandbox.shutdown()
+        # ru_maxrss: KB no Linux, bytes no macOS
+        peak_rss = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                       resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+        if sys.platform == 'darwin':
+            peak_rss //= 1024
+    return {
+        'wall_s': round(wall, 5),
+        'wall_min_s': round(min(walls), 5),
+        'cpu_s': round(statistics.median(cpus), 5),
+        'pico_rss_kb': peak_rss,
+        'caracteres': chars,
+        'caracteres_por_s': round(chars / wall, 1) if wall else None
+    }
+
+
+def run_benchmark(corpus, repetitions=3):
+    """Mede todos os casos (motor x documento, pipeline e /upload); retorna o dicionário de resultados"""
+    spawn = multiprocessing.get_context('spawn')
+    cases = list(_engine_cases()) + ['pipeline', 'upload']
+    results = {}
+    for name, path in corpus.items():
+        pages = CORPUS[name][0]
+        for case in cases:
+            key = f'{name}/{case}'
+            workdir = tempfile.mkdtemp(prefix='bench_')
+            with ProcessPoolExecutor(max_workers=1, mp_context=spawn) as executor:
+                results[key] = executor.submit(_run_case, case, path, pages, repetitions, workdir).result()
+            r = results[key]
+            print(f"  {key:<34} {r['wall_s'] * 1000:>10.1f} ms  {r['cpu_s'] * 1000:>10.1f} ms CPU  "
+                  f"{r['pico_rss_kb'] or 0:>8} KB  {r['caracteres_por_s'] or 0:>12.0f} car/s", flush=True)
+    return {
+        'gerado_em': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'motores': ENGINE_VERSIONS,
+        'configuracao': {
+            'repeticoes': repetitions,
+            'PARALLEL_WORKERS': pdf_extraction.PARALLEL_WORKERS,
+            'PARALLEL_PAGE_THRESHOLD': pdf_extraction.PARALLEL_PAGE_THRESHOLD,
+            'PAGE_QUALITY_THRESHOLD': pdf_extraction.PAGE_QUALITY_THRESHOLD,
+            'EXTRACTION_ENGINES': ','.join(configured_order()),
+            'SANDBOX_ENABLED': sandbox.SANDBOX_ENABLED
+        },
+        'corpus': {name: _sha256(path) for name, path in corpus.items()},
+        'resultados': results
+    }
+
+
+def compare(current, baseline, threshold=DEFAULT_THRESHOLD):
+    """Compara com a base; retorna a lista de regressões (tempo de parede ou pico de RSS)"""
+    if current['corpus'] != baseline.get('corpus'):
+        print("⚠️  O corpus difere do usado na base; a comparação pode não ser válida")
+    regressions = []
+    print(f"\n{'caso':<34} {'base':>10} {'atual':>10} {'variação':>9}")
+    for key, result in current['resultados'].items():
+        base = baseline.get('resultados', {}).get(key)
+        if base is None:
+            continue
+        ratio = result['wall_s'] / base['wall_s'] if base['wall_s'] else 1.0
+        status = ''
+        if ratio > 1 + threshold:
+            regressions.append(f"{key}: tempo {ratio - 1:+.0%}")
+            status = '❌'
+        if result['pico_rss_kb'] and base.get('pico_rss_kb'):
+            rss_ratio = result['pico_rss_kb'] / base['pico_rss_kb']
+            if rss_ratio > 1 + threshold:
+                regressions.append(f"{key}: memória {rss_ratio - 1:+.0%}")
+                status = '❌'
+        print(f"{key:<34} {base['wall_s'] * 1000:>8.1f}ms {result['wall_s'] * 1000:>8.1f}ms "
+              f"{ratio - 1:>+8.0%} {status}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark reprodutível da extração de texto")
+    parser.add_argument('comando', choices=['corpus', 'executar'])
+    parser.add_argument('--dir', default=DEFAULT_CORPUS_DIR, help="diretório do corpus sintético")
+    parser.add_argument('--repeticoes', type=int, default=3)
+    parser.add_argument('--saida', default=DEFAULT_RESULT_FILE)
+    parser.add_argument('--base', default=DEFAULT_BASELINE_FILE)
+    parser.add_argument('--limite', type=float, default=DEFAULT_THRESHOLD,
+                        help="variação máxima aceita em relação à base (0.25 = 25%%)")
+    parser.add_argument('--gravar-base', action='store_true', help="grava o resultado como nova base")
+    args = parser.parse_args(argv)
+
+    corpus = build_corpus(args.dir)
+    if args.comando == 'corpus':
+        for name, path in corpus.items():
+            print(f"✅ {path} ({CORPUS[name][0]} página(s), sha256 {_sha256(path)[:12]})")
+        return 0
+
+    print(f"🏁 Benchmark com {args.repeticoes} repetição(ões) por caso")
+    current = run_benchmark(corpus, args.repeticoes)
+    with open(args.saida, 'w', encoding='utf-8') as f:
+        json.dump(current, f, ensure_ascii=False, indent=2)
+    print(f"\n📄 Resultados gravados em {args.saida}")
+
+    if args.gravar_base:
+        with open(args.base, 'w', encoding='utf-8') as f:
+            json.dump(current, f, ensure_ascii=False, indent=2)
+        print(f"📌 Base atualizada: {args.base}")
+        return 0
+
+    if not os.path.exists(args.base):
+        print(f"ℹ️  Base {args.base} não encontrada; use --gravar-base para criá-la")
+        return 0
+    with open(args.base, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    regressions = compare(current, baseline, args.limite)
+    if regressions:
+        print(f"\n❌ {len(regressions)} regressão(ões) acima de {args.limite:.0%}:")
+        for item in regressions:
+            print(f"   {item}")
+        return 1
+    print(f"\n✅ Sem regressões acima de {args.limite:.0%}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,212 @@
+"""
+Armazenamento endereçado por conteúdo
+PDFs recebidos são gravados uma única vez, com o SHA-256 como nome
+(uploads/blobs/ab/abcdef....pdf): reenvios do mesmo arquivo não ocupam espaço
+novo. O texto extraído é comprimido com zlib e um dicionário treinado com o
+próprio texto das faturas (cabeçalhos e rótulos que se repetem em todos os
+documentos), o que reduz bastante o tamanho de textos curtos.
+
+Retenção dos PDFs brutos (o texto extraído continua nos registros):
+    PDF_RETENTION_DAYS   remove PDFs sem reenvio há mais de N dias (0 = sem limite)
+    PDF_STORE_MAX_BYTES  remove os mais antigos até caber no limite (0 = sem limite)
+
+Uso:
+    python blob_store.py estatisticas [pasta]
+    python blob_store.py limpar [pasta]
+"""
+
+import os
+import re
+import sys
+import time
+import zlib
+import logging
+import threading
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BLOB_FOLDER = os.path.join('uploads', 'blobs')
+PDF_RETENTION_DAYS = float(os.environ.get('PDF_RETENTION_DAYS', 0))
+PDF_STORE_MAX_BYTES = int(os.environ.get('PDF_STORE_MAX_BYTES', 0))
+RETENTION_INTERVAL = 3600  # Segundos entre verificações automáticas de retenção
+
+# Dicionário de compressão do texto: o zlib só enxerga os últimos 32KB
+DICT_SIZE = 32 * 1024
+DICT_MIN_FRAGMENT = 4
+COMPRESSION_LEVEL = 9
+
+DIGITS_RE = re.compile(r'\d+')
+SHA256_RE = re.compile(r'^[0-9a-f]{64}$')
+
+
+def compress_text(text, zdict=None):
+    """Texto UTF-8 comprimido com zlib (com dicionário, se informado)"""
+    if zdict:
+        compressor = zlib.compressobj(COMPRESSION_LEVEL, zdict=zdict)
+    else:
+        compressor = zlib.compressobj(COMPRESSION_LEVEL)
+    return compressor.compress(text.encode('utf-8')) + compressor.flush()
+
+
+def decompress_text(data, zdict=None):
+    """Inverso de compress_text(); o dicionário precisa ser o mesmo da compressão"""
+    decompressor = zlib.decompressobj(zdict=zdict) if zdict else zlib.decompressobj()
+    return (decompressor.decompress(data) + decompressor.flush()).decode('utf-8')
+
+
+def train_dictionary(texts, size=DICT_SIZE):
+    """Dicionário zlib com os trechos que se repetem entre documentos
+
+    Cada linha é dividida nos números (valores, datas e códigos mudam de uma
+    fatura para outra; os rótulos não). Os trechos presentes em mais de um
+    documento são ordenados por bytes economizados, e os mais valiosos ficam
+    no fim do dicionário, onde as referências do zlib são mais curtas.
+    """
+    counts = Counter()
+    for text in texts:
+        fragments = set()
+        for line in text.splitlines():
+            for fragment in DIGITS_RE.split(line):
+                fragment = fragment.strip()
+                if len(fragment) >= DICT_MIN_FRAGMENT:
+                    fragments.add(fragment)
+        counts.update(fragments)
+
+    ranked = sorted(
+        ((count * len(fragment.encode('utf-8')), fragment) for fragment, count in counts.items() if count > 1),
+        reverse=True
+    )
+    chosen, total = [], 0
+    for _, fragment in ranked:
+        encoded = fragment.encode('utf-8') + b'\n'
+        if total + len(encoded) > size:
+            continue
+        chosen.append(encoded)
+        total += len(encoded)
+    return b''.join(reversed(chosen))
+
+
+class BlobStore:
+    """PDFs deduplicados pelo SHA-256, com retenção por idade e por tamanho total"""
+
+    def __init__(self, directory=DEFAULT_BLOB_FOLDER, retention_days=PDF_RETENTION_DAYS,
+                 max_bytes=PDF_STORE_MAX_BYTES):
+        self.directory = directory
+        self.retention_days = retention_days
+        self.max_bytes = max_bytes
+        self._last_sweep = 0.0
+        self._sweep_lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, sha256):
+        """Caminho do PDF no armazenamento (dois níveis para não lotar um diretório)"""
+        if not SHA256_RE.match(sha256 or ''):
+            raise ValueError(f"Hash inválido: {sha256}")
+        return os.path.join(self.directory, sha256[:2], f"{sha256}.pdf")
+
+    def exists(self, sha256):
+        return os.path.exists(self.path(sha256))
+
+    def put(self, upload):
+        """Guarda um SpooledUpload pelo hash; retorna (caminho, novo)
+
+        Se o conteúdo já existir, o temporário é descartado e a data do
+        arquivo é renovada (conta como uso recente para a retenção).
+        """
+        path = self.path(upload.sha256)
+        if os.path.exists(path):
+            upload.close()
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+            return path, False
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # os.replace é atômico: envios simultâneos do mesmo PDF gravam o mesmo conteúdo
+        upload.persist(path)
+        self._maybe_enforce_retention()
+        return path, True
+
+    def remove(self, sha256):
+        """Remove o PDF (ex.: rejeitado na validação); ignora se não existir"""
+        try:
+            os.remove(self.path(sha256))
+        except FileNotFoundError:
+            pass
+
+    def _iter_blobs(self):
+        for entry in os.scandir(self.directory):
+            if not entry.is_dir():
+                continue
+            for blob in os.scandir(entry.path):
+                if blob.name.endswith('.pdf'):
+                    stat = blob.stat()
+                    yield blob.path, stat.st_size, stat.st_mtime
+
+    def stats(self):
+        """Quantidade e tamanho total dos PDFs armazenados"""
+        count = total = 0
+        for _, size, _ in self._iter_blobs():
+            count += 1
+            total += size
+        return {'pdfs': count, 'bytes': total}
+
+    def _maybe_enforce_retention(self):
+        if not (self.retention_days or self.max_bytes):
+            return
+        if time.time() - self._last_sweep < RETENTION_INTERVAL or not self._sweep_lock.acquire(blocking=False):
+            return
+        try:
+            self._last_sweep = time.time()
+            self.enforce_retention()
+        except Exception as e:
+            logger.warning(f"Erro ao aplicar retenção dos PDFs: {str(e)}")
+        finally:
+            self._sweep_lock.release()
+
+    def enforce_retention(self):
+        """Remove PDFs mais antigos que a retenção e, se preciso, os mais antigos até caber no limite"""
+        blobs = sorted(self._iter_blobs(), key=lambda blob: blob[2])
+        total = sum(size for _, size, _ in blobs)
+        cutoff = time.time() - self.retention_days * 86400 if self.retention_days else None
+        removed = freed = 0
+        for path, size, mtime in blobs:
+            expired = cutoff is not None and mtime < cutoff
+            over_limit = self.max_bytes and total > self.max_bytes
+            if not (expired or over_limit):
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+            freed += size
+        if removed:
+            logger.info(f"Retenção de PDFs: {removed} arquivo(s) removido(s), {freed} bytes liberados")
+        return removed, freed
+
+
+def main(argv):
+    if len(argv) < 2 or argv[1] not in ('estatisticas', 'limpar'):
+        print(__doc__)
+        return 1
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    store = BlobStore(argv[2] if len(argv) > 2 else DEFAULT_BLOB_FOLDER)
+
+    if argv[1] == 'estatisticas':
+        stats = store.stats()
+        print(f"📁 {store.directory}: {stats['pdfs']} PDF(s), {stats['bytes']} bytes")
+    else:
+        if not (store.retention_days or store.max_bytes):
+            print("Nenhuma política de retenção configurada (PDF_RETENTION_DAYS / PDF_STORE_MAX_BYTES)")
+            return 1
+        removed, freed = store.enforce_retention()
+        print(f"✅ {removed} PDF(s) removido(s), {freed} bytes liberados")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,266 @@
+"""
+Ingestão em lote de um diretório de PDFs
+Percorre a árvore de diretórios, extrai o texto em um pool de processos com a
+mesma lógica do /upload (pipeline.py: cache, validação, extração por página)
+e grava os registros em lotes. Cada PDF é copiado para o armazenamento por
+hash (uploads/blobs), como um upload: os registros não dependem do
+diretório de origem continuar existindo. Um arquivo de checkpoint permite retomar uma execução
+interrompida sem reprocessar os arquivos já concluídos.
+
+Uso:
+    python bulk_ingest.py <diretorio> [--workers N] [--lote N] [--checkpoint arquivo]
+                          [--repetir-falhas]
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import logging
+import argparse
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import pdf_extraction
+from upload_stream import spool_stream
+from pipeline import UPLOAD_FOLDER, pdf_store, process_pdf_job, extracted_data, new_log_entry, save_entries
+from structured_logging import set_console_level
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHECKPOINT_FILE = 'ingestao_checkpoint.jsonl'
+PROGRESS_INTERVAL = 2.0  # Segundos entre linhas de progresso
+MAX_FAILURES_SHOWN = 20
+
+
+def find_pdfs(directory):
+    """Caminhos absolutos dos PDFs da árvore, em ordem estável"""
+    paths = []
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for name in sorted(files):
+            if name.lower().endswith('.pdf'):
+                paths.append(os.path.abspath(os.path.join(root, name)))
+    return paths
+
+
+def _file_key(path):
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+class Checkpoint:
+    """Arquivo JSONL com o resultado de cada PDF já tratado (um por linha, só acréscimos)"""
+
+    def __init__(self, path):
+        self.path = path
+        self.done = {}
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        item = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # Linha incompleta de uma execução interrompida
+                    self.done[item['caminho']] = item
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def is_done(self, path, retry_failures=False):
+        """PDF já tratado e não modificado desde então"""
+        item = self.done.get(path)
+        if item is None or (retry_failures and item['status'] != 'ok'):
+            return False
+        try:
+            return (item['tamanho'], item['mtime_ns']) == _file_key(path)
+        except OSError:
+            return False
+
+    def mark(self, items):
+        """Registra arquivos concluídos e força a gravação em disco"""
+        for item in items:
+            self._file.write(json.dumps(item, ensure_ascii=False) + "\n")
+            self.done[item['caminho']] = item
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+
+def _init_worker():
+    # O paralelismo fica entre arquivos; cada worker extrai as páginas em série
+    pdf_extraction.PARALLEL_WORKERS = 1
+
+
+def _process_file(path):
+    """Executado no worker: copia o PDF para o armazenamento e extrai o texto; retorna (caminho, resultado, erro)"""
+    sha256 = novo = None
+    try:
+        # Cópia em blocos com o hash calculado na mesma passagem, como no /upload
+        with open(path, 'rb') as f:
+            upload = spool_stream(f, UPLOAD_FOLDER)
+        sha256 = upload.sha256
+        stored_path, novo = pdf_store.put(upload)
+        result = process_pdf_job(stored_path, sha256)
+        result.update(sha256=sha256, caminho=stored_path)
+        return path, result, None
+    except Exception as e:
+        # Só descarta o PDF se ele foi gravado por esta execução
+        if novo:
+            pdf_store.remove(sha256)
+        return path, None, str(e)
+
+
+def _build_entry(path, result):
+    size, mtime_ns = _file_key(path)
+    nome = os.path.basename(path)
+    data = {
+        **extracted_data(result['pdf_content'], result['extraction_methods'], nome),
+        'arquivo': {
+            'nome_original': nome,
+            'nome_salvo': os.path.basename(result['caminho']),
+            'tamanho': size,
+            'caminho': result['caminho'],
+            'caminho_origem': path,
+            'sha256': result['sha256']
+        },
+        'status': 'processado',
+        'origem': 'ingestao_em_lote',
+        'ip_address': None,
+        'user_agent': None
+    }
+    # ID determinístico (caminho + conteúdo): reexecuções não duplicam registros
+    record_id = str(uuid.uuid5(uuid.NAMESPACE_URL, f"{path}|{result['sha256']}"))
+    checkpoint_item = {'caminho': path, 'tamanho': size, 'mtime_ns': mtime_ns,
+                       'status': 'ok', 'registro': record_id}
+    return new_log_entry(data, record_id=record_id), checkpoint_item
+
+
+class BulkIngest:
+    """Coordena o pool de extração, a gravação em lotes e o checkpoint"""
+
+    def __init__(self, workers, batch_size, checkpoint):
+        self.workers = workers
+        self.batch_size = batch_size
+        self.checkpoint = checkpoint
+        self.stats = {'processados': 0, 'novos': 0, 'existentes': 0, 'cache': 0, 'falhas': 0}
+        self.failures = []
+        self._entries = []
+        self._items = []
+
+    def _flush(self):
+        if not self._entries:
+            return
+        saved = save_entries(self._entries)
+        self.stats['novos'] += len(saved)
+        self.stats['existentes'] += len(self._entries) - len(saved)
+        # Só marca no checkpoint depois que o lote foi gravado
+        self.checkpoint.mark(self._items)
+        self._entries, self._items = [], []
+
+    def _handle(self, path, result, error):
+        self.stats['processados'] += 1
+        if error is None:
+            try:
+                entry, item = _build_entry(path, result)
+            except Exception as e:
+                error = str(e)
+            else:
+                self.stats['cache'] += 1 if result.get('cache_hit') else 0
+                self._entries.append(entry)
+                self._items.append(item)
+                if len(self._entries) >= self.batch_size:
+                    self._flush()
+                return
+        self.stats['falhas'] += 1
+        self.failures.append((path, error))
+        try:
+            size, mtime_ns = _file_key(path)
+        except OSError:
+            size, mtime_ns = None, None
+        self.checkpoint.mark([{'caminho': path, 'tamanho': size, 'mtime_ns': mtime_ns,
+                               'status': 'erro', 'erro': error}])
+
+    def run(self, paths):
+        """Processa os caminhos com no máximo workers * 4 arquivos em andamento"""
+        start = last_report = time.monotonic()
+        pending = iter(paths)
+        in_flight = set()
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker) as executor:
+            try:
+                while True:
+                    while len(in_flight) < self.workers * 4:
+                        path = next(pending, None)
+                        if path is None:
+                            break
+                        in_flight.add(executor.submit(_process_file, path))
+                    if not in_flight:
+                        break
+                    done, in_flight = wait(in_flight, timeout=PROGRESS_INTERVAL, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        self._handle(*future.result())
+                    if time.monotonic() - last_report >= PROGRESS_INTERVAL:
+                        last_report = time.monotonic()
+                        self._report_progress(len(paths), last_report - start)
+                self._flush()
+            except KeyboardInterrupt:
+                for future in in_flight:
+                    future.cancel()
+                self._flush()
+                raise
+        return time.monotonic() - start
+
+    def _report_progress(self, total, elapsed):
+        done = self.stats['processados']
+        rate = done / elapsed if elapsed else 0.0
+        print(f"  {done}/{total} arquivos ({rate:.1f} arquivos/s, {self.stats['falhas']} falha(s))", flush=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ingestão em lote de um diretório de PDFs")
+    parser.add_argument('diretorio')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help="processos de extração (padrão: número de CPUs)")
+    parser.add_argument('--lote', type=int, default=100, help="registros por gravação")
+    parser.add_argument('--checkpoint', default=DEFAULT_CHECKPOINT_FILE)
+    parser.add_argument('--repetir-falhas', action='store_true',
+                        help="tenta novamente os arquivos que falharam em execuções anteriores")
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.diretorio):
+        print(f"❌ Diretório não encontrado: {args.diretorio}")
+        return 1
+
+    # Os logs por arquivo continuam em sistema_logs.log; o terminal mostra só o progresso
+    set_console_level(logging.WARNING)
+
+    checkpoint = Checkpoint(args.checkpoint)
+    paths = find_pdfs(args.diretorio)
+    pending = [p for p in paths if not checkpoint.is_done(p, args.repetir_falhas)]
+    print(f"📁 {len(paths)} PDF(s) encontrado(s), {len(paths) - len(pending)} já no checkpoint, "
+          f"{len(pending)} a processar com {args.workers} worker(s)")
+
+    ingest = BulkIngest(args.workers, args.lote, checkpoint)
+    try:
+        elapsed = ingest.run(pending)
+    except KeyboardInterrupt:
+        checkpoint.close()
+        print(f"\n⏹️  Interrompido após {ingest.stats['processados']} arquivo(s); "
+              "execute o mesmo comando para retomar")
+        return 130
+    checkpoint.close()
+
+    stats = ingest.stats
+    rate = stats['processados'] / elapsed if elapsed else 0.0
+    print(f"\n✅ {stats['processados']} arquivo(s) em {elapsed:.1f}s ({rate:.1f} arquivos/s)")
+    print(f"   Novos registros: {stats['novos']} | Já existentes: {stats['existentes']} | "
+          f"Cache de extração: {stats['cache']} | Falhas: {stats['falhas']}")
+    for path, error in ingest.failures[:MAX_FAILURES_SHOWN]:
+        print(f"   ❌ {path}: {error}")
+    if len(ingest.failures) > MAX_FAILURES_SHOWN:
+        print(f"   ... e mais {len(ingest.failures) - MAX_FAILURES_SHOWN} falha(s) (ver {args.checkpoint})")
+    return 1 if stats['falhas'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
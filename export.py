@@ -0,0 +1,176 @@
+"""
+Exportação dos registros em fluxo contínuo
+Os registros são lidos em lotes do armazenamento e convertidos um a um por
+geradores: a memória usada não depende do tamanho do histórico e a resposta
+começa a ser enviada assim que o primeiro registro é lido.
+
+Formatos:
+    ndjson  um registro JSON por linha (mesmo formato do armazenamento)
+    csv     colunas da tabela do sink MySQL (db_sink.COLUMNS) e os campos estruturados
+    sql     dump MySQL: CREATE TABLE + INSERT de múltiplas linhas com upsert pelo ID,
+            com os campos estruturados tipados em registros_pdf_campos
+
+Uso:
+    python export.py <ndjson|csv|sql> [--de AAAA-MM-DD] [--ate AAAA-MM-DD] [--status STATUS]
+                     [--saida arquivo] [--banco registros.db] [--lote N] [--regras regras_campos.json]
+"""
+
+import io
+import os
+import sys
+import csv
+import json
+import argparse
+from datetime import datetime
+
+from db_sink import (COLUMNS, MYSQL_SCHEMA, TABLE_NAME, record_to_row,
+                     CAMPOS_COLUMNS, CAMPOS_KEY, CAMPOS_TABLE, MYSQL_CAMPOS_SCHEMA, record_to_field_rows)
+from field_extraction import FieldExtractor, load_rules
+from record_store import RecordStore, DEFAULT_DB_FILE
+
+SQL_BATCH_ROWS = 100
+SQL_MAX_STATEMENT_BYTES = 1024 * 1024  # Bem abaixo do max_allowed_packet padrão do MySQL
+
+# Escape de strings do MySQL (mesmo conjunto do mysql_real_escape_string)
+MYSQL_ESCAPES = str.maketrans({
+    '\\': '\\\\',
+    "'": "\\'",
+    '"': '\\"',
+    '\0': '\\0',
+    '\n': '\\n',
+    '\r': '\\r',
+    '\x1a': '\\Z'
+})
+
+
+def mysql_literal(value):
+    """Valor Python como literal SQL do MySQL"""
+    if value is None:
+        return 'NULL'
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if isinstance(value, (int, float)):
+        return repr(value)
+    return "'" + str(value).translate(MYSQL_ESCAPES) + "'"
+
+
+def ndjson_lines(entries):
+    for entry in entries:
+        yield json.dumps(entry, ensure_ascii=False, separators=(',', ':')) + "\n"
+
+
+def csv_lines(entries):
+    """CSV com cabeçalho; campos estruturados como JSON em uma coluna própria"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS + ('campos',))
+    for entry in entries:
+        campos = (entry.get('data') or {}).get('campos')
+        writer.writerow(record_to_row(entry) + (json.dumps(campos, ensure_ascii=False) if campos else None,))
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    # Cabeçalho sem registros
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def _upsert_statement(table, columns, key, rows):
+    updates = ', '.join(f'{col} = VALUES({col})' for col in columns if col not in key)
+    return (f"INSERT INTO {table} ({', '.join(columns)}) VALUES\n" + ',\n'.join(rows)
+            + f"\nON DUPLICATE KEY UPDATE {updates};\n")
+
+
+def _literal_row(values):
+    return '(' + ', '.join(mysql_literal(value) for value in values) + ')'
+
+
+def sql_dump(entries, batch_rows=SQL_BATCH_ROWS, max_statement_bytes=SQL_MAX_STATEMENT_BYTES, field_types=None):
+    """Dump MySQL com INSERTs de até batch_rows linhas (ou max_statement_bytes)
+
+    Cada lote de registros é seguido do INSERT dos seus campos estruturados,
+    tipados por `field_types` ({nome: tipo}, ver FieldExtractor.types).
+    """
+    yield f"-- Exportação de registros ({datetime.now().isoformat(timespec='seconds')})\n"
+    yield "SET NAMES utf8mb4;\n"
+    yield MYSQL_SCHEMA.strip() + ";\n"
+    yield MYSQL_CAMPOS_SCHEMA.strip() + ";\n\n"
+
+    rows, field_rows, size = [], [], 0
+    for entry in entries:
+        row = _literal_row(record_to_row(entry))
+        rows.append(row)
+        size += len(row)
+        for values in record_to_field_rows(entry, field_types):
+            field_rows.append(_literal_row(values))
+            size += len(field_rows[-1])
+        if len(rows) >= batch_rows or size >= max_statement_bytes:
+            yield _upsert_statement(TABLE_NAME, COLUMNS, ('id',), rows)
+            if field_rows:
+                yield _upsert_statement(CAMPOS_TABLE, CAMPOS_COLUMNS, CAMPOS_KEY, field_rows)
+            rows, field_rows, size = [], [], 0
+    if rows:
+        yield _upsert_statement(TABLE_NAME, COLUMNS, ('id',), rows)
+    if field_rows:
+        yield _upsert_statement(CAMPOS_TABLE, CAMPOS_COLUMNS, CAMPOS_KEY, field_rows)
+
+
+FORMATS = {
+    'ndjson': (ndjson_lines, 'application/x-ndjson', 'ndjson'),
+    'csv': (csv_lines, 'text/csv; charset=utf-8', 'csv'),
+    'sql': (sql_dump, 'application/sql; charset=utf-8', 'sql')
+}
+
+
+def export_filename(formato):
+    return f"registros_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{FORMATS[formato][2]}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Exportação dos registros coletados")
+    parser.add_argument('formato', choices=sorted(FORMATS))
+    parser.add_argument('--de', help="data inicial (AAAA-MM-DD)")
+    parser.add_argument('--ate', help="data final, inclusiva (AAAA-MM-DD)")
+    parser.add_argument('--status')
+    parser.add_argument('--saida', help="arquivo de saída (padrão: saída padrão)")
+    parser.add_argument('--banco', default=None, help="banco de registros (padrão: RECORDS_DB ou registros.db)")
+    parser.add_argument('--lote', type=int, default=SQL_BATCH_ROWS, help="linhas por INSERT no formato sql")
+    parser.add_argument('--regras', default=os.environ.get('FIELD_RULES_FILE', 'regras_campos.json'),
+                        help="regras dos campos, para os tipos no formato sql (padrão: FIELD_RULES_FILE)")
+    args = parser.parse_args(argv)
+
+    filtros = {}
+    try:
+        for campo, valor in (('date_from', args.de), ('date_to', args.ate)):
+            if valor:
+                datetime.strptime(valor, '%Y-%m-%d')
+                filtros[campo] = valor
+    except ValueError:
+        print("❌ Datas devem estar no formato AAAA-MM-DD", file=sys.stderr)
+        return 1
+    if args.status:
+        filtros['status'] = args.status
+
+    store = RecordStore(args.banco or os.environ.get('RECORDS_DB', DEFAULT_DB_FILE))
+
+    generator = FORMATS[args.formato][0]
+    entries = store.iter_chronological(**filtros)
+    if args.formato == 'sql':
+        chunks = generator(entries, batch_rows=args.lote, field_types=FieldExtractor(load_rules(args.regras)).types)
+    else:
+        chunks = generator(entries)
+
+    out = open(args.saida, 'w', encoding='utf-8', newline='') if args.saida else sys.stdout
+    try:
+        for chunk in chunks:
+            out.write(chunk)
+    finally:
+        if args.saida:
+            out.close()
+    if args.saida:
+        print(f"✅ Exportação gravada em {args.saida}", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
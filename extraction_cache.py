@@ -0,0 +1,188 @@
+"""
+Cache persistente de extração de texto
+Indexado pelo SHA-256 do PDF + versões das bibliotecas de extração, com
+remoção LRU limitada por tamanho e contadores de acertos/falhas.
+Consultas só leem: acertos, falhas e o horário do último acesso ficam em
+memória e são gravados juntos, em uma transação, a cada
+ACCESS_FLUSH_INTERVAL segundos, antes de cada gravação e em stats().
+Em processos filhos (pool de jobs, ingestão em lote), que saem sem rodar o
+atexit, cada consulta é gravada na hora.
+"""
+
+import atexit
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+HASH_CHUNK_SIZE = 1024 * 1024  # 1MB
+# Segundos entre gravações dos contadores e acessos acumulados em memória
+ACCESS_FLUSH_INTERVAL = float(os.environ.get('CACHE_ACCESS_FLUSH_INTERVAL', 5.0))
+
+
+def sha256_file(fileobj, chunk_size=HASH_CHUNK_SIZE):
+    """Calcula o SHA-256 de um arquivo aberto em blocos, sem carregá-lo inteiro na memória"""
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: fileobj.read(chunk_size), b''):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ExtractionCache:
+    """Cache de texto extraído em SQLite, compartilhado entre processos"""
+
+    def __init__(self, path, engine_versions, max_bytes=256 * 1024 * 1024):
+        self.path = path
+        self.engine_key = json.dumps(engine_versions, sort_keys=True)
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        # Acessos ainda não gravados: contadores e {sha256: último acesso}
+        self._pending_lock = threading.Lock()
+        self._pending_hits = 0
+        self._pending_misses = 0
+        self._pending_access = {}
+        self._pending_pid = os.getpid()
+        self._owner_pid = os.getpid()
+        self._last_flush = time.monotonic()
+        self._init_db()
+        atexit.register(self.flush)
+
+    def _conn(self):
+        # Uma conexão por thread e por processo (conexões não sobrevivem a fork)
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _init_db(self):
+        with self._conn() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS cache (
+                    sha256 TEXT NOT NULL,
+                    engines TEXT NOT NULL,
+                    text TEXT NOT NULL,
+                    methods TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    last_access REAL NOT NULL,
+                    PRIMARY KEY (sha256, engines)
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_cache_last_access ON cache(last_access)')
+            conn.execute('CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+            conn.execute("INSERT OR IGNORE INTO counters VALUES ('hits', 0), ('misses', 0), ('evictions', 0)")
+
+    def _incr(self, conn, name, amount=1):
+        conn.execute('UPDATE counters SET value = value + ? WHERE name = ?', (amount, name))
+
+    def get(self, sha256):
+        """Retorna (texto, métodos) em caso de acerto ou None (apenas leitura)"""
+        row = self._conn().execute(
+            'SELECT text, methods FROM cache WHERE sha256 = ? AND engines = ?',
+            (sha256, self.engine_key)
+        ).fetchone()
+        with self._pending_lock:
+            self._discard_inherited()
+            if row is None:
+                self._pending_misses += 1
+            else:
+                self._pending_hits += 1
+                self._pending_access[sha256] = time.time()
+            due = (os.getpid() != self._owner_pid
+                   or time.monotonic() - self._last_flush >= ACCESS_FLUSH_INTERVAL)
+        if due:
+            self.flush()
+        return (row[0], json.loads(row[1])) if row is not None else None
+
+    def _discard_inherited(self):
+        # Acessos copiados por um fork pertencem ao processo pai, que os grava
+        if self._pending_pid != os.getpid():
+            self._pending_hits = self._pending_misses = 0
+            self._pending_access = {}
+            self._pending_pid = os.getpid()
+
+    def _take_pending(self):
+        with self._pending_lock:
+            self._discard_inherited()
+            pending = self._pending_hits, self._pending_misses, self._pending_access
+            self._pending_hits = self._pending_misses = 0
+            self._pending_access = {}
+            self._last_flush = time.monotonic()
+        return pending
+
+    def _write_pending(self, conn, pending):
+        hits, misses, access = pending
+        if hits:
+            self._incr(conn, 'hits', hits)
+        if misses:
+            self._incr(conn, 'misses', misses)
+        if access:
+            conn.executemany(
+                'UPDATE cache SET last_access = MAX(last_access, ?) WHERE sha256 = ? AND engines = ?',
+                [(accessed, sha256, self.engine_key) for sha256, accessed in access.items()]
+            )
+
+    def flush(self):
+        """Grava em uma transação os contadores e horários de acesso acumulados"""
+        pending = self._take_pending()
+        if not any(pending):
+            return
+        try:
+            with self._conn() as conn:
+                self._write_pending(conn, pending)
+        except sqlite3.Error as e:
+            logger.warning(f"Erro ao gravar acessos do cache de extração: {str(e)}")
+
+    def put(self, sha256, text, methods):
+        """Armazena o resultado de uma extração e aplica a remoção LRU"""
+        size = len(text.encode('utf-8'))
+        if size > self.max_bytes:
+            return
+        conn = self._conn()
+        with conn:
+            # Acessos pendentes entram antes da remoção LRU, que depende deles
+            self._write_pending(conn, self._take_pending())
+            conn.execute(
+                'INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?, ?, ?)',
+                (sha256, self.engine_key, text, json.dumps(methods), size, time.time())
+            )
+            self._evict(conn)
+
+    def _evict(self, conn):
+        """Remove as entradas menos usadas recentemente até respeitar max_bytes"""
+        # Uma instrução: soma acumulada do mais recente ao mais antigo; sai o que passar do limite
+        evicted = conn.execute('''
+            DELETE FROM cache WHERE rowid IN (
+                SELECT rowid FROM (
+                    SELECT rowid, SUM(size) OVER (ORDER BY last_access DESC, rowid DESC) AS running
+                    FROM cache
+                ) WHERE running > ?
+            )
+        ''', (self.max_bytes,)).rowcount
+        if evicted:
+            self._incr(conn, 'evictions', evicted)
+            logger.info(f"Cache de extração: {evicted} entrada(s) removida(s) por LRU")
+
+    def stats(self):
+        """Contadores de acertos/falhas e ocupação do cache"""
+        self.flush()
+        conn = self._conn()
+        counters = dict(conn.execute('SELECT name, value FROM counters').fetchall())
+        entries, total = conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache').fetchone()
+        lookups = counters['hits'] + counters['misses']
+        return {
+            'acertos': counters['hits'],
+            'falhas': counters['misses'],
+            'remocoes': counters['evictions'],
+            'taxa_acerto': round(counters['hits'] / lookups, 4) if lookups else 0.0,
+            'entradas': entries,
+            'bytes': total,
+            'max_bytes': self.max_bytes
+        }
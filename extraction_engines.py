@@ -0,0 +1,287 @@
+"""
+Registro dos motores de extração de PDF
+Cada motor declara o módulo que usa, suas capacidades e um custo relativo.
+O módulo só é importado no primeiro uso (PyMuPDF e pdfplumber/pdfminer
+custam centenas de milissegundos para importar), e a disponibilidade e a
+versão vêm dos metadados do pacote, sem importá-lo.
+
+Configuração:
+    EXTRACTION_ENGINES  motores habilitados, na ordem da cadeia
+                        (padrão: PyMuPDF,PyPDF2,pdfplumber,PyMuPDF-OCR)
+    ENGINE_TIMEOUT      tempo limite de uma chamada a um motor, em segundos (padrão 60)
+    ENGINE_TIMEOUT_<MOTOR>  tempo limite de um motor específico
+                        (ex.: ENGINE_TIMEOUT_PDFPLUMBER=120, ENGINE_TIMEOUT_PYMUPDF_OCR=30)
+
+Capacidades:
+    texto     extrai o texto das páginas (o primeiro habilitado faz a passagem
+              em todas as páginas; os seguintes, só nas páginas de nota baixa)
+    tabelas   também devolve as tabelas da página
+    imagens   detecta imagens em páginas sem texto (último recurso)
+    contagem  conta as páginas do documento (validação); com `head`, conta e
+              extrai as primeiras páginas na mesma abertura do arquivo
+
+warm_up() importa os motores habilitados; chamado no master do gunicorn
+antes do fork (gunicorn.conf.py), os workers compartilham as páginas de
+memória desses módulos por copy-on-write.
+"""
+
+import os
+import re
+import logging
+import importlib
+import importlib.util
+import importlib.metadata
+import threading
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ENGINE_ORDER = ('PyMuPDF', 'PyPDF2', 'pdfplumber', 'PyMuPDF-OCR')
+ENGINE_TIMEOUT = float(os.environ.get('ENGINE_TIMEOUT', 60))
+
+
+class Engine:
+    """Motor de extração com importação sob demanda"""
+
+    def __init__(self, name, module, distribution, pages, capabilities, cost, count=None, head=None):
+        self.name = name
+        self.module_name = module
+        self.distribution = distribution
+        self.pages_func = pages
+        self.count_func = count
+        self.head_func = head
+        self.capabilities = frozenset(capabilities)
+        self.cost = cost
+        self._module = None
+        self._available = None
+        self._lock = threading.Lock()
+
+    @property
+    def available(self):
+        """Pacote instalado (verificado sem importar o módulo)"""
+        if self._available is None:
+            self._available = importlib.util.find_spec(self.module_name) is not None
+        return self._available
+
+    @property
+    def version(self):
+        try:
+            return importlib.metadata.version(self.distribution)
+        except importlib.metadata.PackageNotFoundError:
+            return None
+
+    @property
+    def timeout(self):
+        """Tempo limite de uma chamada (aplicado pela execução isolada em sandbox.py)"""
+        key = 'ENGINE_TIMEOUT_' + re.sub(r'\W', '_', self.name).upper()
+        return float(os.environ.get(key, ENGINE_TIMEOUT))
+
+    @property
+    def loaded(self):
+        return self._module is not None
+
+    def load(self):
+        """Importa o módulo do motor (uma única vez por processo)"""
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    self._module = importlib.import_module(self.module_name)
+        return self._module
+
+    def extract(self, pdf_path, page_numbers):
+        """Extrai as páginas indicadas (base 0); o formato de cada item depende do motor"""
+        return self.pages_func(self.load(), pdf_path, page_numbers)
+
+    def count_pages(self, pdf_path):
+        return self.count_func(self.load(), pdf_path)
+
+    def extract_head(self, pdf_path, limit):
+        """Conta as páginas e extrai as primeiras `limit` abrindo o documento uma vez; retorna (total, páginas)"""
+        if self.head_func is not None:
+            return self.head_func(self.load(), pdf_path, limit)
+        total = self.count_pages(pdf_path)
+        return total, self.extract(pdf_path, list(range(min(limit, total))))
+
+    def __getstate__(self):
+        # Enviado aos workers do sandbox (motores registrados em tempo de execução
+        # não existem no servidor de fork); o módulo é importado de novo lá
+        state = self.__dict__.copy()
+        state.update(_module=None, _lock=None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f"<Engine {self.name} custo={self.cost} {sorted(self.capabilities)}>"
+
+
+def _pymupdf_read(doc, page_numbers):
+    return [(page_num, doc.load_page(page_num).get_text()) for page_num in page_numbers]
+
+
+def _pymupdf_pages(fitz, pdf_path, page_numbers):
+    """Extrai as páginas indicadas com PyMuPDF; retorna [(página, texto)]"""
+    with fitz.open(pdf_path) as doc:
+        return _pymupdf_read(doc, page_numbers)
+
+
+def _pymupdf_count(fitz, pdf_path):
+    with fitz.open(pdf_path) as doc:
+        return len(doc)
+
+
+def _pymupdf_head(fitz, pdf_path, limit):
+    with fitz.open(pdf_path) as doc:
+        return len(doc), _pymupdf_read(doc, range(min(limit, len(doc))))
+
+
+def _pdfplumber_read(pdf, page_numbers):
+    results = []
+    for page_num in page_numbers:
+        page = pdf.pages[page_num]
+        try:
+            results.append((page_num, page.extract_text() or '', page.extract_tables()))
+        finally:
+            # Libera os objetos e o layout analisados da página; sem isso o pdfplumber
+            # mantém o cache de todas as páginas até o documento ser fechado
+            page.close()
+    return results
+
+
+def _pdfplumber_pages(pdfplumber, pdf_path, page_numbers):
+    """Extrai texto e tabelas das páginas indicadas com pdfplumber; retorna [(página, texto, tabelas)]"""
+    with pdfplumber.open(pdf_path) as pdf:
+        return _pdfplumber_read(pdf, page_numbers)
+
+
+def _pdfplumber_count(pdfplumber, pdf_path):
+    with pdfplumber.open(pdf_path) as pdf:
+        return len(pdf.pages)
+
+
+def _pdfplumber_head(pdfplumber, pdf_path, limit):
+    with pdfplumber.open(pdf_path) as pdf:
+        total = len(pdf.pages)
+        return total, _pdfplumber_read(pdf, range(min(limit, total)))
+
+
+def _pypdf2_read(pdf_reader, page_numbers):
+    results = []
+    for page_num in page_numbers:
+        try:
+            results.append((page_num, pdf_reader.pages[page_num].extract_text() or ''))
+        except Exception as e:
+            logger.warning(f"Erro ao extrair texto da página {page_num + 1} com PyPDF2: {str(e)}")
+            results.append((page_num, None))
+    return results
+
+
+def _pypdf2_pages(PyPDF2, pdf_path, page_numbers):
+    """Extrai as páginas indicadas com PyPDF2; texto None indica erro na página"""
+    with open(pdf_path, 'rb') as file:
+        return _pypdf2_read(PyPDF2.PdfReader(file), page_numbers)
+
+
+def _pypdf2_count(PyPDF2, pdf_path):
+    with open(pdf_path, 'rb') as file:
+        return len(PyPDF2.PdfReader(file).pages)
+
+
+def _pypdf2_head(PyPDF2, pdf_path, limit):
+    with open(pdf_path, 'rb') as file:
+        pdf_reader = PyPDF2.PdfReader(file)
+        total = len(pdf_reader.pages)
+        return total, _pypdf2_read(pdf_reader, range(min(limit, total)))
+
+
+def _ocr_pages(fitz, pdf_path, page_numbers):
+    """Detecta imagens e extrai qualquer texto visível com PyMuPDF; retorna [(página, texto, imagens)]"""
+    results = []
+    doc = fitz.open(pdf_path)
+    try:
+        for page_num in page_numbers:
+            page = doc.load_page(page_num)
+            results.append((page_num, page.get_text("text"), len(page.get_images())))
+    finally:
+        doc.close()
+    return results
+
+
+ENGINES = {}
+
+
+def register(engine):
+    """Adiciona (ou substitui) um motor no registro"""
+    ENGINES[engine.name] = engine
+    return engine
+
+
+register(Engine('PyMuPDF', 'fitz', 'PyMuPDF', _pymupdf_pages, {'texto', 'contagem'}, cost=1,
+                count=_pymupdf_count, head=_pymupdf_head))
+register(Engine('PyPDF2', 'PyPDF2', 'PyPDF2', _pypdf2_pages, {'texto', 'contagem'}, cost=2,
+                count=_pypdf2_count, head=_pypdf2_head))
+register(Engine('pdfplumber', 'pdfplumber', 'pdfplumber', _pdfplumber_pages, {'texto', 'tabelas', 'contagem'},
+                cost=5, count=_pdfplumber_count, head=_pdfplumber_head))
+register(Engine('PyMuPDF-OCR', 'fitz', 'PyMuPDF', _ocr_pages, {'imagens'}, cost=3))
+
+
+def configured_order():
+    """Nomes dos motores na ordem configurada em EXTRACTION_ENGINES"""
+    value = os.environ.get('EXTRACTION_ENGINES', '')
+    names = [name.strip() for name in value.split(',') if name.strip()] or list(DEFAULT_ENGINE_ORDER)
+    for name in names:
+        if name not in ENGINES:
+            logger.warning(f"Motor de extração desconhecido em EXTRACTION_ENGINES: {name}")
+    return [name for name in names if name in ENGINES]
+
+
+def enabled_engines(capability=None):
+    """Motores habilitados e instalados, na ordem configurada (opcionalmente com uma capacidade)"""
+    return [
+        ENGINES[name] for name in configured_order()
+        if ENGINES[name].available and (capability is None or capability in ENGINES[name].capabilities)
+    ]
+
+
+def engine_versions():
+    """Versões dos pacotes dos motores (chave do cache de extração), sem importá-los"""
+    versions = {}
+    for engine in ENGINES.values():
+        versions.setdefault(engine.distribution, engine.version)
+    return versions
+
+
+def _resolve(engine):
+    """Aceita o nome de um motor registrado ou o próprio Engine"""
+    return engine if isinstance(engine, Engine) else ENGINES[engine]
+
+
+def run_engine(engine, pdf_path, page_numbers):
+    """Ponto de entrada serializável para o pool de processos (o worker importa o motor se preciso)"""
+    return _resolve(engine).extract(pdf_path, page_numbers)
+
+
+def count_with_engine(engine, pdf_path):
+    """Ponto de entrada serializável da contagem de páginas"""
+    return _resolve(engine).count_pages(pdf_path)
+
+
+def run_engine_head(engine, pdf_path, limit):
+    """Ponto de entrada serializável da abertura do documento: (total de páginas, primeiras páginas)"""
+    return _resolve(engine).extract_head(pdf_path, limit)
+
+
+def warm_up(names=None):
+    """Importa os motores habilitados (ou os indicados); retorna os nomes carregados"""
+    loaded = []
+    for engine in (enabled_engines() if names is None else [ENGINES[name] for name in names]):
+        if not engine.available:
+            continue
+        try:
+            engine.load()
+            loaded.append(engine.name)
+        except Exception as e:
+            logger.warning(f"Falha ao carregar o motor {engine.name}: {str(e)}")
+    logger.info(f"Motores de extração pré-carregados: {', '.join(loaded) or 'nenhum'}")
+    return loaded
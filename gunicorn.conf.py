@@ -0,0 +1,80 @@
+"""
+Configuração do gunicorn
+    gunicorn -c gunicorn.conf.py app:app
+    python start.py --producao
+
+A aplicação e os motores de extração são carregados no master antes do
+fork: os workers compartilham essas páginas de memória (copy-on-write) e
+não pagam a importação do PyMuPDF/pdfplumber no primeiro upload.
+
+Sem GUNICORN_WORKERS, o número de workers vem dos núcleos (2 x núcleos + 1)
+limitado pela memória disponível dividida por GUNICORN_WORKER_MEMORY_MB
+(o worker e os processos do sandbox que ele mantém). Cada worker atende
+GUNICORN_THREADS requisições: uploads à espera de uma vaga do controle de
+admissão (admission.py) não bloqueiam as consultas.
+
+Com gthread, o timeout do gunicorn não limita a duração de uma requisição:
+é o prazo do sinal de vida (heartbeat) que o laço principal do worker envia
+ao master, e esse laço continua rodando enquanto as threads processam
+uploads. O tempo de um upload é limitado pela espera na fila de admissão
+(ADMISSION_QUEUE_TIMEOUT) e pelo prazo de cada chamada aos motores no
+sandbox (ENGINE_TIMEOUT, ENGINE_TIMEOUT_<MOTOR>).
+
+Configuração:
+    GUNICORN_BIND               endereço (padrão 0.0.0.0:5000)
+    GUNICORN_WORKERS            número de workers (padrão: calculado)
+    GUNICORN_WORKER_MEMORY_MB   memória reservada por worker no cálculo (padrão 512)
+    GUNICORN_THREADS            threads por worker (padrão 4)
+    GUNICORN_TIMEOUT            segundos sem sinal de vida do worker até ele ser reiniciado (padrão 60)
+    GUNICORN_MAX_REQUESTS       requisições até o worker ser reciclado (padrão 1000; 0 desativa)
+"""
+
+import os
+
+WORKER_MEMORY_MB = int(os.environ.get('GUNICORN_WORKER_MEMORY_MB', 512))
+
+
+def available_memory_mb():
+    """Memória disponível em MB (MemAvailable no Linux; total físico nos demais; None se desconhecida)"""
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) // 1024
+    except OSError:
+        pass
+    try:
+        return os.sysconf('SC_PHYS_PAGES') * os.sysconf('SC_PAGE_SIZE') // (1024 * 1024)
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def default_workers(cpus=None, memory_mb=None):
+    """2 x núcleos + 1, limitado a quantos workers cabem na memória disponível (mínimo 1)"""
+    cpus = cpus or os.cpu_count() or 1
+    memory_mb = available_memory_mb() if memory_mb is None else memory_mb
+    workers = 2 * cpus + 1
+    if memory_mb and WORKER_MEMORY_MB > 0:
+        workers = min(workers, memory_mb // WORKER_MEMORY_MB)
+    return max(workers, 1)
+
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('GUNICORN_WORKERS') or default_workers())
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+# Heartbeat do worker, não prazo por requisição (ver a docstring); a folga cobre chamadas
+# em C que seguram o GIL e atrasam o laço principal (motores fora do sandbox)
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+graceful_timeout = 30
+keepalive = 5
+# Reciclagem periódica devolve a memória fragmentada pelas extrações
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = max_requests // 10
+preload_app = True
+
+
+def on_starting(server):
+    # Executado no master, antes de carregar a aplicação e de criar os workers
+    from extraction_engines import warm_up
+    warm_up()
@@ -0,0 +1,143 @@
+"""
+Fila de jobs de extração assíncrona
+Executa a extração de PDFs em um pool de processos locais e persiste o estado
+de cada job em disco, para que qualquer worker do servidor consiga consultá-lo
+"""
+
+import os
+import json
+import uuid
+import logging
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+STATUS_PENDENTE = 'pendente'
+STATUS_PROCESSANDO = 'processando'
+STATUS_CONCLUIDO = 'concluido'
+STATUS_ERRO = 'erro'
+
+
+def _job_path(jobs_dir, job_id):
+    """Caminho do arquivo de estado de um job"""
+    return os.path.join(jobs_dir, f"{job_id}.json")
+
+
+def _write_job(jobs_dir, job):
+    """Grava o estado do job de forma atômica (arquivo temporário + replace)"""
+    job['atualizado_em'] = datetime.now().isoformat()
+    path = _job_path(jobs_dir, job['id'])
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(job, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def read_job(jobs_dir, job_id):
+    """Lê o estado de um job; retorna None se não existir"""
+    try:
+        job_id = str(uuid.UUID(job_id))  # Impede path traversal via ID
+    except (ValueError, TypeError):
+        return None
+    try:
+        with open(_job_path(jobs_dir, job_id), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+def _run_job(jobs_dir, job, func, args):
+    """Executado no processo filho: marca o job como em processamento e roda a extração"""
+    job['status'] = STATUS_PROCESSANDO
+    job['iniciado_em'] = datetime.now().isoformat()
+    _write_job(jobs_dir, job)
+    return func(*args)
+
+
+class ExtractionJobQueue:
+    """Fila de extração apoiada em um ProcessPoolExecutor"""
+
+    def __init__(self, func, jobs_dir='jobs', max_workers=None, on_complete=None, on_error=None):
+        self.func = func
+        self.jobs_dir = jobs_dir
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.on_complete = on_complete
+        # on_error(job, exceção): limpeza após uma falha (ex.: descartar o PDF recém-gravado)
+        self.on_error = on_error
+        self._executor = None
+        os.makedirs(jobs_dir, exist_ok=True)
+
+    def _get_executor(self):
+        # Criado sob demanda para não herdar o pool através do fork dos workers
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._executor
+
+    def submit(self, *args, context=None, on_done=None):
+        """Enfileira um job e retorna seu ID imediatamente
+
+        on_done(job) é chamado ao fim do job, com sucesso ou erro (ex.: devolver
+        a vaga de admissão do upload).
+        """
+        job = {
+            'id': str(uuid.uuid4()),
+            'status': STATUS_PENDENTE,
+            'criado_em': datetime.now().isoformat(),
+            'contexto': context or {},
+            'record_id': None,
+            'resultado': None,
+            'erro': None
+        }
+        _write_job(self.jobs_dir, job)
+
+        future = self._get_executor().submit(_run_job, self.jobs_dir, dict(job), self.func, args)
+        future.add_done_callback(lambda f: self._finish(job, f, on_done))
+        logger.info(f"Job {job['id']} enfileirado")
+        return job['id']
+
+    def submit_task(self, *args):
+        """Executa func no pool sem estado de job persistido; retorna o Future"""
+        return self._get_executor().submit(self.func, *args)
+
+    def _finish(self, job, future, on_done=None):
+        """Callback no processo principal ao término da extração"""
+        try:
+            self._record_outcome(job, future)
+        finally:
+            if on_done:
+                try:
+                    on_done(job)
+                except Exception as e:
+                    logger.warning(f"Erro ao finalizar o job {job['id']}: {str(e)}")
+
+    def _record_outcome(self, job, future):
+        job = read_job(self.jobs_dir, job['id']) or job
+        try:
+            result = future.result()
+            job['resultado'] = result
+            if self.on_complete:
+                job['record_id'] = self.on_complete(job, result)
+            job['status'] = STATUS_CONCLUIDO
+            logger.info(f"Job {job['id']} concluído")
+        except Exception as e:
+            job['status'] = STATUS_ERRO
+            job['erro'] = str(e)
+            logger.error(f"Job {job['id']} falhou: {str(e)}")
+            if self.on_error:
+                try:
+                    self.on_error(job, e)
+                except Exception as cleanup_error:
+                    logger.warning(f"Erro na limpeza do job {job['id']}: {str(cleanup_error)}")
+        job['finalizado_em'] = datetime.now().isoformat()
+        _write_job(self.jobs_dir, job)
+
+    def get(self, job_id):
+        """Retorna o estado atual do job"""
+        return read_job(self.jobs_dir, job_id)
+
+    def shutdown(self, wait=True):
+        """Encerra o pool de processos"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
@@ -0,0 +1,348 @@
+"""
+Modelos de layout para emissores recorrentes
+Um modelo associa a impressão digital da página 1 (tamanho, fontes e as
+primeiras posições de texto do content stream, calculadas sem extrair o
+texto) às regiões da página onde ficam os campos. Documentos que casam com
+um modelo têm apenas essas regiões lidas com o PyMuPDF (retângulo de clip),
+sem passar pela cadeia de motores; os demais seguem por
+extract_text_from_pdf(). Se o texto de uma região não casar com o padrão
+esperado, o documento também volta para a cadeia completa.
+
+Os modelos são declarados no arquivo LAYOUT_TEMPLATES_FILE (JSON) ou
+aprendidos a partir de amostras do emissor: as regras de field_extraction
+localizam cada campo nas linhas da amostra e a região é a faixa horizontal
+dessas linhas (largura da página, para valores de tamanho variável).
+
+Formato:
+    {"modelos": [{"nome": "energia_sp", "impressao": "4c7dccaf21819e3c",
+                  "regioes": [{"nome": "valor_total", "pagina": 1,
+                               "retangulo": [0, 125, 595, 146],
+                               "padrao": "<regex que o texto da região deve conter (opcional)>"}]}]}
+
+Os modelos são lidos uma vez por processo (reinicie o servidor após alterá-los).
+
+Uso:
+    python layout_templates.py impressao arquivo.pdf [...]
+    python layout_templates.py aprender <nome> amostra.pdf [...]
+    python layout_templates.py testar arquivo.pdf [...]
+    python layout_templates.py listar
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import hashlib
+import logging
+
+from extraction_engines import ENGINES
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TEMPLATES_FILE = 'modelos_layout.json'
+LAYOUT_TEMPLATES_FILE = os.environ.get('LAYOUT_TEMPLATES_FILE', DEFAULT_TEMPLATES_FILE)
+
+# Posições de texto (operandos de Td/TD/Tm) que entram na impressão digital e a
+# grade em pontos usada para arredondá-las
+FINGERPRINT_POSITIONS = 8
+FINGERPRINT_GRID = 5
+# Margem vertical das regiões aprendidas, em pontos
+REGION_PADDING = 2
+
+NUMBER = rb'(-?(?:\d+\.?\d*|\.\d+))'
+POSITION_RE = re.compile(NUMBER + rb'\s+' + NUMBER + rb'\s+(?:Td|TD|Tm)\b')
+
+
+def _grid(value):
+    return int(round(float(value) / FINGERPRINT_GRID) * FINGERPRINT_GRID)
+
+
+def fingerprint_page(doc, page):
+    """Impressão digital do layout da página: tamanho, fontes e primeiras posições de texto"""
+    fonts = sorted({font[3].split('+')[-1] for font in page.get_fonts()})
+    positions = []
+    for xref in page.get_contents():
+        for match in POSITION_RE.finditer(doc.xref_stream(xref) or b''):
+            positions.append((_grid(match.group(1)), _grid(match.group(2))))
+            if len(positions) >= FINGERPRINT_POSITIONS:
+                break
+        if len(positions) >= FINGERPRINT_POSITIONS:
+            break
+    key = [_grid(page.rect.width), _grid(page.rect.height), fonts, positions]
+    return hashlib.sha1(json.dumps(key).encode()).hexdigest()[:16]
+
+
+def fingerprint(pdf_path):
+    fitz = ENGINES['PyMuPDF'].load()
+    with fitz.open(pdf_path) as doc:
+        return fingerprint_page(doc, doc[0]) if len(doc) else None
+
+
+class Region:
+    """Retângulo de uma página (base 1) com o padrão opcional que seu texto deve conter"""
+
+    __slots__ = ('name', 'page', 'rect', 'padrao', 'pattern')
+
+    def __init__(self, name, page, rect, padrao=None):
+        self.name = name
+        self.page = int(page)
+        self.rect = tuple(float(v) for v in rect)
+        self.padrao = padrao
+        self.pattern = re.compile(padrao, re.IGNORECASE) if padrao else None
+
+    def contains(self, x, y):
+        x0, y0, x1, y1 = self.rect
+        return x0 <= x <= x1 and y0 <= y <= y1
+
+    def to_json(self):
+        item = {'nome': self.name, 'pagina': self.page, 'retangulo': [round(v, 1) for v in self.rect]}
+        if self.padrao:
+            item['padrao'] = self.padrao
+        return item
+
+
+class LayoutTemplate:
+    def __init__(self, name, impressao, regions):
+        self.name = name
+        self.fingerprint = impressao
+        self.regions = regions
+        # Regiões agrupadas por página, na ordem das páginas
+        self.pages = {}
+        for region in sorted(regions, key=lambda r: (r.page, r.rect[1], r.rect[0])):
+            self.pages.setdefault(region.page, []).append(region)
+
+    @classmethod
+    def from_json(cls, item):
+        regions = [Region(r['nome'], r.get('pagina', 1), r['retangulo'], r.get('padrao'))
+                   for r in item.get('regioes', [])]
+        return cls(item['nome'], item['impressao'], regions)
+
+    def to_json(self):
+        return {'nome': self.name, 'impressao': self.fingerprint, 'regioes': [r.to_json() for r in self.regions]}
+
+
+class LayoutTemplates:
+    """Modelos indexados pela impressão digital da página 1"""
+
+    def __init__(self, data=None):
+        self.templates = [LayoutTemplate.from_json(item) for item in (data or {}).get('modelos', [])]
+        self._by_fingerprint = {template.fingerprint: template for template in self.templates}
+
+    def __bool__(self):
+        return bool(self.templates)
+
+    def __len__(self):
+        return len(self.templates)
+
+    @property
+    def version(self):
+        """Identifica o conjunto de modelos (parte da chave do cache de extração); None sem modelos"""
+        if not self.templates:
+            return None
+        return hashlib.sha1(json.dumps(self.to_json(), sort_keys=True).encode()).hexdigest()[:12]
+
+    def match(self, impressao):
+        return self._by_fingerprint.get(impressao)
+
+    def add(self, template):
+        """Adiciona o modelo, substituindo outro de mesmo nome ou mesma impressão"""
+        self.templates = [t for t in self.templates
+                          if t.name != template.name and t.fingerprint != template.fingerprint]
+        self.templates.append(template)
+        self._by_fingerprint = {t.fingerprint: t for t in self.templates}
+
+    def to_json(self):
+        return {'modelos': [template.to_json() for template in self.templates]}
+
+
+def load_templates(path=LAYOUT_TEMPLATES_FILE):
+    """Lê o arquivo de modelos; sem arquivo, nenhum modelo"""
+    if path and os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            templates = LayoutTemplates(json.load(f))
+        logger.info(f"{len(templates)} modelo(s) de layout carregado(s) de {path}")
+        return templates
+    return LayoutTemplates()
+
+
+def save_templates(templates, path=LAYOUT_TEMPLATES_FILE):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(templates.to_json(), f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+_active = None
+
+
+def active_templates():
+    """Modelos do arquivo configurado, carregados uma vez por processo"""
+    global _active
+    if _active is None:
+        try:
+            _active = load_templates() if ENGINES['PyMuPDF'].available else LayoutTemplates()
+        except (OSError, ValueError, KeyError, re.error) as e:
+            logger.error(f"Erro ao carregar modelos de layout de {LAYOUT_TEMPLATES_FILE}: {str(e)}")
+            _active = LayoutTemplates()
+    return _active
+
+
+def _region_texts(page, regions):
+    """Texto de cada região, lido de uma única passagem restrita à área das regiões"""
+    fitz = ENGINES['PyMuPDF'].load()
+    area = fitz.Rect(regions[0].rect)
+    for region in regions[1:]:
+        area |= fitz.Rect(region.rect)
+    # Palavras: (x0, y0, x1, y1, texto, bloco, linha, nº da palavra)
+    words = page.get_text('words', clip=area)
+    texts = []
+    for region in regions:
+        lines = {}
+        for x0, y0, x1, y1, word, block, line, _ in words:
+            if region.contains((x0 + x1) / 2, (y0 + y1) / 2):
+                lines.setdefault((block, line), []).append(word)
+        texts.append('\n'.join(' '.join(line_words) for line_words in lines.values()))
+    return texts
+
+
+def extract_regions(pdf_path, templates=None, max_pages=None):
+    """Lê as regiões do modelo que casar com o PDF
+
+    Retorna (nome do modelo, [(página, [(região, texto)])]) ou, se nenhum
+    modelo casar, uma região não tiver o texto esperado ou o documento tiver
+    mais de `max_pages` páginas, (None, motivo).
+    """
+    templates = active_templates() if templates is None else templates
+    if not templates:
+        return None, 'sem_modelos'
+    fitz = ENGINES['PyMuPDF'].load()
+    with fitz.open(pdf_path) as doc:
+        if not len(doc):
+            return None, 'sem_paginas'
+        if max_pages is not None and len(doc) > max_pages:
+            return None, 'muitas_paginas'
+        template = templates.match(fingerprint_page(doc, doc[0]))
+        if template is None:
+            return None, 'sem_modelo'
+        pages = []
+        for page_num, regions in template.pages.items():
+            if page_num > len(doc):
+                return None, f'{template.name}: página {page_num} ausente'
+            texts = _region_texts(doc[page_num - 1], regions)
+            for region, text in zip(regions, texts):
+                if region.pattern is not None and not region.pattern.search(text):
+                    return None, f'{template.name}: região {region.name} sem o texto esperado'
+            pages.append((page_num, [(region.name, text) for region, text in zip(regions, texts)]))
+    return template.name, pages
+
+
+def learn(name, sample_paths, rules=None):
+    """Aprende um modelo a partir de amostras do mesmo layout usando as regras dos campos"""
+    from field_extraction import DEFAULT_RULES
+
+    rules = rules or DEFAULT_RULES
+    patterns = [(rule['nome'], rule['padrao'], re.compile(rule['padrao'], re.IGNORECASE))
+                for rule in rules.get('campos', [])]
+    fitz = ENGINES['PyMuPDF'].load()
+    impressao = None
+    found = {}  # campo -> (página, retângulo, padrão)
+    for path in sample_paths:
+        with fitz.open(path) as doc:
+            sample_print = fingerprint_page(doc, doc[0])
+            if impressao is None:
+                impressao = sample_print
+            elif sample_print != impressao:
+                raise ValueError(f"{path} tem outro layout (impressão {sample_print}, esperada {impressao})")
+
+            pending = {field for field, _, _ in patterns}
+            for page_num, page in enumerate(doc, 1):
+                if not pending:
+                    break
+                # Texto da página linha a linha, com a posição de cada linha no texto
+                lines, offsets, parts, position = [], [], [], 0
+                for block in page.get_text('dict')['blocks']:
+                    for line in block.get('lines', []):
+                        text = ''.join(span['text'] for span in line['spans'])
+                        lines.append(line['bbox'])
+                        offsets.append(position)
+                        parts.append(text)
+                        position += len(text) + 1
+                page_text = '\n'.join(parts)
+                for field, padrao, pattern in patterns:
+                    if field not in pending:
+                        continue
+                    match = pattern.search(page_text)
+                    if not match:
+                        continue
+                    pending.discard(field)
+                    covered = [bbox for bbox, offset, text in zip(lines, offsets, parts)
+                               if offset < match.end() and offset + len(text) > match.start()]
+                    y0 = min(bbox[1] for bbox in covered) - REGION_PADDING
+                    y1 = max(bbox[3] for bbox in covered) + REGION_PADDING
+                    previous = found.get(field)
+                    if previous and previous[0] == page_num:
+                        y0, y1 = min(y0, previous[1][1]), max(y1, previous[1][3])
+                    elif previous:
+                        continue  # Campo em outra página nesta amostra: mantém a primeira
+                    found[field] = (page_num, (0, y0, page.rect.width, y1), padrao)
+    if not found:
+        raise ValueError("Nenhum campo das regras foi encontrado nas amostras")
+    regions = [Region(field, page_num, rect, padrao) for field, (page_num, rect, padrao) in found.items()]
+    return LayoutTemplate(name, impressao, regions)
+
+
+def main(argv):
+    if len(argv) < 2 or argv[1] not in ('impressao', 'aprender', 'testar', 'listar'):
+        print(__doc__)
+        return 1
+
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+    if not ENGINES['PyMuPDF'].available:
+        print("❌ Modelos de layout exigem o PyMuPDF")
+        return 1
+
+    if argv[1] == 'impressao':
+        for path in argv[2:]:
+            print(f"{fingerprint(path)}  {path}")
+        return 0
+
+    templates = load_templates()
+    if argv[1] == 'listar':
+        for template in templates.templates:
+            print(f"📐 {template.name} ({template.fingerprint}): "
+                  f"{', '.join(f'{r.name}@p{r.page}' for r in template.regions)}")
+        return 0
+
+    if argv[1] == 'aprender':
+        if len(argv) < 4:
+            print("Informe o nome do modelo e ao menos uma amostra")
+            return 1
+        from field_extraction import DEFAULT_RULES_FILE, load_rules
+        try:
+            template = learn(argv[2], argv[3:], load_rules(os.environ.get('FIELD_RULES_FILE', DEFAULT_RULES_FILE)))
+        except ValueError as e:
+            print(f"❌ {e}")
+            return 1
+        templates.add(template)
+        save_templates(templates)
+        print(f"✅ Modelo {template.name} ({template.fingerprint}) com {len(template.regions)} região(ões) "
+              f"gravado em {LAYOUT_TEMPLATES_FILE}")
+        return 0
+
+    for path in argv[2:]:
+        start = time.perf_counter()
+        name, pages = extract_regions(path, templates)
+        elapsed = (time.perf_counter() - start) * 1000
+        if name is None:
+            print(f"➖ {path}: {pages} ({elapsed:.1f} ms)")
+            continue
+        print(f"✅ {path}: modelo {name} ({elapsed:.1f} ms)")
+        for page_num, regions in pages:
+            for region, text in regions:
+                print(f"   p{page_num} {region}: {' | '.join(text.splitlines())}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
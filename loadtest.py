@@ -0,0 +1,243 @@
+"""
+Gerador de carga local
+Reproduz um corpus de PDFs contra /upload, intercalado com consultas a
+/visualizar e /api/stats, a partir de várias conexões simultâneas, e
+informa vazão e percentis de latência por endpoint. Serve para dimensionar
+workers (gunicorn.conf.py) e limites de admissão (admission.py).
+
+Uso:
+    python loadtest.py <pdf ou pasta>... [--url http://localhost:5000] [--concorrencia 8]
+                       [--duracao 30] [--requisicoes N] [--mix upload=6,visualizar=2,stats=2]
+                       [--repetir] [--saida loadtest_resultado.json]
+
+Cada upload leva um sufixo único após o %%EOF (o PDF continua válido), para
+que o cache de extração não responda às repetições; com --repetir os PDFs
+vão inalterados e o teste mede o caminho com cache. O servidor limita
+uploads por IP (RATE_LIMIT_PER_MINUTE): para medir capacidade, eleve o
+limite no servidor testado. Respostas 429/503 são contadas à parte e não
+entram na vazão de sucesso.
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import uuid
+import random
+import argparse
+import threading
+import urllib.error
+import urllib.request
+
+ENDPOINTS = {
+    'upload': ('POST', '/upload'),
+    'visualizar': ('GET', '/visualizar'),
+    'stats': ('GET', '/api/stats'),
+}
+DEFAULT_MIX = 'upload=6,visualizar=2,stats=2'
+PERCENTILES = (50, 90, 95, 99)
+
+
+def find_pdfs(paths):
+    """PDFs indicados diretamente ou encontrados (recursivamente) nas pastas"""
+    pdfs = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                pdfs.extend(os.path.join(root, name) for name in sorted(files) if name.lower().endswith('.pdf'))
+        elif os.path.isfile(path):
+            pdfs.append(path)
+    return pdfs
+
+
+def parse_mix(value):
+    """'upload=6,stats=2' -> {'upload': 6.0, 'stats': 2.0}"""
+    mix = {}
+    for item in value.split(','):
+        name, _, weight = item.partition('=')
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise ValueError(f"endpoint desconhecido em --mix: {name} (use {', '.join(ENDPOINTS)})")
+        mix[name] = float(weight or 1)
+    if not any(mix.values()):
+        raise ValueError("--mix precisa de ao menos um peso positivo")
+    return mix
+
+
+def _multipart(filename, content):
+    boundary = uuid.uuid4().hex
+    body = (
+        f'--{boundary}\r\nContent-Disposition: form-data; name="pdf_file"; filename="{filename}"\r\n'
+        'Content-Type: application/pdf\r\n\r\n'
+    ).encode() + content + f'\r\n--{boundary}--\r\n'.encode()
+    return body, f'multipart/form-data; boundary={boundary}'
+
+
+def _percentile(sorted_values, p):
+    """Percentil pelo posto mais próximo (valores já ordenados)"""
+    if not sorted_values:
+        return None
+    index = max(math.ceil(p / 100 * len(sorted_values)) - 1, 0)
+    return sorted_values[index]
+
+
+class LoadTest:
+    """Clientes simultâneos enviando requisições até o prazo ou o total de requisições"""
+
+    def __init__(self, url, pdfs, mix, concurrency=8, duration=30, total=None, unique=True, timeout=300):
+        self.url = url.rstrip('/')
+        self.pdfs = pdfs
+        self.mix = mix
+        self.concurrency = concurrency
+        self.duration = duration
+        self.total = total
+        self.unique = unique
+        self.timeout = timeout
+        self.results = []
+        self._sent = 0
+        self._deadline = None
+        self._lock = threading.Lock()
+
+    def _next(self):
+        """Número sequencial da próxima requisição ou None ao fim do teste"""
+        with self._lock:
+            if self.total is not None and self._sent >= self.total:
+                return None
+            if self.total is None and time.monotonic() >= self._deadline:
+                return None
+            self._sent += 1
+            return self._sent
+
+    def _request(self, endpoint, number):
+        method, path = ENDPOINTS[endpoint]
+        body, headers = None, {'X-Request-ID': f'carga-{number}'}
+        if endpoint == 'upload':
+            pdf_path = self.pdfs[number % len(self.pdfs)]
+            with open(pdf_path, 'rb') as f:
+                content = f.read()
+            if self.unique:
+                content += f'\n%carga-{uuid.uuid4().hex}\n'.encode()
+            body, headers['Content-Type'] = _multipart(os.path.basename(pdf_path), content)
+        return urllib.request.Request(self.url + path, data=body, headers=headers, method=method)
+
+    def _client(self, seed):
+        rng = random.Random(seed)
+        names, weights = list(self.mix), list(self.mix.values())
+        while True:
+            number = self._next()
+            if number is None:
+                return
+            endpoint = rng.choices(names, weights)[0]
+            request = self._request(endpoint, number)
+            start = time.perf_counter()
+            try:
+                with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                    response.read()
+                    status = response.status
+            except urllib.error.HTTPError as e:
+                e.read()
+                status = e.code
+            except (urllib.error.URLError, OSError) as e:
+                status = f'erro: {getattr(e, "reason", e)}'
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.results.append((endpoint, status, elapsed))
+
+    def run(self):
+        threads = [threading.Thread(target=self._client, args=(seed,), daemon=True)
+                   for seed in range(self.concurrency)]
+        started = time.monotonic()
+        self._deadline = started + self.duration
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return summarize(self.results, time.monotonic() - started)
+
+
+def summarize(results, elapsed):
+    """Vazão, status e percentis de latência (ms) por endpoint e no total"""
+    groups = {}
+    for endpoint, status, seconds in results:
+        groups.setdefault(endpoint, []).append((status, seconds))
+        groups.setdefault('total', []).append((status, seconds))
+
+    report = {'duracao_segundos': round(elapsed, 3), 'endpoints': {}}
+    for endpoint, items in groups.items():
+        statuses = {}
+        for status, _ in items:
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+        ok = sorted(seconds * 1000 for status, seconds in items if status == 200)
+        summary = {
+            'requisicoes': len(items),
+            'sucesso': len(ok),
+            'status': statuses,
+            'vazao_total_rps': round(len(items) / elapsed, 2) if elapsed else None,
+            'vazao_sucesso_rps': round(len(ok) / elapsed, 2) if elapsed else None,
+            'latencia_media_ms': round(sum(ok) / len(ok), 1) if ok else None,
+            'latencia_max_ms': round(ok[-1], 1) if ok else None,
+        }
+        for p in PERCENTILES:
+            value = _percentile(ok, p)
+            summary[f'p{p}_ms'] = round(value, 1) if value is not None else None
+        report['endpoints'][endpoint] = summary
+    return report
+
+
+def print_report(report):
+    print(f"\n📊 Resultado em {report['duracao_segundos']:.1f}s (latência das respostas 200, em ms)")
+    header = f"{'endpoint':<12}{'req':>7}{'ok':>7}{'ok/s':>9}" + ''.join(f"{'p' + str(p):>9}" for p in PERCENTILES)
+    print(header + f"{'max':>9}")
+    print('-' * (len(header) + 9))
+    for endpoint, summary in sorted(report['endpoints'].items(), key=lambda item: item[0] == 'total'):
+        cells = [summary[f'p{p}_ms'] for p in PERCENTILES] + [summary['latencia_max_ms']]
+        print(f"{endpoint:<12}{summary['requisicoes']:>7}{summary['sucesso']:>7}{summary['vazao_sucesso_rps']:>9}"
+              + ''.join(f"{'-' if value is None else value:>9}" for value in cells))
+    refused = {status: count for status, count in report['endpoints'].get('total', {}).get('status', {}).items()
+               if status != '200'}
+    if refused:
+        print(f"\n⚠️  Respostas sem sucesso: {', '.join(f'{status}: {count}' for status, count in sorted(refused.items()))}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Gerador de carga local contra /upload, /visualizar e /api/stats")
+    parser.add_argument('caminhos', nargs='+', help="PDFs ou pastas com PDFs (corpus a reproduzir)")
+    parser.add_argument('--url', default='http://localhost:5000')
+    parser.add_argument('--concorrencia', type=int, default=8, help="clientes simultâneos")
+    parser.add_argument('--duracao', type=float, default=30, help="segundos de teste (ignorado com --requisicoes)")
+    parser.add_argument('--requisicoes', type=int, help="total de requisições (em vez de --duracao)")
+    parser.add_argument('--mix', default=DEFAULT_MIX, help="pesos dos endpoints (padrão %(default)s)")
+    parser.add_argument('--repetir', action='store_true', help="envia os PDFs inalterados (atendidos pelo cache)")
+    parser.add_argument('--timeout', type=float, default=300, help="tempo limite de cada requisição, em segundos")
+    parser.add_argument('--saida', help="grava o resultado em JSON")
+    args = parser.parse_args(argv)
+
+    try:
+        mix = parse_mix(args.mix)
+    except ValueError as e:
+        parser.error(str(e))
+    pdfs = find_pdfs(args.caminhos)
+    if mix.get('upload') and not pdfs:
+        print("❌ Nenhum PDF encontrado nos caminhos indicados")
+        return 1
+
+    limit = f"{args.requisicoes} requisições" if args.requisicoes else f"{args.duracao:g}s"
+    print(f"🏁 {args.concorrencia} cliente(s) contra {args.url} por {limit} ({len(pdfs)} PDF(s), mix {args.mix})")
+    test = LoadTest(args.url, pdfs, mix, concurrency=args.concorrencia, duration=args.duracao,
+                    total=args.requisicoes, unique=not args.repetir, timeout=args.timeout)
+    report = test.run()
+    report['configuracao'] = {
+        'url': args.url, 'concorrencia': args.concorrencia, 'mix': mix,
+        'pdfs': len(pdfs), 'repetir': args.repetir
+    }
+    print_report(report)
+    if args.saida:
+        with open(args.saida, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n📄 Resultados gravados em {args.saida}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
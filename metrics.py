@@ -0,0 +1,301 @@
+"""
+Métricas de desempenho no formato texto do Prometheus
+Cada processo (workers do gunicorn, pool de extração) acumula contadores,
+histogramas e gauges em memória — o custo no caminho quente é uma trava e
+algumas somas — e uma thread descarrega os incrementos periodicamente em um
+arquivo SQLite compartilhado. /api/metrics soma o que todos os processos
+gravaram. Desativável por ambiente com METRICS_ENABLED=0.
+"""
+
+import os
+import time
+import atexit
+import logging
+import sqlite3
+import threading
+
+logger = logging.getLogger(__name__)
+
+ENABLED = os.environ.get('METRICS_ENABLED', '1').lower() not in ('0', 'false', 'nao', 'não')
+METRICS_FILE = os.environ.get('METRICS_FILE', 'metricas.db')
+FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', 5.0))
+
+# Limites dos buckets dos histogramas de latência, em segundos
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+STAGE_SECONDS = 'coleta_etapa_duracao_segundos'
+ENGINE_SECONDS = 'coleta_motor_duracao_segundos'
+ENGINE_PAGES = 'coleta_motor_paginas_total'
+ENGINE_FALLBACKS = 'coleta_motor_fallback_total'
+ENGINE_FAILURES = 'coleta_motor_falhas_total'
+ENGINE_TIMEOUTS = 'coleta_motor_timeouts_total'
+HUNG_DOCUMENTS = 'coleta_documentos_com_timeout_total'
+TEMPLATE_DOCUMENTS = 'coleta_modelo_documentos_total'
+REQUEST_SECONDS = 'coleta_requisicao_duracao_segundos'
+REQUESTS = 'coleta_requisicoes_total'
+IN_FLIGHT = 'coleta_requisicoes_em_andamento'
+ADMISSION_ACTIVE = 'coleta_admissao_em_processamento'
+ADMISSION_QUEUE = 'coleta_admissao_fila'
+ADMISSION_WAIT_SECONDS = 'coleta_admissao_espera_segundos'
+ADMISSION_REJECTED = 'coleta_admissao_rejeicoes_total'
+
+HELP = {
+    STAGE_SECONDS: ('histogram', 'Duração de cada etapa do processamento de um PDF'),
+    ENGINE_SECONDS: ('histogram', 'Duração de cada passagem de um motor de extração'),
+    ENGINE_PAGES: ('counter', 'Páginas cuja melhor extração veio de cada motor'),
+    ENGINE_FALLBACKS: ('counter', 'Páginas reextraídas por um motor de fallback'),
+    ENGINE_FAILURES: ('counter', 'Falhas de uma passagem de um motor de extração'),
+    ENGINE_TIMEOUTS: ('counter', 'Chamadas a um motor encerradas por exceder o tempo limite'),
+    HUNG_DOCUMENTS: ('counter', 'Documentos com ao menos um motor encerrado por tempo limite'),
+    TEMPLATE_DOCUMENTS: ('counter', 'Documentos por resultado da busca de um modelo de layout'),
+    REQUEST_SECONDS: ('histogram', 'Duração das requisições HTTP por endpoint'),
+    REQUESTS: ('counter', 'Requisições HTTP por endpoint e status'),
+    IN_FLIGHT: ('gauge', 'Requisições HTTP em andamento por endpoint'),
+    ADMISSION_ACTIVE: ('gauge', 'Uploads admitidos ocupando uma vaga de processamento'),
+    ADMISSION_QUEUE: ('gauge', 'Uploads aguardando uma vaga de processamento'),
+    ADMISSION_WAIT_SECONDS: ('histogram', 'Espera na fila de admissão dos uploads admitidos'),
+    ADMISSION_REJECTED: ('counter', 'Uploads recusados pelo controle de admissão, por motivo')
+}
+
+
+def _labels(labels):
+    """Rótulos no formato de exposição: chave="valor" (ordenados, com escape)"""
+    return ','.join(
+        '{}="{}"'.format(key, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for key, value in sorted(labels.items())
+    )
+
+
+class _Timer:
+    """Context manager que observa a duração do bloco em um histograma"""
+
+    __slots__ = ('registry', 'name', 'labels', 'start')
+
+    def __init__(self, registry, name, labels):
+        self.registry = registry
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.registry.observe(self.name, time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class MetricsRegistry:
+    """Incrementos em memória por processo, descarregados em SQLite por uma thread"""
+
+    def __init__(self, path=METRICS_FILE, enabled=ENABLED, flush_interval=FLUSH_INTERVAL):
+        self.path = path
+        self.enabled = enabled
+        self.flush_interval = flush_interval
+        self._counters = {}
+        self._histograms = {}
+        self._gauges = {}
+        self._gauges_dirty = False
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._local = threading.local()
+        self._pid = None
+        self._db_ready = False
+
+    def _ensure_thread(self):
+        # Incrementos herdados pelo fork pertencem ao processo pai e não são repetidos
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid != os.getpid():
+                self._counters, self._histograms, self._gauges = {}, {}, {}
+                self._pid = os.getpid()
+                thread = threading.Thread(target=self._run, name='metrics-flush', daemon=True)
+                thread.start()
+                atexit.register(self._exit)
+
+    def inc(self, name, amount=1, **labels):
+        """Soma ao contador"""
+        if not self.enabled:
+            return
+        self._ensure_thread()
+        key = (name, _labels(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name, seconds, **labels):
+        """Registra uma duração no histograma"""
+        if not self.enabled:
+            return
+        self._ensure_thread()
+        key = (name, _labels(labels))
+        with self._lock:
+            values = self._histograms.get(key)
+            if values is None:
+                # buckets, +Inf, soma
+                values = self._histograms[key] = [0] * (len(BUCKETS) + 1) + [0.0]
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    values[i] += 1
+                    break
+            else:
+                values[len(BUCKETS)] += 1
+            values[-1] += seconds
+
+    def gauge_add(self, name, delta, **labels):
+        """Ajusta um gauge deste processo (somado entre os processos vivos)"""
+        if not self.enabled:
+            return
+        self._ensure_thread()
+        key = (name, _labels(labels))
+        with self._lock:
+            self._gauges[key] = self._gauges.get(key, 0) + delta
+            self._gauges_dirty = True
+
+    def timer(self, name, **labels):
+        """with metrics.timer(...): observa a duração do bloco"""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, name, labels)
+
+    def _conn(self):
+        # Uma conexão por thread e por processo (conexões não sobrevivem a fork)
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+            if not self._db_ready:
+                with conn:
+                    conn.execute('CREATE TABLE IF NOT EXISTS counters (name TEXT, labels TEXT, value REAL, '
+                                 'PRIMARY KEY (name, labels))')
+                    conn.execute('CREATE TABLE IF NOT EXISTS histograms (name TEXT, labels TEXT, bucket INTEGER, '
+                                 'value REAL, PRIMARY KEY (name, labels, bucket))')
+                    conn.execute('CREATE TABLE IF NOT EXISTS gauges (pid INTEGER, name TEXT, labels TEXT, value REAL, '
+                                 'PRIMARY KEY (pid, name, labels))')
+                self._db_ready = True
+        return conn
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.warning(f"Erro ao gravar métricas: {str(e)}")
+
+    def _exit(self):
+        if self._pid != os.getpid():
+            return
+        try:
+            self.flush()
+            with self._conn() as conn:
+                conn.execute('DELETE FROM gauges WHERE pid = ?', (os.getpid(),))
+        except Exception:
+            pass
+
+    def flush(self):
+        """Descarrega os incrementos acumulados deste processo no arquivo compartilhado"""
+        if not self.enabled or self._pid != os.getpid():
+            return
+        with self._lock:
+            counters, self._counters = self._counters, {}
+            histograms, self._histograms = self._histograms, {}
+            gauges = dict(self._gauges) if self._gauges_dirty else None
+            self._gauges_dirty = False
+        if not counters and not histograms and gauges is None:
+            return
+        with self._conn() as conn:
+            conn.executemany(
+                'INSERT INTO counters VALUES (?, ?, ?) ON CONFLICT(name, labels) DO UPDATE SET value = value + excluded.value',
+                [(name, labels, value) for (name, labels), value in counters.items()]
+            )
+            conn.executemany(
+                'INSERT INTO histograms VALUES (?, ?, ?, ?) '
+                'ON CONFLICT(name, labels, bucket) DO UPDATE SET value = value + excluded.value',
+                [(name, labels, i, value) for (name, labels), values in histograms.items()
+                 for i, value in enumerate(values) if value]
+            )
+            if gauges is not None:
+                conn.executemany(
+                    'INSERT OR REPLACE INTO gauges VALUES (?, ?, ?, ?)',
+                    [(os.getpid(), name, labels, value) for (name, labels), value in gauges.items()]
+                )
+
+    @staticmethod
+    def _alive(pid):
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except OSError:
+            return True
+        return True
+
+    def render(self):
+        """Exposição em texto (formato 0.0.4) somando todos os processos"""
+        self._ensure_thread()
+        self.flush()
+        conn = self._conn()
+        series = {}
+        for name, labels, value in conn.execute('SELECT name, labels, value FROM counters'):
+            series.setdefault(name, []).append((name, labels, value))
+
+        histograms = {}
+        for name, labels, bucket, value in conn.execute('SELECT name, labels, bucket, value FROM histograms'):
+            histograms.setdefault((name, labels), [0] * (len(BUCKETS) + 1) + [0.0])[bucket] = value
+        for (name, labels), values in sorted(histograms.items()):
+            lines = series.setdefault(name, [])
+            cumulative = 0
+            sep = ',' if labels else ''
+            for bound, count in zip(BUCKETS + ('+Inf',), values[:-1]):
+                cumulative += count
+                lines.append((f'{name}_bucket', f'{labels}{sep}le="{bound}"', cumulative))
+            lines.append((f'{name}_sum', labels, round(values[-1], 6)))
+            lines.append((f'{name}_count', labels, cumulative))
+
+        # Gauges: só processos ainda vivos
+        gauges = {}
+        dead = set()
+        for pid, name, labels, value in conn.execute('SELECT pid, name, labels, value FROM gauges'):
+            if pid in dead or not self._alive(pid):
+                dead.add(pid)
+                continue
+            gauges[(name, labels)] = gauges.get((name, labels), 0) + value
+        for (name, labels), value in sorted(gauges.items()):
+            series.setdefault(name, []).append((name, labels, value))
+        if dead:
+            with conn:
+                conn.executemany('DELETE FROM gauges WHERE pid = ?', [(pid,) for pid in dead])
+
+        output = []
+        for name in sorted(series):
+            kind, help_text = HELP.get(name, ('untyped', name))
+            output.append(f'# HELP {name} {help_text}')
+            output.append(f'# TYPE {name} {kind}')
+            for sample, labels, value in series[name]:
+                value = int(value) if float(value).is_integer() else value
+                output.append(f'{sample}{{{labels}}} {value}' if labels else f'{sample} {value}')
+        return '\n'.join(output) + '\n'
+
+
+# Registro do processo, usado pela aplicação e pela extração
+registry = MetricsRegistry()
+inc = registry.inc
+observe = registry.observe
+gauge_add = registry.gauge_add
+timer = registry.timer
@@ -0,0 +1,435 @@
+"""
+Extração de texto de PDFs
+Roteamento por página: uma passagem barata com PyMuPDF, avaliação da
+qualidade de cada página e nova extração apenas das páginas ruins com os
+motores mais pesados (PyPDF2, depois pdfplumber, por fim detecção de imagens).
+Documentos grandes têm as páginas divididas entre processos do sandbox.
+iter_pages() gera as páginas uma a uma, processando um bloco de páginas por
+vez, para que a memória não dependa do número de páginas do documento.
+Os motores, sua ordem e a importação sob demanda ficam em extraction_engines.py.
+Documentos de um layout conhecido (layout_templates.py) têm apenas as regiões
+do modelo lidas, sem passar pela cadeia de motores: o texto é parcial, com
+cada região identificada (ver template_regions()).
+Cada chamada a um motor roda isolada em um processo do sandbox com tempo
+limite (sandbox.py); um motor que estoura o prazo é tratado como falho e
+não é mais usado no restante do documento.
+"""
+
+import os
+import re
+import time
+import logging
+import metrics
+import sandbox
+import layout_templates
+from extraction_engines import (ENGINES, configured_order, enabled_engines, engine_versions, run_engine, run_engine_head,
+                                count_with_engine)
+
+logger = logging.getLogger(__name__)
+
+# Documentos com menos páginas que o limite usam o caminho serial
+PARALLEL_PAGE_THRESHOLD = int(os.environ.get('PARALLEL_PAGE_THRESHOLD', 20))
+PARALLEL_WORKERS = int(os.environ.get('PARALLEL_WORKERS', os.cpu_count() or 1))
+# Páginas roteadas por vez em iter_pages (acima de PARALLEL_PAGE_THRESHOLD para manter o paralelismo)
+PAGE_WINDOW = max(int(os.environ.get('PAGE_WINDOW', 50)), 1)
+
+# Páginas com nota abaixo do limite são reextraídas pelos motores mais pesados
+PAGE_QUALITY_THRESHOLD = float(os.environ.get('PAGE_QUALITY_THRESHOLD', 0.5))
+# Caracteres visíveis a partir dos quais uma página é considerada densa o suficiente
+MIN_PAGE_CHARS = 40
+
+# Caractere de substituição, controles (exceto quebras/tab) e área de uso privado
+BAD_CHARS_RE = re.compile('[\ufffd\x00-\x08\x0b\x0c\x0e-\x1f\x7f\ue000-\uf8ff]')
+
+# Versões dos motores de extração (parte da chave do cache), lidas sem importar os motores
+ENGINE_VERSIONS = engine_versions()
+
+# Método registrado para documentos extraídos pelas regiões de um modelo de layout
+TEMPLATE_METHOD = 'PyMuPDF-Modelo'
+# Cabeçalho das páginas e rótulo de cada região no texto de um documento extraído pelo modelo
+TEMPLATE_PAGE_RE = re.compile(r'^--- Página \d+ \(Modelo (.+)\) ---$', re.MULTILINE)
+TEMPLATE_REGION_RE = re.compile(r'^\[([^\]\n]+)\]$', re.MULTILINE)
+
+def page_quality(text):
+    """Nota de 0 a 1 para o texto de uma página
+
+    Combina densidade de caracteres visíveis, proporção de caracteres de
+    substituição/controle (texto corrompido) e proporção de espaços em branco.
+    """
+    if not text or not text.strip():
+        return 0.0
+    total = len(text)
+    visible = len(''.join(text.split()))
+    bad = len(BAD_CHARS_RE.findall(text))
+    whitespace_ratio = (total - visible) / total
+
+    density = min(visible / MIN_PAGE_CHARS, 1.0)
+    bad_penalty = min(bad / total * 5, 1.0)
+    whitespace_penalty = min(max(whitespace_ratio - 0.5, 0.0) * 2, 1.0)
+    return round(density * (1 - bad_penalty) * (1 - whitespace_penalty), 4)
+
+
+def _record_timeout(engine, pdf_path, error):
+    metrics.inc(metrics.ENGINE_TIMEOUTS, motor=engine.name)
+    logger.warning(f"{engine.name} excedeu o tempo limite em {os.path.basename(pdf_path)}: {error}",
+                   extra={'evento': 'timeout_motor', 'motor': engine.name, 'arquivo': pdf_path})
+
+
+def count_pages(pdf_path, timed_out=None):
+    """Conta as páginas com o motor mais barato que conseguir abrir o PDF; None se nenhum conseguir
+
+    Motores em `timed_out` (já encerrados por tempo limite neste documento)
+    são ignorados; os que estourarem o prazo aqui são adicionados ao conjunto.
+    """
+    timed_out = set() if timed_out is None else timed_out
+    for engine in sorted(enabled_engines('contagem'), key=lambda engine: engine.cost):
+        if engine.name in timed_out:
+            continue
+        try:
+            if sandbox.SANDBOX_ENABLED:
+                return sandbox.run(count_with_engine, engine, pdf_path, timeout=engine.timeout)
+            return engine.count_pages(pdf_path)
+        except TimeoutError as e:
+            _record_timeout(engine, pdf_path, e)
+            timed_out.add(engine.name)
+        except Exception as e:
+            metrics.inc(metrics.ENGINE_FAILURES, motor=engine.name)
+            logger.warning(f"{engine.name} não conseguiu contar as páginas de {os.path.basename(pdf_path)}: {str(e)}")
+    return None
+
+
+def check_page_count(total_pages, max_pages):
+    """Valida o número de páginas de um PDF; levanta ValueError com a mensagem para o usuário"""
+    if total_pages is None:
+        raise ValueError("Arquivo PDF inválido ou corrompido")
+    if total_pages == 0:
+        raise ValueError("PDF não contém páginas")
+    if max_pages is not None and total_pages > max_pages:
+        raise ValueError(f"PDF muito grande (máximo {max_pages} páginas)")
+
+
+def _open_document(pdf_path, limit, timed_out):
+    """Conta as páginas e já extrai as primeiras com o primeiro motor de texto, em uma só abertura
+
+    Retorna (total de páginas, primeira passagem), onde a primeira passagem é
+    (motor, {página: resultado}) ou None. Se o motor não conseguir abrir o
+    documento, a contagem fica com count_pages (motores mais baratos primeiro).
+    """
+    engines = enabled_engines('texto')
+    engine = engines[0] if engines else None
+    if engine is not None and 'contagem' in engine.capabilities and engine.name not in timed_out:
+        try:
+            with metrics.timer(metrics.ENGINE_SECONDS, motor=engine.name):
+                if sandbox.SANDBOX_ENABLED:
+                    total, results = sandbox.run(run_engine_head, engine, pdf_path, limit,
+                                                 timeout=engine.timeout)
+                else:
+                    total, results = engine.extract_head(pdf_path, limit)
+            return total, (engine.name, {result[0]: result for result in results})
+        except TimeoutError as e:
+            _record_timeout(engine, pdf_path, e)
+            timed_out.add(engine.name)
+        except Exception as e:
+            metrics.inc(metrics.ENGINE_FAILURES, motor=engine.name)
+            logger.warning(f"{engine.name} não conseguiu abrir {os.path.basename(pdf_path)}: {str(e)}")
+    return count_pages(pdf_path, timed_out), None
+
+
+def _engine_results(engine, pdf_path, page_numbers, first_pass):
+    """Resultados do motor para as páginas; as já lidas na abertura do documento não são lidas de novo"""
+    if first_pass is None or first_pass[0] != engine.name:
+        return _map_pages(engine, pdf_path, page_numbers)
+    known = first_pass[1]
+    missing = [p for p in page_numbers if p not in known]
+    results = [known[p] for p in page_numbers if p in known]
+    if missing:
+        results += _map_pages(engine, pdf_path, missing)
+    return results
+
+
+def _map_pages(engine, pdf_path, page_numbers):
+    """Executa o motor sobre as páginas, em paralelo no sandbox acima do limite configurado
+
+    Com o sandbox desativado (SANDBOX_ENABLED=0), o motor
+    roda no próprio processo e em série.
+    """
+    if not sandbox.SANDBOX_ENABLED:
+        return engine.extract(pdf_path, page_numbers)
+
+    workers = PARALLEL_WORKERS if len(page_numbers) >= PARALLEL_PAGE_THRESHOLD else 1
+    # Divide as páginas em blocos contíguos, um processo isolado por bloco, todos com o mesmo prazo
+    chunk = -(-len(page_numbers) // max(workers, 1))
+    blocks = [page_numbers[i:i + chunk] for i in range(0, len(page_numbers), chunk)]
+    calls = [sandbox.SandboxCall(run_engine, (engine, pdf_path, block), engine.timeout)
+             for block in blocks]
+    deadline = time.monotonic() + engine.timeout
+    try:
+        # Junta os blocos na ordem das páginas
+        return [result for call in calls for result in call.result(deadline)]
+    finally:
+        for call in calls:
+            call.cancel()
+
+
+def _has_content(engine, text, extra):
+    if engine is None:
+        return False
+    if text is None:
+        return True  # Erro registrado na página
+    if extra:
+        return True  # Tabelas ou imagens encontradas
+    return bool(text.strip())
+
+
+def format_page(page_num, engine, text, extra=None):
+    """Seção de uma página no texto final (mesmo formato da cadeia de fallback original)"""
+    if text is None:
+        return f"\n--- Página {page_num} ---\n[Erro ao extrair texto desta página]\n"
+    if engine == 'pdfplumber':
+        parts = [f"\n--- Página {page_num} (pdfplumber) ---\n{text}\n"] if text else []
+        # Também inclui as tabelas encontradas
+        for table_num, table in enumerate(extra or [], 1):
+            parts.append(f"\n--- Tabela {table_num} da Página {page_num} ---\n")
+            for row in table:
+                if row:
+                    parts.append(" | ".join([str(cell) if cell else "" for cell in row]) + "\n")
+        return "".join(parts)
+    if engine == 'PyMuPDF-OCR':
+        parts = []
+        if extra:
+            parts.append(f"\n--- Página {page_num} (Imagens detectadas) ---\n")
+            parts.append(f"[PDF contém {extra} imagem(s) - texto pode estar em formato de imagem]\n")
+        if text.strip():
+            parts.append(text + "\n")
+        return "".join(parts)
+    return f"\n--- Página {page_num} ({engine}) ---\n{text}\n"
+
+
+def _route_pages(pdf_path, page_numbers, timed_out, first_pass=None):
+    """Passa um bloco de páginas pela cadeia de motores; retorna {página: (motor, texto, extra, nota)}
+
+    Motores que excederem o tempo limite são adicionados a `timed_out` e
+    ignorados nos blocos seguintes do mesmo documento. `first_pass` traz as
+    páginas já extraídas na abertura do documento (_open_document).
+    """
+    best = {page_num: (None, '', None, 0.0) for page_num in page_numbers}
+
+    def consider(engine, page_num, text, extra=None):
+        score = page_quality(text)
+        if best[page_num][0] is None or best[page_num][1] is None or score > best[page_num][3]:
+            best[page_num] = (engine, text, extra, score)
+
+    # O primeiro motor de texto passa por todas as páginas; os seguintes, em ordem,
+    # só pelas páginas que continuam com nota baixa
+    for index, engine in enumerate(enabled_engines('texto')):
+        target = page_numbers if index == 0 else [p for p in page_numbers if best[p][3] < PAGE_QUALITY_THRESHOLD]
+        if not target or engine.name in timed_out:
+            continue
+        if index:
+            metrics.inc(metrics.ENGINE_FALLBACKS, len(target), motor=engine.name)
+        try:
+            logger.debug("Extraindo %s página(s) com %s", len(target), engine.name)
+            with metrics.timer(metrics.ENGINE_SECONDS, motor=engine.name):
+                for page_num, text, *extra in _engine_results(engine, pdf_path, target,
+                                                              first_pass if index == 0 else None):
+                    if text is None:
+                        # Erro na página: só fica registrado se nenhum motor obteve nada
+                        if best[page_num][0] is None:
+                            best[page_num] = (engine.name, None, None, 0.0)
+                        continue
+                    consider(engine.name, page_num, text, extra[0] if extra else None)
+        except TimeoutError as e:
+            metrics.inc(metrics.ENGINE_FAILURES, motor=engine.name)
+            _record_timeout(engine, pdf_path, e)
+            timed_out.add(engine.name)
+        except Exception as e:
+            metrics.inc(metrics.ENGINE_FAILURES, motor=engine.name)
+            logger.warning(f"{engine.name} falhou: {str(e)}")
+
+    # Páginas ainda sem texto: detecção de imagens (provável conteúdo escaneado)
+    for engine in enabled_engines('imagens'):
+        empty_pages = [p for p in page_numbers if best[p][3] == 0.0 and not _has_content(*best[p][:3])]
+        if not empty_pages:
+            break
+        if engine.name in timed_out:
+            continue
+        metrics.inc(metrics.ENGINE_FALLBACKS, len(empty_pages), motor=engine.name)
+        try:
+            logger.debug("Detectando imagens com %s em %s página(s)", engine.name, len(empty_pages))
+            with metrics.timer(metrics.ENGINE_SECONDS, motor=engine.name):
+                for page_num, text, image_count in _map_pages(engine, pdf_path, empty_pages):
+                    if image_count or text.strip():
+                        best[page_num] = (engine.name, text, image_count, page_quality(text))
+        except TimeoutError as e:
+            metrics.inc(metrics.ENGINE_FAILURES, motor=engine.name)
+            _record_timeout(engine, pdf_path, e)
+            timed_out.add(engine.name)
+        except Exception as e:
+            metrics.inc(metrics.ENGINE_FAILURES, motor=engine.name)
+            logger.warning(f"Extração de imagem com {engine.name} falhou: {str(e)}")
+
+    page_counts = {}
+    for engine, _, _, _ in best.values():
+        if engine is not None:
+            page_counts[engine] = page_counts.get(engine, 0) + 1
+    for engine, count in page_counts.items():
+        metrics.inc(metrics.ENGINE_PAGES, count, motor=engine)
+    return best
+
+
+def iter_pages(pdf_path, total_pages=None, window=PAGE_WINDOW, timed_out=None, max_pages=None):
+    """Gera (página, motor, texto, extra) de cada página com conteúdo, em ordem
+
+    'extra' traz as tabelas (pdfplumber) ou a quantidade de imagens
+    (PyMuPDF-OCR). As páginas são roteadas em blocos de `window`: só o bloco
+    atual fica em memória, então o consumo não cresce com o tamanho do PDF.
+    `timed_out` é o conjunto de motores já encerrados por tempo limite neste
+    documento, compartilhado com as demais etapas (extract_text_and_methods);
+    sem ele, o documento é contado aqui em HUNG_DOCUMENTS.
+    Sem `total_pages`, a contagem sai da mesma abertura que extrai as
+    primeiras páginas. Com `max_pages`, o documento é validado antes da
+    extração (ValueError se não abrir, não tiver páginas ou passar do limite).
+    """
+    owner = timed_out is None
+    timed_out = set() if owner else timed_out
+    try:
+        first_pass = None
+        if total_pages is None:
+            total_pages, first_pass = _open_document(pdf_path, min(window, PARALLEL_PAGE_THRESHOLD), timed_out)
+        if max_pages is not None:
+            check_page_count(total_pages, max_pages)
+        if not total_pages:
+            return
+        for start in range(0, total_pages, window):
+            best = _route_pages(pdf_path, list(range(start, min(start + window, total_pages))), timed_out,
+                                first_pass)
+            first_pass = None
+            for page_num in sorted(best):
+                engine, text, extra, _ = best.pop(page_num)
+                if _has_content(engine, text, extra):
+                    yield page_num + 1, engine, text, extra
+    finally:
+        if owner:
+            _count_hung_document(timed_out)
+
+
+def _count_hung_document(timed_out):
+    # Documento com ao menos um motor encerrado por tempo limite (contado uma vez)
+    if timed_out:
+        metrics.inc(metrics.HUNG_DOCUMENTS)
+
+
+def extract_with_template(pdf_path, timed_out=None, max_pages=None):
+    """Texto das regiões do modelo de layout que casar com o PDF; None se nenhum casar
+
+    Um tempo limite do PyMuPDF entra em `timed_out`: o motor não é chamado de
+    novo para o mesmo documento. Documentos acima de `max_pages` não usam o
+    modelo (a validação da cadeia de motores os rejeita).
+    """
+    templates = layout_templates.active_templates()
+    if not templates:
+        return None
+    engine = ENGINES['PyMuPDF']
+    if timed_out is not None and engine.name in timed_out:
+        return None
+    try:
+        with metrics.timer(metrics.ENGINE_SECONDS, motor=TEMPLATE_METHOD):
+            if sandbox.SANDBOX_ENABLED:
+                name, pages = sandbox.run(layout_templates.extract_regions, pdf_path, templates, max_pages,
+                                          timeout=engine.timeout)
+            else:
+                name, pages = layout_templates.extract_regions(pdf_path, templates, max_pages)
+    except TimeoutError as e:
+        _record_timeout(engine, pdf_path, e)
+        if timed_out is not None:
+            timed_out.add(engine.name)
+        return None
+    except Exception as e:
+        metrics.inc(metrics.ENGINE_FAILURES, motor=TEMPLATE_METHOD)
+        logger.warning(f"Extração por modelo de layout falhou: {str(e)}")
+        return None
+
+    if name is None:
+        # pages traz o motivo: sem modelo para a impressão digital ou região sem o texto esperado
+        metrics.inc(metrics.TEMPLATE_DOCUMENTS, resultado='sem_modelo' if pages == 'sem_modelo' else 'rejeitado')
+        logger.debug("Modelo de layout não aplicado a %s: %s", os.path.basename(pdf_path), pages)
+        return None
+
+    metrics.inc(metrics.TEMPLATE_DOCUMENTS, resultado='aplicado', modelo=name)
+    sections = []
+    for page_num, regions in pages:
+        # Cada região com o seu nome, para os campos do registro (template_regions)
+        body = "".join(f"[{region}]\n{text.strip()}\n" for region, text in regions if text and text.strip())
+        sections.append(f"\n--- Página {page_num} (Modelo {name}) ---\n{body}")
+    final_text = f"[Métodos de extração utilizados: {TEMPLATE_METHOD}]\n\n" + "".join(sections).strip()
+    logger.info("Extração concluída pelo modelo de layout %s: %s caracteres", name, len(final_text))
+    return final_text, [TEMPLATE_METHOD]
+
+
+def template_regions(text):
+    """Modelo e texto de cada região de um documento extraído por extract_with_template()
+
+    Retorna (nome do modelo, {região: texto}) ou (None, {}) se o texto não
+    veio de um modelo de layout.
+    """
+    match = TEMPLATE_PAGE_RE.search(text or '')
+    if match is None:
+        return None, {}
+    regions = {}
+    for page in TEMPLATE_PAGE_RE.split(text)[2::2]:
+        labels = TEMPLATE_REGION_RE.split(page)
+        for region, body in zip(labels[1::2], labels[2::2]):
+            regions.setdefault(region, body.strip())
+    return match.group(1), regions
+
+
+def extract_text_from_pdf(pdf_path, total_pages=None):
+    """Extrai texto de um arquivo PDF usando múltiplas bibliotecas para melhor compatibilidade"""
+    return extract_text_and_methods(pdf_path, total_pages)[0]
+
+
+def extract_text_and_methods(pdf_path, total_pages=None, timed_out=None, max_pages=None):
+    """Extrai o texto do PDF e retorna também a lista de métodos utilizados
+
+    Motores encerrados por tempo limite em qualquer etapa (modelo de layout,
+    contagem, páginas) não são chamados de novo no documento. Quem já contou
+    as páginas passa o mesmo conjunto `timed_out` usado na contagem. Com
+    `max_pages`, o PDF é validado na própria extração (ver iter_pages).
+    """
+    owner = timed_out is None
+    timed_out = set() if owner else timed_out
+    try:
+        templated = extract_with_template(pdf_path, timed_out, max_pages)
+        if templated is not None:
+            return templated
+
+        # O texto é montado à medida que as páginas são geradas; só os números de página ficam guardados
+        parts = []
+        pages_by_method = {}
+        for page_num, engine, text, extra in iter_pages(pdf_path, total_pages, timed_out=timed_out, max_pages=max_pages):
+            parts.append(format_page(page_num, engine, text, extra))
+            pages_by_method.setdefault(engine, []).append(page_num)
+        extracted_text = "".join(parts)
+    finally:
+        if owner:
+            _count_hung_document(timed_out)
+
+    # Métodos na ordem da cadeia, apenas os que produziram ao menos uma página
+    extraction_methods = [method for method in configured_order() if method in pages_by_method]
+
+    # Resultado final
+    if extracted_text.strip():
+        # Adiciona informações sobre o método usado
+        method_info = f"[Métodos de extração utilizados: {', '.join(extraction_methods)}]\n\n"
+        final_text = method_info + extracted_text.strip()
+
+        if logger.isEnabledFor(logging.DEBUG):
+            for method in extraction_methods:
+                method_pages = pages_by_method[method]
+                logger.debug("%s extraiu %s página(s): %s", method, len(method_pages), method_pages)
+        logger.info("Extração concluída usando %s: %s caracteres", ', '.join(extraction_methods), len(final_text))
+
+        return final_text, extraction_methods
+    else:
+        logger.error("Todas as tentativas de extração de texto falharam")
+        return "[PDF processado mas não foi possível extrair texto legível com nenhum método disponível]", []
@@ -0,0 +1,510 @@
+"""
+Armazenamento indexado dos registros coletados
+Substitui a leitura sequencial de DATA_FILE por um banco SQLite embutido, com
+busca por ID, leitura em ordem cronológica reversa e escrita segura entre
+vários processos (gunicorn). O texto extraído fica em blobs comprimidos
+endereçados pelo SHA-256 do texto (tabela text_blobs), referenciados pelos
+registros; textos idênticos são gravados uma única vez.
+
+Uso como ferramenta de migração/compactação:
+    python record_store.py migrar dados_coletados.json [registros.db]
+    python record_store.py compactar [registros.db]
+    python record_store.py dicionario [registros.db]   (treina um novo dicionário e recomprime os textos)
+"""
+
+import os
+import sys
+import json
+import base64
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+
+from blob_store import compress_text, decompress_text, train_dictionary
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DB_FILE = 'registros.db'
+SNIPPET_CHARS = 300
+# Textos usados para treinar o dicionário de compressão (e mínimo para treiná-lo)
+DICT_SAMPLE_SIZE = 500
+DICT_MIN_RECORDS = int(os.environ.get('DICT_MIN_RECORDS', 200))
+DICT_CHECK_INTERVAL = 100  # Gravações sem dicionário entre verificações
+
+
+def _encode_cursor(timestamp, seq):
+    return base64.urlsafe_b64encode(f"{timestamp}|{seq}".encode('utf-8')).decode('ascii')
+
+
+def _decode_cursor(cursor):
+    """Decodifica o cursor de paginação; levanta ValueError se for inválido"""
+    try:
+        timestamp, seq = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8').rsplit('|', 1)
+        return timestamp, int(seq)
+    except Exception:
+        raise ValueError("Cursor de paginação inválido")
+
+
+def iter_legacy_records(path):
+    """Lê o DATA_FILE antigo (objetos JSON concatenados, com ou sem indentação)"""
+    decoder = json.JSONDecoder()
+    with open(path, 'r', encoding='utf-8') as f:
+        content = f.read()
+    pos = 0
+    while True:
+        # Avança sobre espaços e quebras de linha entre os objetos
+        while pos < len(content) and content[pos].isspace():
+            pos += 1
+        if pos >= len(content):
+            break
+        try:
+            record, pos = decoder.raw_decode(content, pos)
+        except json.JSONDecodeError as e:
+            logger.warning(f"Trecho JSON inválido ignorado na posição {pos}: {e}")
+            next_pos = content.find('\n{', pos + 1)
+            if next_pos == -1:
+                break
+            pos = next_pos
+            continue
+        yield record
+
+
+class RecordStore:
+    """Registros em SQLite (modo WAL), indexados por ID e timestamp"""
+
+    def __init__(self, path=DEFAULT_DB_FILE):
+        self.path = path
+        self._local = threading.local()
+        self._dicts = {}
+        self._current_dict = None
+        self._writes_without_dict = 0
+        self._init_db()
+
+    def _conn(self):
+        # Uma conexão por thread e por processo (conexões não sobrevivem a fork)
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _init_db(self):
+        with self._conn() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS records (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    id TEXT NOT NULL UNIQUE,
+                    timestamp TEXT NOT NULL,
+                    status TEXT,
+                    nome_original TEXT,
+                    content_chars INTEGER NOT NULL DEFAULT 0,
+                    entry TEXT NOT NULL,
+                    snippet TEXT,
+                    content_sha TEXT
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_records_timestamp ON records(timestamp)')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS text_blobs (
+                    sha256 TEXT PRIMARY KEY,
+                    dict_id INTEGER NOT NULL DEFAULT 0,
+                    data BLOB NOT NULL
+                )
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS text_dicts (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    created_at REAL NOT NULL,
+                    data BLOB NOT NULL
+                )
+            ''')
+            self._upgrade_schema(conn)
+
+    def _upgrade_schema(self, conn):
+        """Migra bancos antigos: texto fora do JSON do registro e depois em blobs comprimidos"""
+        columns = {row[1] for row in conn.execute('PRAGMA table_info(records)')}
+        if 'content_sha' in columns:
+            return
+        if 'content' not in columns:
+            conn.execute('ALTER TABLE records ADD COLUMN snippet TEXT')
+            conn.execute('ALTER TABLE records ADD COLUMN content TEXT')
+            conn.execute(f'''
+                UPDATE records SET
+                    content = json_extract(entry, '$.data.pdf_content'),
+                    snippet = substr(json_extract(entry, '$.data.pdf_content'), 1, {SNIPPET_CHARS}),
+                    entry = json_remove(entry, '$.data.pdf_content')
+            ''')
+
+        conn.execute('ALTER TABLE records ADD COLUMN content_sha TEXT')
+        # Com histórico suficiente, o dicionário é treinado antes da migração
+        samples = [row[0] for row in conn.execute(
+            'SELECT content FROM records WHERE content_chars > 0 ORDER BY seq DESC LIMIT ?', (DICT_SAMPLE_SIZE,)
+        )]
+        if len(samples) >= DICT_MIN_RECORDS:
+            self._save_dictionary(conn, train_dictionary(samples))
+        migrated, last_seq = 0, 0
+        while True:
+            rows = conn.execute(
+                'SELECT seq, content FROM records WHERE seq > ? AND content IS NOT NULL ORDER BY seq LIMIT 500',
+                (last_seq,)
+            ).fetchall()
+            if not rows:
+                break
+            for seq, content in rows:
+                blob = self._text_blob(content)
+                conn.execute('INSERT OR IGNORE INTO text_blobs VALUES (?, ?, ?)', blob)
+                conn.execute('UPDATE records SET content_sha = ? WHERE seq = ?', (blob[0], seq))
+                last_seq = seq
+            migrated += len(rows)
+        conn.execute('ALTER TABLE records DROP COLUMN content')
+        logger.info(f"Armazenamento de registros atualizado: {migrated} texto(s) em blobs comprimidos "
+                    "(execute 'python record_store.py compactar' para liberar o espaço)")
+
+    def _save_dictionary(self, conn, data):
+        cursor = conn.execute('INSERT INTO text_dicts (created_at, data) VALUES (?, ?)', (time.time(), data))
+        self._dicts[cursor.lastrowid] = data
+        self._current_dict = (cursor.lastrowid, data)
+        logger.info(f"Dicionário de compressão {cursor.lastrowid} treinado ({len(data)} bytes)")
+        return cursor.lastrowid
+
+    def _latest_dictionary(self):
+        """(id, dados) do dicionário mais recente; (0, None) se ainda não houver"""
+        if self._current_dict is None:
+            row = self._conn().execute('SELECT id, data FROM text_dicts ORDER BY id DESC LIMIT 1').fetchone()
+            if row is None:
+                return 0, None
+            self._dicts[row[0]] = row[1]
+            self._current_dict = (row[0], row[1])
+        return self._current_dict
+
+    def _dictionary(self, dict_id):
+        if not dict_id:
+            return None
+        data = self._dicts.get(dict_id)
+        if data is None:
+            # Treinado por outro processo depois que este carregou o seu
+            row = self._conn().execute('SELECT data FROM text_dicts WHERE id = ?', (dict_id,)).fetchone()
+            data = self._dicts[dict_id] = row[0]
+        return data
+
+    def _text_blob(self, content):
+        """(sha256 do texto, id do dicionário, texto comprimido)"""
+        sha256 = hashlib.sha256(content.encode('utf-8')).hexdigest()
+        dict_id, zdict = self._latest_dictionary()
+        return sha256, dict_id, compress_text(content, zdict)
+
+    def _row_values(self, entry):
+        """Valores da linha do registro e o blob do texto (None se não houver texto)"""
+        data = dict(entry.get('data') or {})
+        # O texto completo fica fora do JSON do registro, para que listagens não o carreguem
+        content = data.pop('pdf_content', None)
+        meta = dict(entry, data=data)
+        blob = self._text_blob(content) if content else None
+        return (
+            entry['id'],
+            entry.get('timestamp', ''),
+            data.get('status'),
+            (data.get('arquivo') or {}).get('nome_original'),
+            len(content or ''),
+            json.dumps(meta, ensure_ascii=False, separators=(',', ':')),
+            content[:SNIPPET_CHARS] if content else content,
+            blob[0] if blob else None
+        ), blob
+
+    def _content(self, dict_id, data):
+        if data is None:
+            return None
+        return decompress_text(data, self._dictionary(dict_id))
+
+    def _merge(self, entry_json, dict_id, data):
+        entry = json.loads(entry_json)
+        if data is not None:
+            entry['data']['pdf_content'] = self._content(dict_id, data)
+        return entry
+
+    def _insert(self, conn, rows, ignore_existing):
+        """Grava os blobs de texto (deduplicados pelo hash) e as linhas dos registros"""
+        conn.executemany('INSERT OR IGNORE INTO text_blobs VALUES (?, ?, ?)',
+                         [blob for _, blob in rows if blob])
+        verb = 'INSERT OR IGNORE' if ignore_existing else 'INSERT'
+        cursor = conn.executemany(
+            f'{verb} INTO records (id, timestamp, status, nome_original, content_chars, entry, snippet, content_sha) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            [row for row, _ in rows]
+        )
+        return cursor.rowcount
+
+    def _after_write(self, count):
+        # Instalações novas treinam o dicionário assim que houver textos suficientes
+        if self._current_dict is not None:
+            return
+        self._writes_without_dict += count
+        if self._writes_without_dict < DICT_CHECK_INTERVAL:
+            return
+        self._writes_without_dict = 0
+        try:
+            self.maybe_train_dictionary()
+        except Exception as e:
+            logger.warning(f"Erro ao treinar dicionário de compressão: {str(e)}")
+
+    def append(self, entry):
+        """Grava um registro (uma transação curta; seguro entre processos)"""
+        # Compressão fora da transação, para não segurar a trava de escrita
+        rows = [self._row_values(entry)]
+        with self._conn() as conn:
+            self._insert(conn, rows, ignore_existing=False)
+        self._after_write(len(rows))
+
+    def append_many(self, entries):
+        """Grava vários registros em uma única transação, ignorando IDs já existentes"""
+        rows = [self._row_values(entry) for entry in entries]
+        with self._conn() as conn:
+            inserted = self._insert(conn, rows, ignore_existing=True)
+        self._after_write(len(rows))
+        return inserted
+
+    def maybe_train_dictionary(self):
+        """Treina o primeiro dicionário quando houver registros suficientes; retorna o id ou None"""
+        dict_id, _ = self._latest_dictionary()
+        if dict_id:
+            return None
+        if self.count(with_content=True) < DICT_MIN_RECORDS:
+            return None
+        return self.train_dictionary()
+
+    def train_dictionary(self, sample_size=DICT_SAMPLE_SIZE):
+        """Novo dicionário a partir dos textos mais recentes; vale para os blobs gravados depois"""
+        conn = self._conn()
+        samples = [
+            self._content(dict_id, data) for dict_id, data in conn.execute(
+                'SELECT b.dict_id, b.data FROM records r JOIN text_blobs b ON b.sha256 = r.content_sha '
+                'ORDER BY r.seq DESC LIMIT ?', (sample_size,)
+            )
+        ]
+        if not samples:
+            return None
+        with conn:
+            return self._save_dictionary(conn, train_dictionary(samples))
+
+    def recompress(self, batch_size=500):
+        """Recomprime com o dicionário mais recente os blobs gravados com outro; retorna (blobs, bytes antes, depois)"""
+        dict_id, zdict = self._latest_dictionary()
+        conn = self._conn()
+        count = before = after = 0
+        last_sha = ''
+        while True:
+            rows = conn.execute(
+                'SELECT sha256, dict_id, data FROM text_blobs WHERE sha256 > ? AND dict_id != ? '
+                'ORDER BY sha256 LIMIT ?', (last_sha, dict_id, batch_size)
+            ).fetchall()
+            if not rows:
+                break
+            updates = []
+            for sha256, old_dict, data in rows:
+                new_data = compress_text(self._content(old_dict, data), zdict)
+                updates.append((dict_id, new_data, sha256))
+                before += len(data)
+                after += len(new_data)
+                last_sha = sha256
+            with conn:
+                conn.executemany('UPDATE text_blobs SET dict_id = ?, data = ? WHERE sha256 = ?', updates)
+            count += len(rows)
+        return count, before, after
+
+    def get(self, record_id):
+        """Busca um registro pelo ID (índice único, O(log n))"""
+        row = self._conn().execute(
+            'SELECT r.entry, b.dict_id, b.data FROM records r LEFT JOIN text_blobs b ON b.sha256 = r.content_sha '
+            'WHERE r.id = ?', (record_id,)
+        ).fetchone()
+        return self._merge(*row) if row else None
+
+    def existing_ids(self, record_ids, chunk_size=500):
+        """Subconjunto dos IDs informados que já estão gravados"""
+        found = set()
+        conn = self._conn()
+        for start in range(0, len(record_ids), chunk_size):
+            chunk = record_ids[start:start + chunk_size]
+            placeholders = ', '.join('?' * len(chunk))
+            found.update(row[0] for row in conn.execute(
+                f'SELECT id FROM records WHERE id IN ({placeholders})', chunk
+            ))
+        return found
+
+    def max_seq(self):
+        """Seq do registro mais recente (0 se vazio); cresce a cada gravação"""
+        return self._conn().execute('SELECT COALESCE(MAX(seq), 0) FROM records').fetchone()[0]
+
+    def iter_seq_range(self, after_seq, until_seq):
+        """Registros completos com seq em (after_seq, until_seq], em ordem de gravação"""
+        # Uma única consulta: leitura consistente no modo WAL, sem bloquear as gravações
+        for entry, dict_id, data in self._conn().execute(
+                'SELECT r.entry, b.dict_id, b.data FROM records r LEFT JOIN text_blobs b ON b.sha256 = r.content_sha '
+                'WHERE r.seq > ? AND r.seq <= ? ORDER BY r.seq', (after_seq, until_seq)):
+            yield self._merge(entry, dict_id, data)
+
+    def get_content(self, record_id):
+        """Retorna apenas o texto extraído do registro (None se o ID não existir)"""
+        row = self._conn().execute(
+            'SELECT b.dict_id, b.data FROM records r LEFT JOIN text_blobs b ON b.sha256 = r.content_sha '
+            'WHERE r.id = ?', (record_id,)
+        ).fetchone()
+        return (self._content(*row) or '') if row else None
+
+    @staticmethod
+    def _where(before=None, after=None, date_from=None, date_to=None, nome=None, status=None):
+        """Monta a cláusula WHERE dos filtros de listagem"""
+        clauses, params = [], []
+        if before:
+            clauses.append('timestamp < ?')
+            params.append(before)
+        if after:
+            clauses.append('timestamp >= ?')
+            params.append(after)
+        if date_from:
+            clauses.append('timestamp >= ?')
+            params.append(date_from)
+        if date_to:
+            # Data final inclusiva: qualquer horário do dia informado
+            clauses.append('timestamp < ?')
+            params.append(date_to + '\uffff')
+        if nome:
+            clauses.append("nome_original LIKE ? ESCAPE '\\'")
+            escaped = nome.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            params.append(f'%{escaped}%')
+        if status:
+            clauses.append('status = ?')
+            params.append(status)
+        return clauses, params
+
+    def iter_recent(self, limit=None, **filters):
+        """Registros completos do mais recente para o mais antigo, com filtros opcionais"""
+        clauses, params = self._where(**filters)
+        sql = 'SELECT r.entry, b.dict_id, b.data FROM records r LEFT JOIN text_blobs b ON b.sha256 = r.content_sha'
+        if clauses:
+            sql += ' WHERE ' + ' AND '.join(clauses)
+        sql += ' ORDER BY timestamp DESC, seq DESC'
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params.append(limit)
+        for entry, dict_id, data in self._conn().execute(sql, params):
+            yield self._merge(entry, dict_id, data)
+
+    def iter_chronological(self, batch_size=500, **filters):
+        """Registros completos em ordem de gravação, lidos em lotes pelo seq (memória constante)
+
+        Cada lote é uma consulta curta: exportações longas não seguram uma
+        transação de leitura aberta durante toda a transferência.
+        """
+        last_seq = 0
+        while True:
+            clauses, params = self._where(**filters)
+            clauses.append('r.seq > ?')
+            params.extend([last_seq, batch_size])
+            rows = self._conn().execute(
+                'SELECT r.seq, r.entry, b.dict_id, b.data FROM records r '
+                'LEFT JOIN text_blobs b ON b.sha256 = r.content_sha '
+                f'WHERE {" AND ".join(clauses)} ORDER BY r.seq LIMIT ?', params
+            ).fetchall()
+            for seq, entry, dict_id, data in rows:
+                yield self._merge(entry, dict_id, data)
+            if len(rows) < batch_size:
+                break
+            last_seq = rows[-1][0]
+
+    def list_page(self, limit=50, cursor=None, **filters):
+        """Página de metadados + trecho do texto, com paginação por cursor (timestamp, seq)
+
+        Retorna (itens, próximo_cursor); próximo_cursor é None na última página.
+        """
+        clauses, params = self._where(**filters)
+        if cursor:
+            cursor_ts, cursor_seq = _decode_cursor(cursor)
+            clauses.append('(timestamp < ? OR (timestamp = ? AND seq < ?))')
+            params.extend([cursor_ts, cursor_ts, cursor_seq])
+        sql = 'SELECT seq, timestamp, entry, snippet, content_chars FROM records'
+        if clauses:
+            sql += ' WHERE ' + ' AND '.join(clauses)
+        sql += ' ORDER BY timestamp DESC, seq DESC LIMIT ?'
+        params.append(limit + 1)
+
+        rows = self._conn().execute(sql, params).fetchall()
+        items = []
+        for seq, timestamp, entry, snippet, content_chars in rows[:limit]:
+            item = json.loads(entry)
+            item['data']['pdf_snippet'] = snippet or ''
+            item['data']['pdf_content_chars'] = content_chars
+            items.append(item)
+        next_cursor = None
+        if len(rows) > limit:
+            seq, timestamp = rows[limit - 1][0], rows[limit - 1][1]
+            next_cursor = _encode_cursor(timestamp, seq)
+        return items, next_cursor
+
+    def count(self, with_content=False):
+        """Total de registros (ou apenas os que possuem texto extraído)"""
+        sql = 'SELECT COUNT(*) FROM records'
+        if with_content:
+            sql += ' WHERE content_chars > 0'
+        return self._conn().execute(sql).fetchone()[0]
+
+    def migrate_legacy_file(self, path, batch_size=500):
+        """Importa registros de um DATA_FILE antigo; IDs já importados são ignorados"""
+        imported = 0
+        batch = []
+        for record in iter_legacy_records(path):
+            if 'id' not in record:
+                continue
+            batch.append(record)
+            if len(batch) >= batch_size:
+                imported += self.append_many(batch)
+                batch = []
+        if batch:
+            imported += self.append_many(batch)
+        logger.info(f"Migração de {path}: {imported} registro(s) importado(s)")
+        return imported
+
+    def compact(self):
+        """Consolida o WAL e reescreve o banco sem páginas livres"""
+        conn = self._conn()
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        conn.execute('VACUUM')
+
+
+def main(argv):
+    if len(argv) < 2 or argv[1] not in ('migrar', 'compactar', 'dicionario'):
+        print(__doc__)
+        return 1
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    if argv[1] == 'migrar':
+        if len(argv) < 3:
+            print("Informe o arquivo de dados a migrar")
+            return 1
+        store = RecordStore(argv[3] if len(argv) > 3 else DEFAULT_DB_FILE)
+        imported = store.migrate_legacy_file(argv[2])
+        print(f"✅ {imported} registro(s) migrado(s) para {store.path} (total: {store.count()})")
+    elif argv[1] == 'dicionario':
+        store = RecordStore(argv[2] if len(argv) > 2 else DEFAULT_DB_FILE)
+        dict_id = store.train_dictionary()
+        if dict_id is None:
+            print("Nenhum texto armazenado para treinar o dicionário")
+            return 1
+        count, before, after = store.recompress()
+        print(f"✅ Dicionário {dict_id} treinado; {count} texto(s) recomprimido(s): {before} -> {after} bytes")
+    else:
+        store = RecordStore(argv[2] if len(argv) > 2 else DEFAULT_DB_FILE)
+        before = os.path.getsize(store.path)
+        store.compact()
+        print(f"✅ Banco compactado: {before} -> {os.path.getsize(store.path)} bytes")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
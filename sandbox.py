@@ -0,0 +1,223 @@
+"""
+Execução isolada das chamadas aos motores de extração
+As chamadas rodam em processos filhos (workers do sandbox) com limite de
+tempo de parede por chamada e limites de memória e CPU (rlimits). Um PDF
+patológico que prenda o pdfplumber ou o PyPDF2 em um laço tem o worker
+morto ao fim do prazo, e quem chamou recebe TimeoutError em vez de ficar
+preso junto com o worker do servidor.
+
+Os workers são reaproveitados entre chamadas (a criação de um processo
+custaria mais que a extração de um PDF pequeno) e substituídos após um
+tempo limite, um erro de memória ou SANDBOX_MAX_CALLS chamadas. Onde há
+forkserver (Linux, macOS) eles são criados a partir de um servidor de fork
+que importou os motores uma única vez, e não do processo do servidor web:
+um fork direto copiaria locks de outras threads (logging, cache, gravação
+no banco) possivelmente presos no instante da cópia. As chamadas levam o
+motor e o diretório atual de quem chamou, já que o worker não vê o que o
+processo mudou depois de o servidor de fork iniciar.
+
+Configuração:
+    SANDBOX_ENABLED       executa os motores em processos isolados (padrão 1)
+    SANDBOX_MEMORY_MB     memória que o worker pode alocar além da herdada do
+                          servidor de fork (padrão 1024; 0 = sem limite)
+    SANDBOX_IDLE_WORKERS  workers ociosos mantidos por processo (padrão: núcleos)
+    SANDBOX_MAX_CALLS     chamadas atendidas antes de o worker ser substituído (padrão 500)
+"""
+
+import os
+import time
+import threading
+import multiprocessing
+
+from extraction_engines import enabled_engines
+
+try:
+    import resource
+    RESOURCE_AVAILABLE = True
+except ImportError:
+    RESOURCE_AVAILABLE = False
+
+SANDBOX_ENABLED = os.environ.get('SANDBOX_ENABLED', '1').lower() not in ('0', 'false', 'nao', 'não')
+SANDBOX_MEMORY_MB = int(os.environ.get('SANDBOX_MEMORY_MB', 1024))
+SANDBOX_IDLE_WORKERS = int(os.environ.get('SANDBOX_IDLE_WORKERS', os.cpu_count() or 1))
+SANDBOX_MAX_CALLS = int(os.environ.get('SANDBOX_MAX_CALLS', 500))
+
+_FORKSERVER = 'forkserver' in multiprocessing.get_all_start_methods()
+_context = multiprocessing.get_context('forkserver' if _FORKSERVER else 'spawn')
+if _FORKSERVER:
+    from multiprocessing import forkserver
+    _context.set_forkserver_preload(['sandbox', 'layout_templates']
+                                    + [engine.module_name for engine in enabled_engines() if engine.available])
+
+_idle = []
+_idle_pid = None
+_idle_lock = threading.Lock()
+
+
+def _address_space():
+    """Espaço de endereçamento atual do processo em bytes (None fora do Linux)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[0]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return None
+
+
+def _limit_memory(memory_mb):
+    # O limite é relativo ao que o worker herdou: os motores importados já ocupam dezenas de MB
+    current = _address_space()
+    if RESOURCE_AVAILABLE and memory_mb and current is not None:
+        limit = current + memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def _limit_cpu(timeout):
+    # Salvaguarda caso o pai morra sem encerrar o worker: o limite de CPU é
+    # acumulado no processo, então é renovado a partir do tempo já consumido
+    if RESOURCE_AVAILABLE and timeout:
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        soft = int(usage.ru_utime + usage.ru_stime + timeout) + 2
+        hard = resource.getrlimit(resource.RLIMIT_CPU)[1]
+        if hard != resource.RLIM_INFINITY:
+            soft = min(soft, hard)
+        resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+
+def _serve(conn, memory_mb):
+    """Laço do worker: recebe (func, args, timeout, diretório) e responde (status, valor)"""
+    _limit_memory(memory_mb)
+    while True:
+        try:
+            func, args, timeout, cwd = conn.recv()
+            if cwd != os.getcwd():
+                os.chdir(cwd)
+        except (EOFError, OSError):
+            break
+        except Exception as e:
+            conn.send(('erro', f"Chamada não pôde ser recebida: {e}"))
+            continue
+        _limit_cpu(timeout)
+        try:
+            message = ('ok', func(*args))
+        except MemoryError as e:
+            # Estado do processo incerto após estourar o limite: responde e encerra
+            message = ('fatal', f"MemoryError: {e}")
+        except BaseException as e:
+            message = ('erro', f"{type(e).__name__}: {e}")
+        try:
+            conn.send(message)
+        except Exception as e:
+            conn.send(('erro', f"Resultado não pôde ser enviado: {e}"))
+        if message[0] == 'fatal':
+            break
+    conn.close()
+
+
+class _Worker:
+    def __init__(self, memory_mb):
+        self.conn, child_conn = _context.Pipe()
+        self.process = _context.Process(target=_serve, args=(child_conn, memory_mb), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.calls = 0
+
+    def kill(self):
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+
+def _acquire(memory_mb):
+    global _idle, _idle_pid
+    with _idle_lock:
+        # Workers ociosos pertencem ao processo que os criou (não passam pelo fork)
+        if _idle_pid != os.getpid():
+            _idle, _idle_pid = [], os.getpid()
+        while _idle:
+            worker = _idle.pop()
+            if worker.process.is_alive():
+                return worker
+    return _Worker(memory_mb)
+
+
+def _release(worker):
+    with _idle_lock:
+        if (_idle_pid == os.getpid() and worker.calls < SANDBOX_MAX_CALLS
+                and len(_idle) < SANDBOX_IDLE_WORKERS):
+            _idle.append(worker)
+            return
+    worker.kill()
+
+
+class SandboxCall:
+    """Chamada em andamento em um worker isolado"""
+
+    def __init__(self, func, args, timeout, memory_mb=SANDBOX_MEMORY_MB):
+        self.timeout = timeout
+        self.started = time.monotonic()
+        self._worker = _acquire(memory_mb)
+        self._worker.calls += 1
+        self._worker.conn.send((func, args, timeout, os.getcwd()))
+
+    def result(self, deadline=None):
+        """Aguarda o resultado até o prazo (monotonic); TimeoutError mata o worker"""
+        worker, self._worker = self._worker, None
+        if worker is None:
+            raise RuntimeError("resultado já consumido")
+        if deadline is None:
+            deadline = self.started + self.timeout if self.timeout else None
+        remaining = None if deadline is None else max(deadline - time.monotonic(), 0)
+        try:
+            if not worker.conn.poll(remaining):
+                raise TimeoutError(f"tempo limite de {self.timeout:g}s excedido")
+            status, value = worker.conn.recv()
+        except TimeoutError:
+            worker.kill()
+            raise
+        except (EOFError, OSError):
+            # Morto por sinal (ex.: limite de CPU) ou encerrado sem responder
+            worker.kill()
+            raise RuntimeError(f"processo de extração encerrado (código {worker.process.exitcode})")
+        if status == 'fatal':
+            worker.kill()
+        else:
+            _release(worker)
+        if status != 'ok':
+            raise RuntimeError(value)
+        return value
+
+    def cancel(self):
+        """Descarta uma chamada cujo resultado não será lido (o worker é encerrado)"""
+        if self._worker is not None:
+            self._worker.kill()
+            self._worker = None
+
+
+def _forget_forkserver():
+    # O servidor de fork pertence a quem o iniciou: em um filho criado por os.fork
+    # (pool de jobs) o multiprocessing faria waitpid em um processo que não é
+    # filho dele. O filho inicia o próprio servidor no primeiro uso.
+    server = forkserver._forkserver
+    if server._forkserver_alive_fd is not None:
+        os.close(server._forkserver_alive_fd)
+    server._forkserver_address = server._forkserver_alive_fd = server._forkserver_pid = None
+    server._lock = threading.Lock()
+
+
+if _FORKSERVER and hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_forget_forkserver)
+
+
+def shutdown():
+    """Encerra os workers ociosos deste processo"""
+    with _idle_lock:
+        workers = _idle[:] if _idle_pid == os.getpid() else []
+        _idle.clear()
+    for worker in workers:
+        worker.kill()
+
+
+def run(func, *args, timeout=None, memory_mb=SANDBOX_MEMORY_MB):
+    """Executa func(*args) em um worker isolado; TimeoutError se passar de timeout segundos"""
+    return SandboxCall(func, args, timeout, memory_mb).result()
@@ -0,0 +1,250 @@
+"""
+Índice de busca textual sobre o conteúdo extraído dos PDFs
+Índice invertido SQLite FTS5 atualizado a cada registro salvo, com remoção de
+acentos (São/Sao), normalização de caixa, tokens numéricos, frases e prefixos
+
+O índice é contentless (content=''): guarda só os termos, não uma segunda
+cópia do texto, que já está no armazenamento de registros. O ID e o nome do
+arquivo ficam na tabela ids, ligada ao índice pelo rowid, e os trechos
+destacados são montados a partir do texto lido do armazenamento.
+"""
+
+import os
+import re
+import html
+import logging
+import sqlite3
+import threading
+import unicodedata
+
+logger = logging.getLogger(__name__)
+
+# Números com separadores (10.803.604, 123-4, 01/04/2025) também são indexados só com dígitos
+NUMBER_RE = re.compile(r'\d[\d.,\-/]*\d')
+QUERY_TOKEN_RE = re.compile(r'"([^"]*)"|(\S+)')
+# Palavras e números (com separadores) do texto, para montar os trechos
+SNIPPET_TOKEN_RE = re.compile(r'\d[\d.,\-/]*\d|\w+')
+SNIPPET_TOKENS = 16
+
+COLUMNS = 'nome, conteudo, numeros'
+
+
+def number_tokens(text):
+    """Versões apenas com dígitos dos números com separadores presentes no texto"""
+    tokens = set()
+    for match in NUMBER_RE.finditer(text):
+        digits = re.sub(r'\D', '', match.group())
+        if digits != match.group():
+            tokens.add(digits)
+    return ' '.join(sorted(tokens))
+
+
+def _quote(term):
+    return '"' + term.replace('"', '""') + '"'
+
+
+def build_match_query(query):
+    """Converte a consulta do usuário em uma expressão FTS5 segura
+
+    "texto entre aspas" vira busca por frase, termo* vira busca por prefixo e
+    números aceitam qualquer formatação (10.803.604 encontra 10803604).
+    Todos os termos são combinados com AND.
+    """
+    parts = []
+    for phrase, term in QUERY_TOKEN_RE.findall(query):
+        if phrase:
+            if phrase.strip():
+                parts.append(_quote(phrase))
+            continue
+        prefix = term.endswith('*')
+        term = term.rstrip('*')
+        # Remove pontuação das bordas, preservando separadores internos de números
+        term = term.strip('.,;:!?()[]{}\'')
+        if not term:
+            continue
+        if re.fullmatch(r'[\d.,\-/]+', term) and re.search(r'\d', term):
+            digits = re.sub(r'\D', '', term)
+            expr = f'({_quote(term)}{"*" if prefix else ""} OR numeros : {_quote(digits)}{"*" if prefix else ""})'
+            parts.append(expr)
+        else:
+            parts.append(_quote(term) + ('*' if prefix else ''))
+    return ' AND '.join(parts)
+
+
+def _fold(text):
+    """Sem acentos e sem caixa, como o tokenizer (remove_diacritics 2)"""
+    return ''.join(c for c in unicodedata.normalize('NFD', text) if not unicodedata.combining(c)).casefold()
+
+
+def _query_terms(query):
+    """Termos da consulta como (termo normalizado, dígitos, prefixo) para destacar no trecho"""
+    terms = []
+    for phrase, term in QUERY_TOKEN_RE.findall(query):
+        prefix = not phrase and term.endswith('*')
+        for word in (phrase.split() if phrase else [term.rstrip('*')]):
+            word = word.strip('.,;:!?()[]{}\'')
+            if word:
+                terms.append((_fold(word), re.sub(r'\D', '', word), prefix))
+    return terms
+
+
+def make_snippet(content, query, tokens=SNIPPET_TOKENS):
+    """Trecho de até `tokens` palavras em torno da primeira ocorrência, com <mark> (como snippet() do FTS5)
+
+    O texto vem do PDF: tudo fora das marcações é escapado, e o trecho pode ir direto para o HTML.
+    """
+    terms = _query_terms(query)
+
+    def hit(token):
+        folded = _fold(token)
+        digits = re.sub(r'\D', '', token) if token[0].isdigit() else ''
+        for term, term_digits, prefix in terms:
+            if folded == term or (prefix and folded.startswith(term)):
+                return True
+            if digits and term_digits and (digits == term_digits or (prefix and digits.startswith(term_digits))):
+                return True
+        return False
+
+    words = list(SNIPPET_TOKEN_RE.finditer(content))
+    if not words:
+        return ''
+    first = next((i for i, match in enumerate(words) if hit(match.group())), 0)
+    start = max(0, min(first - tokens // 4, len(words) - tokens))
+    end = min(start + tokens, len(words))
+    parts = ['…' if start else '']
+    position = words[start].start()
+    for match in words[start:end]:
+        word = html.escape(match.group())
+        parts.append(html.escape(content[position:match.start()]))
+        parts.append(f'<mark>{word}</mark>' if hit(match.group()) else word)
+        position = match.end()
+    parts.append('…' if end < len(words) else '')
+    return ''.join(parts)
+
+
+class SearchIndex:
+    """Índice FTS5 contentless (tokenizer unicode61 sem diacríticos) em arquivo próprio
+
+    `content_loader(record_id)` devolve o texto do registro, usado só para os
+    trechos dos resultados (sem ele, os resultados vêm sem trecho).
+    """
+
+    def __init__(self, path, content_loader=None):
+        self.path = path
+        self.existed = os.path.exists(path)
+        self.content_loader = content_loader
+        self._local = threading.local()
+        self._init_db()
+
+    def _conn(self):
+        # Uma conexão por thread e por processo (conexões não sobrevivem a fork)
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _init_db(self):
+        conn = self._conn()
+        row = conn.execute("SELECT sql FROM sqlite_master WHERE name = 'docs'").fetchone()
+        if row and "content=''" not in row[0].replace(' ', ''):
+            # Índice antigo com cópia do texto: recriado vazio e reconstruído pelo chamador
+            logger.info("Índice de busca no formato antigo (com cópia do texto); será reconstruído")
+            with conn:
+                conn.execute('DROP TABLE docs')
+            conn.execute('VACUUM')
+            self.existed = False
+        with conn:
+            conn.execute('''
+                CREATE VIRTUAL TABLE IF NOT EXISTS docs USING fts5(
+                    nome,
+                    conteudo,
+                    numeros,
+                    content = '',
+                    tokenize = "unicode61 remove_diacritics 2"
+                )
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS ids (
+                    rowid INTEGER PRIMARY KEY,
+                    record_id TEXT NOT NULL,
+                    nome TEXT
+                )
+            ''')
+
+    @staticmethod
+    def _row(entry):
+        data = entry.get('data') or {}
+        content = data.get('pdf_content') or ''
+        return (
+            entry['id'],
+            (data.get('arquivo') or {}).get('nome_original') or '',
+            content,
+            number_tokens(content)
+        )
+
+    @staticmethod
+    def _insert(conn, rows):
+        # O rowid gerado em ids é o mesmo do documento no índice
+        for record_id, nome, content, numeros in rows:
+            rowid = conn.execute('INSERT INTO ids (record_id, nome) VALUES (?, ?)', (record_id, nome)).lastrowid
+            conn.execute(f'INSERT INTO docs (rowid, {COLUMNS}) VALUES (?, ?, ?, ?)', (rowid, nome, content, numeros))
+
+    def add(self, entry):
+        """Indexa um registro recém-salvo (atualização incremental)"""
+        self.add_many([entry])
+
+    def add_many(self, entries):
+        """Indexa vários registros em uma única transação"""
+        with self._conn() as conn:
+            self._insert(conn, [self._row(entry) for entry in entries])
+
+    def rebuild(self, entries, batch_size=500):
+        """Recria o índice a partir do armazenamento de registros"""
+        count = 0
+        with self._conn() as conn:
+            # Índice contentless: só pode ser esvaziado por inteiro
+            conn.execute("INSERT INTO docs (docs) VALUES ('delete-all')")
+            conn.execute('DELETE FROM ids')
+            batch = []
+            for entry in entries:
+                batch.append(self._row(entry))
+                if len(batch) >= batch_size:
+                    self._insert(conn, batch)
+                    count += len(batch)
+                    batch = []
+            if batch:
+                self._insert(conn, batch)
+                count += len(batch)
+            conn.execute("INSERT INTO docs (docs) VALUES ('optimize')")
+        # Devolve ao disco as páginas liberadas pelo esvaziamento e pela fusão dos segmentos
+        conn.execute('VACUUM')
+        logger.info(f"Índice de busca reconstruído com {count} registro(s)")
+        return count
+
+    def search(self, query, limit=20, offset=0):
+        """Retorna (resultados, total) ordenados por relevância (BM25) com trechos destacados"""
+        match = build_match_query(query)
+        if not match:
+            return [], 0
+        conn = self._conn()
+        total = conn.execute('SELECT COUNT(*) FROM docs WHERE docs MATCH ?', (match,)).fetchone()[0]
+        rows = conn.execute('''
+            SELECT ids.record_id, ids.nome, bm25(docs, 2.0, 1.0, 1.0) AS score
+            FROM docs JOIN ids ON ids.rowid = docs.rowid
+            WHERE docs MATCH ?
+            ORDER BY score LIMIT ? OFFSET ?
+        ''', (match, limit, offset)).fetchall()
+        results = []
+        for record_id, nome, score in rows:
+            # O índice não guarda o texto: o trecho vem do armazenamento de registros
+            content = self.content_loader(record_id) if self.content_loader else None
+            results.append({
+                'record_id': record_id,
+                'nome_original': nome,
+                'score': round(-score, 4),
+                'trecho': make_snippet(content, query) if content else ''
+            })
+        return results, total
@@ -0,0 +1,279 @@
+"""
+Snapshots incrementais do armazenamento de registros
+Uma thread em segundo plano grava periodicamente em backups/ os registros
+novos desde o último snapshot (NDJSON comprimido com gzip), sem passar pelo
+caminho das requisições. O custo de cada snapshot é proporcional aos
+registros novos: a posição é o seq do último registro copiado, que faz
+parte do nome do arquivo.
+
+Uma cadeia é um snapshot completo seguido dos incrementais que o
+continuam. A cada SNAPSHOT_FULL_EVERY incrementais começa uma nova cadeia;
+a rotação remove cadeias inteiras (nunca a mais recente) por idade e por
+quantidade de arquivos, para que toda cadeia mantida possa ser restaurada.
+
+Uso:
+    python snapshot.py criar [registros.db]
+    python snapshot.py listar
+    python snapshot.py restaurar <registros.db de destino> [--ate ARQUIVO]
+"""
+
+import os
+import re
+import sys
+import gzip
+import json
+import time
+import logging
+import threading
+from datetime import datetime
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    FCNTL_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BACKUP_FOLDER = 'backups'
+SNAPSHOT_INTERVAL = float(os.environ.get('SNAPSHOT_INTERVAL', 300))
+SNAPSHOT_FULL_EVERY = int(os.environ.get('SNAPSHOT_FULL_EVERY', 288))
+BACKUP_RETENTION_DAYS = float(os.environ.get('BACKUP_RETENTION_DAYS', 30))
+BACKUP_MAX_FILES = int(os.environ.get('BACKUP_MAX_FILES', 2000))
+
+SNAPSHOT_RE = re.compile(r'^snapshot_(\d{8}_\d{6})_(completo|incremental)_(\d+)-(\d+)\.ndjson\.gz$')
+
+
+class Snapshot:
+    """Arquivo de snapshot: registros com seq em (inicio, fim]"""
+
+    __slots__ = ('path', 'name', 'created', 'kind', 'start', 'end')
+
+    def __init__(self, directory, name, match):
+        self.path = os.path.join(directory, name)
+        self.name = name
+        self.created, self.kind = match.group(1), match.group(2)
+        self.start, self.end = int(match.group(3)), int(match.group(4))
+
+    @property
+    def full(self):
+        return self.kind == 'completo'
+
+
+def list_snapshots(directory):
+    """Snapshots do diretório em ordem de seq"""
+    if not os.path.isdir(directory):
+        return []
+    snapshots = []
+    for name in os.listdir(directory):
+        match = SNAPSHOT_RE.match(name)
+        if match:
+            snapshots.append(Snapshot(directory, name, match))
+    snapshots.sort(key=lambda s: (s.end, s.start))
+    return snapshots
+
+
+def chains(snapshots):
+    """Agrupa os snapshots em cadeias (completo + incrementais contíguos)"""
+    result = []
+    for snap in snapshots:
+        if snap.full or not result or result[-1][-1].end != snap.start:
+            result.append([snap])
+        else:
+            result[-1].append(snap)
+    return result
+
+
+def iter_snapshot(path):
+    """Registros de um arquivo de snapshot"""
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+class SnapshotManager:
+    """Thread de snapshots incrementais com rotação por idade e quantidade"""
+
+    def __init__(self, record_store, directory=DEFAULT_BACKUP_FOLDER, interval=SNAPSHOT_INTERVAL,
+                 full_every=SNAPSHOT_FULL_EVERY, retention_days=BACKUP_RETENTION_DAYS,
+                 max_files=BACKUP_MAX_FILES):
+        self.record_store = record_store
+        self.directory = directory
+        self.interval = interval
+        self.full_every = full_every
+        self.retention_days = retention_days
+        self.max_files = max_files
+        self._stop = threading.Event()
+        self._thread = None
+        os.makedirs(directory, exist_ok=True)
+
+    def start(self):
+        """Inicia a thread de snapshots (idempotente)"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='snapshots', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.take()
+            except Exception as e:
+                logger.warning(f"Erro ao criar snapshot: {str(e)}")
+
+    def _lock(self):
+        """Trava exclusiva entre processos (vários workers rodam a mesma thread); None se ocupada"""
+        lock_file = open(os.path.join(self.directory, '.snapshot.lock'), 'a')
+        if not FCNTL_AVAILABLE:
+            return lock_file
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return None
+        return lock_file
+
+    def take(self):
+        """Grava os registros novos desde o último snapshot; retorna o Snapshot ou None"""
+        lock = self._lock()
+        if lock is None:
+            return None
+        try:
+            snapshot = self._take()
+            self.rotate()
+            return snapshot
+        finally:
+            lock.close()
+
+    def _take(self):
+        existing = chains(list_snapshots(self.directory))
+        last_chain = existing[-1] if existing else []
+        start = last_chain[-1].end if last_chain else 0
+        end = self.record_store.max_seq()
+        if end == 0 or end <= start:
+            return None
+
+        # Nova cadeia quando a atual ficou longa ou não começa em um completo
+        full = not last_chain or not last_chain[0].full or len(last_chain) > self.full_every
+        if full:
+            start = 0
+        kind = 'completo' if full else 'incremental'
+        name = f"snapshot_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{kind}_{start}-{end}.ndjson.gz"
+        path = os.path.join(self.directory, name)
+        tmp_path = path + '.tmp'
+
+        count = 0
+        started = time.monotonic()
+        try:
+            with gzip.open(tmp_path, 'wt', encoding='utf-8', compresslevel=6) as f:
+                for entry in self.record_store.iter_seq_range(start, end):
+                    f.write(json.dumps(entry, ensure_ascii=False, separators=(',', ':')) + "\n")
+                    count += 1
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        logger.info(f"Snapshot {kind} criado: {name} ({count} registro(s) em "
+                    f"{time.monotonic() - started:.2f}s)")
+        return Snapshot(self.directory, name, SNAPSHOT_RE.match(name))
+
+    def rotate(self):
+        """Remove cadeias antigas inteiras; a cadeia mais recente é sempre mantida"""
+        existing = chains(list_snapshots(self.directory))
+        total = sum(len(chain) for chain in existing)
+        cutoff = time.time() - self.retention_days * 86400 if self.retention_days else None
+        removed = 0
+        for chain in existing[:-1]:
+            newest = os.path.getmtime(chain[-1].path)
+            expired = cutoff is not None and newest < cutoff
+            over_limit = self.max_files and total > self.max_files
+            if not (expired or over_limit):
+                break
+            for snap in chain:
+                os.remove(snap.path)
+            total -= len(chain)
+            removed += len(chain)
+        if removed:
+            logger.info(f"Rotação de snapshots: {removed} arquivo(s) removido(s)")
+        return removed
+
+
+def restore(directory, record_store, until=None, batch_size=500):
+    """Reaplica a cadeia mais recente (ou a que contém until) no armazenamento; retorna (arquivos, registros)"""
+    selected = None
+    until = os.path.basename(until) if until else None
+    for chain in chains(list_snapshots(directory)):
+        names = [snap.name for snap in chain]
+        if until is None:
+            selected = chain
+        elif until in names:
+            # A cadeia até o snapshot informado (inclusive)
+            selected = chain[:names.index(until) + 1]
+    if not selected:
+        raise ValueError("Nenhum snapshot encontrado para restaurar")
+    if not selected[0].full:
+        raise ValueError(f"A cadeia de {selected[0].name} não começa em um snapshot completo")
+
+    restored = 0
+    for snap in selected:
+        batch = []
+        for entry in iter_snapshot(snap.path):
+            batch.append(entry)
+            if len(batch) >= batch_size:
+                restored += record_store.append_many(batch)
+                batch = []
+        if batch:
+            restored += record_store.append_many(batch)
+        logger.info(f"Snapshot aplicado: {snap.name}")
+    return len(selected), restored
+
+
+def main(argv):
+    if len(argv) < 2 or argv[1] not in ('criar', 'listar', 'restaurar'):
+        print(__doc__)
+        return 1
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    directory = os.environ.get('BACKUP_FOLDER', DEFAULT_BACKUP_FOLDER)
+
+    if argv[1] == 'listar':
+        for chain in chains(list_snapshots(directory)):
+            for snap in chain:
+                size = os.path.getsize(snap.path)
+                print(f"{'📦' if snap.full else '  ➕'} {snap.name} ({snap.end - snap.start} seq, {size} bytes)")
+        return 0
+
+    from record_store import RecordStore, DEFAULT_DB_FILE
+
+    if argv[1] == 'criar':
+        store = RecordStore(argv[2] if len(argv) > 2 else DEFAULT_DB_FILE)
+        snapshot = SnapshotManager(store, directory).take()
+        print(f"✅ Snapshot criado: {snapshot.name}" if snapshot else "Nenhum registro novo desde o último snapshot")
+        return 0
+
+    args = argv[2:]
+    until = None
+    if '--ate' in args:
+        i = args.index('--ate')
+        until = args[i + 1]
+        del args[i:i + 2]
+    if not args:
+        print("Informe o banco de destino da restauração")
+        return 1
+    store = RecordStore(args[0])
+    try:
+        files, restored = restore(directory, store, until)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 1
+    print(f"✅ {restored} registro(s) restaurado(s) de {files} snapshot(s) em {store.path}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -1,13 +1,18 @@
 #!/usr/bin/env python3
 """
 Script de inicialização do Sistema de Coleta de Dados
-Executa verificações de sistema e inicia o servidor Flask
+Executa verificações de sistema e inicia o servidor
+
+Uso:
+    python start.py              servidor de desenvolvimento do Flask (debug)
+    python start.py --producao   gunicorn com workers pré-criados (gunicorn.conf.py)
 """
 
 import os
 import sys
 import subprocess
 import platform
+import importlib.util
 
 def check_python_version():
     """Verifica se a versão do Python é compatível"""
@@ -19,16 +24,14 @@ def check_python_version():
     return True
 
 def check_dependencies():
-    """Verifica se as dependências estão instaladas"""
-    try:
-        import flask
-        import PyPDF2
-        print("✅ Dependências instaladas")
-        return True
-    except ImportError as e:
-        print(f"❌ Dependência faltando: {e}")
+    """Verifica se as dependências estão instaladas (sem importar os motores de extração)"""
+    missing = [name for name in ('flask', 'PyPDF2') if importlib.util.find_spec(name) is None]
+    if missing:
+        print(f"❌ Dependência faltando: {', '.join(missing)}")
         print("Execute: pip install -r requirements.txt")
         return False
+    print("✅ Dependências instaladas")
+    return True
 
 def create_directories():
     """Cria diretórios necessários"""
@@ -40,6 +43,34 @@ def create_directories():
         else:
             print(f"✅ Diretório existe: {directory}")
 
+def run_production():
+    """Inicia o gunicorn com gunicorn.conf.py (workers, timeouts e pré-carga)"""
+    if importlib.util.find_spec('gunicorn') is None:
+        print("❌ gunicorn não está instalado (pip install -r requirements.txt)")
+        return 1
+    if platform.system() == 'Windows':
+        print("❌ O gunicorn não roda no Windows; use o modo de desenvolvimento")
+        return 1
+
+    # gunicorn.conf.py não é importável pelo nome (tem ponto); carregado pelo caminho
+    config_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gunicorn.conf.py')
+    spec = importlib.util.spec_from_file_location('gunicorn_conf', config_path)
+    gunicorn_conf = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(gunicorn_conf)
+    print(f"⚙️  Workers: {gunicorn_conf.workers} x {gunicorn_conf.threads} threads "
+          f"({os.cpu_count()} núcleo(s), {gunicorn_conf.available_memory_mb()} MB disponíveis)")
+    print(f"⏱️  Timeout do worker: {gunicorn_conf.timeout}s")
+    print(f"📍 Escutando em: {gunicorn_conf.bind}")
+    print("-" * 50)
+    # Os dados ficam no diretório atual, como no modo de desenvolvimento; o código vem da pasta do script
+    command = [sys.executable, '-m', 'gunicorn', '-c', config_path,
+               '--pythonpath', os.path.dirname(config_path), 'app:app']
+    try:
+        return subprocess.call(command)
+    except KeyboardInterrupt:
+        print("\n\n👋 Sistema finalizado pelo usuário")
+        return 0
+
 def show_system_info():
     """Mostra informações do sistema"""
     print("\n" + "="*50)
@@ -66,12 +97,16 @@ def main():
     
     create_directories()
     
+    if '--producao' in sys.argv[1:]:
+        print("\n🚀 Iniciando servidor de produção (gunicorn)...")
+        sys.exit(run_production())
+    
     print("\n🚀 Iniciando servidor...")
     print("📍 Acesse: http://localhost:5000")
     print("⏹️  Para parar: Ctrl+C")
     print("-" * 50)
     
-    # Inicia o servidor Flask
+    # Inicia o servidor de desenvolvimento do Flask
     try:
         from app import app
         app.run(debug=True, host='0.0.0.0', port=5000)
@@ -0,0 +1,141 @@
+"""
+Estatísticas mantidas incrementalmente
+Contadores e agregados atualizados no momento da gravação de cada registro,
+persistidos em um pequeno arquivo SQLite compartilhado entre processos, de
+modo que /api/stats responda em tempo constante
+"""
+
+import os
+import re
+import logging
+import sqlite3
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Registros antigos só têm os métodos no prefixo do texto extraído
+METHODS_PREFIX_RE = re.compile(r'^\[Métodos de extração utilizados: ([^\]]*)\]')
+
+DAILY_BUCKETS = 30  # Dias retornados em snapshot()
+
+
+def extraction_methods_of(data):
+    """Métodos de extração de um registro (campo próprio ou prefixo do texto)"""
+    methods = data.get('extraction_methods')
+    if methods is not None:
+        return methods
+    match = METHODS_PREFIX_RE.match(data.get('pdf_content') or '')
+    return [m.strip() for m in match.group(1).split(',') if m.strip()] if match else []
+
+
+class StatsStore:
+    """Agregados de registros: totais, motores de extração e buckets diários"""
+
+    def __init__(self, path):
+        self.path = path
+        self.existed = os.path.exists(path)
+        self._local = threading.local()
+        self._init_db()
+
+    def _conn(self):
+        # Uma conexão por thread e por processo (conexões não sobrevivem a fork)
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _init_db(self):
+        conn = self._conn()
+        conn.execute('CREATE TABLE IF NOT EXISTS totals (name TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+        conn.execute('CREATE TABLE IF NOT EXISTS engines (name TEXT PRIMARY KEY, count INTEGER NOT NULL)')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS daily (
+                day TEXT PRIMARY KEY,
+                registros INTEGER NOT NULL,
+                bytes INTEGER NOT NULL,
+                caracteres INTEGER NOT NULL
+            )
+        ''')
+
+    @staticmethod
+    def _apply(conn, entry):
+        """Soma um registro aos agregados (dentro de uma transação já aberta)"""
+        data = entry.get('data') or {}
+        size = (data.get('arquivo') or {}).get('tamanho') or 0
+        chars = len(data.get('pdf_content') or '')
+        day = entry.get('timestamp', '')[:10]
+
+        totals = [('total_registros', 1), ('bytes_ingeridos', size), ('caracteres_extraidos', chars)]
+        if chars:
+            totals.append(('total_pdfs', 1))
+        conn.executemany(
+            'INSERT INTO totals VALUES (?, ?) ON CONFLICT(name) DO UPDATE SET value = value + excluded.value',
+            totals
+        )
+        conn.executemany(
+            'INSERT INTO engines VALUES (?, 1) ON CONFLICT(name) DO UPDATE SET count = count + 1',
+            [(method,) for method in extraction_methods_of(data)]
+        )
+        conn.execute(
+            'INSERT INTO daily VALUES (?, 1, ?, ?) ON CONFLICT(day) DO UPDATE SET '
+            'registros = registros + 1, bytes = bytes + excluded.bytes, caracteres = caracteres + excluded.caracteres',
+            (day, size, chars)
+        )
+
+    def record(self, entry):
+        """Atualiza os agregados com um novo registro (chamado por save_data_to_log)"""
+        self.record_many([entry])
+
+    def record_many(self, entries):
+        """Atualiza os agregados com vários registros em uma única transação"""
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            for entry in entries:
+                self._apply(conn, entry)
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def rebuild(self, entries):
+        """Recalcula todos os agregados a partir do armazenamento de registros"""
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            for table in ('totals', 'engines', 'daily'):
+                conn.execute(f'DELETE FROM {table}')
+            count = 0
+            for entry in entries:
+                self._apply(conn, entry)
+                count += 1
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        logger.info(f"Estatísticas reconstruídas a partir de {count} registro(s)")
+        return count
+
+    def snapshot(self):
+        """Agregados atuais; custo independente do tamanho do histórico"""
+        conn = self._conn()
+        totals = dict(conn.execute('SELECT name, value FROM totals').fetchall())
+        engines = dict(conn.execute('SELECT name, count FROM engines ORDER BY count DESC').fetchall())
+        daily = conn.execute(
+            'SELECT day, registros, bytes, caracteres FROM daily ORDER BY day DESC LIMIT ?',
+            (DAILY_BUCKETS,)
+        ).fetchall()
+        return {
+            'total_registros': totals.get('total_registros', 0),
+            'total_pdfs': totals.get('total_pdfs', 0),
+            'bytes_ingeridos': totals.get('bytes_ingeridos', 0),
+            'caracteres_extraidos': totals.get('caracteres_extraidos', 0),
+            'motores_extracao': engines,
+            'por_dia': [
+                {'dia': day, 'registros': registros, 'bytes': size, 'caracteres': chars}
+                for day, registros, size, chars in daily
+            ]
+        }
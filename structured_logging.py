@@ -0,0 +1,194 @@
+"""
+Logging estruturado sem I/O no caminho das requisições
+O logger raiz recebe apenas um QueueHandler: a formatação JSON, a escrita no
+arquivo (com rotação por tamanho) e o console ficam em uma thread
+(QueueListener). Cada registro leva o ID da requisição em andamento.
+
+Um único processo escreve: o que chamou setup_logging (o master do gunicorn,
+com preload_app). Processos criados por fork depois disso (workers, pool de
+jobs, ingestão em lote) enviam os registros por um pipe
+(multiprocessing.SimpleQueue) lido por uma segunda thread no processo dono;
+não abrem o arquivo nem iniciam threads. Dois RotatingFileHandler no mesmo
+arquivo perderiam ou duplicariam linhas na rotação.
+
+Controles por ambiente:
+    LOG_LEVEL         nível mínimo (padrão INFO)
+    LOG_FILE          arquivo JSON, uma linha por registro (padrão sistema_logs.log)
+    LOG_MAX_BYTES     tamanho para rotação (padrão 10MB)
+    LOG_BACKUP_COUNT  arquivos rotacionados mantidos (padrão 5)
+    LOG_SAMPLE_RATE   fração dos registros INFO/DEBUG mantidos, por requisição (padrão 1.0)
+
+Argumentos caros devem ser passados no estilo %, que só é formatado se o
+nível estiver habilitado, ou com lazy(), que adia o cálculo:
+    logger.debug("Texto extraído: %s caracteres", lazy(len, texto))
+"""
+
+import os
+import copy
+import json
+import queue
+import atexit
+import random
+import logging
+import contextvars
+import multiprocessing
+import logging.handlers
+from datetime import datetime
+
+DEFAULT_LOG_FILE = 'sistema_logs.log'
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+LOG_FILE = os.environ.get('LOG_FILE', DEFAULT_LOG_FILE)
+LOG_MAX_BYTES = int(os.environ.get('LOG_MAX_BYTES', 10 * 1024 * 1024))
+LOG_BACKUP_COUNT = int(os.environ.get('LOG_BACKUP_COUNT', 5))
+LOG_SAMPLE_RATE = float(os.environ.get('LOG_SAMPLE_RATE', 1.0))
+CONSOLE_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# ID da requisição em andamento (definido pela aplicação em before_request)
+request_id_var = contextvars.ContextVar('request_id', default=None)
+
+# Atributos padrão do LogRecord; os demais (extra=...) vão para o JSON
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'request_id'}
+
+_listeners = []
+_console_handler = None
+
+
+class lazy:
+    """Argumento de log calculado só na formatação (nível habilitado e registro não descartado)"""
+
+    __slots__ = ('func', 'args')
+
+    def __init__(self, func, *args):
+        self.func = func
+        self.args = args
+
+    def __str__(self):
+        return str(self.func(*self.args))
+
+    __repr__ = __str__
+
+
+class ContextFilter(logging.Filter):
+    """Anexa o ID da requisição e aplica a amostragem de registros abaixo de WARNING"""
+
+    def __init__(self, sample_rate=1.0):
+        super().__init__()
+        self.sample_rate = sample_rate
+
+    def filter(self, record):
+        request_id = request_id_var.get()
+        record.request_id = request_id
+        if record.levelno >= logging.WARNING or self.sample_rate >= 1.0:
+            return True
+        # Mesma decisão para todos os registros da requisição: o rastro fica completo ou ausente
+        if request_id:
+            return (hash(request_id) % 10000) < self.sample_rate * 10000
+        return random.random() < self.sample_rate
+
+
+class JsonFormatter(logging.Formatter):
+    """Uma linha JSON por registro"""
+
+    def format(self, record):
+        item = {
+            'ts': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'nivel': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+            'request_id': getattr(record, 'request_id', None),
+            'pid': record.process
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and key not in item:
+                item[key] = value
+        if record.exc_info:
+            item['exc'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            item['exc'] = record.exc_text
+        return json.dumps(item, ensure_ascii=False, default=str)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    _exc_formatter = logging.Formatter()
+
+    def enqueue(self, record):
+        self.queue.put(record)
+
+    def prepare(self, record):
+        # Interpola a mensagem aqui (os argumentos podem mudar depois); JSON e I/O ficam na thread
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = self._exc_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def _build_handlers(log_file, max_bytes, backup_count):
+    file_handler = logging.handlers.RotatingFileHandler(
+        log_file, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8', delay=True
+    )
+    file_handler.setFormatter(JsonFormatter())
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(logging.Formatter(CONSOLE_FORMAT))
+    return file_handler, console_handler
+
+
+class _QueueListener(logging.handlers.QueueListener):
+    # Mesma interface para queue.SimpleQueue e multiprocessing.SimpleQueue (sem block/put_nowait)
+    def dequeue(self, block):
+        return self.queue.get()
+
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)
+
+
+def _start_listener(log_queue, handlers):
+    listener = _QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    _listeners.append(listener)
+    return log_queue
+
+
+def setup_logging(level=LOG_LEVEL, log_file=LOG_FILE, max_bytes=LOG_MAX_BYTES,
+                  backup_count=LOG_BACKUP_COUNT, sample_rate=LOG_SAMPLE_RATE):
+    """Configura o logger raiz com fila e thread de escrita (idempotente)"""
+    global _console_handler
+    if _listeners:
+        return
+    file_handler, _console_handler = _build_handlers(log_file, max_bytes, backup_count)
+    handlers = [file_handler, _console_handler]
+    handler = _QueueHandler(_start_listener(queue.SimpleQueue(), handlers))
+    handler.addFilter(ContextFilter(sample_rate))
+
+    root = logging.getLogger()
+    for old in root.handlers[:]:
+        root.removeHandler(old)
+    root.addHandler(handler)
+    root.setLevel(level)
+    atexit.register(shutdown)
+
+    # A thread não sobrevive a fork (workers do gunicorn com preload): os filhos
+    # enviam os registros ao processo dono em vez de escrever no arquivo
+    if hasattr(os, 'register_at_fork'):
+        child_queue = _start_listener(multiprocessing.get_context('fork').SimpleQueue(), handlers)
+        os.register_at_fork(after_in_child=lambda: _forward_in_child(handler, child_queue))
+
+
+def _forward_in_child(handler, child_queue):
+    # As threads de escrita ficaram no processo dono; netos usam o mesmo pipe
+    _listeners.clear()
+    handler.queue = child_queue
+
+
+def set_console_level(level):
+    """Nível do console (ex.: só avisos durante a ingestão em lote); o arquivo não muda"""
+    if _console_handler is not None:
+        _console_handler.setLevel(level)
+
+
+def shutdown():
+    """Esvazia as filas e encerra as threads de escrita (só no processo dono)"""
+    while _listeners:
+        _listeners.pop().stop()
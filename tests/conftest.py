@@ -0,0 +1,65 @@
+import os
+import sys
+import importlib
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    """Cada teste roda em uma pasta temporária (bancos e pastas relativos ficam nela)"""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def fresh_import(workdir, monkeypatch):
+    """Importa de novo os módulos com armazenamentos globais, abertos na pasta do teste"""
+    monkeypatch.setenv('SNAPSHOTS_ENABLED', '0')
+    monkeypatch.setenv('ADMISSION_FOLDER', str(workdir / 'admissao'))
+    monkeypatch.delenv('DATABASE_URL', raising=False)
+
+    def load(name):
+        for module in ('app', 'bulk_ingest', 'pipeline'):
+            sys.modules.pop(module, None)
+        return importlib.import_module(name)
+
+    return load
+
+
+@pytest.fixture
+def make_pdf(tmp_path):
+    """Cria um PDF com uma página por texto informado; retorna o caminho"""
+    fitz = pytest.importorskip('fitz')
+
+    def make(name, pages):
+        path = tmp_path / name
+        doc = fitz.open()
+        for text in pages:
+            page = doc.new_page()
+            if text:
+                page.insert_text((72, 72), text)
+        doc.save(str(path))
+        doc.close()
+        return str(path)
+
+    return make
+
+
+def make_entry(record_id, content='', nome='documento.pdf', timestamp='2025-04-01T10:00:00', campos=None):
+    """Registro no formato gravado pela aplicação"""
+    return {
+        'id': record_id,
+        'timestamp': timestamp,
+        'created_at': timestamp.replace('T', ' '),
+        'version': '1.0',
+        'data': {
+            'pdf_content': content,
+            'extraction_methods': ['PyMuPDF'],
+            'campos': campos or {},
+            'arquivo': {'nome_original': nome},
+            'status': 'processado'
+        }
+    }
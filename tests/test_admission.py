@@ -0,0 +1,56 @@
+import pytest
+
+import admission
+
+
+def test_rate_limiter_allows_burst_then_waits():
+    limiter = admission.RateLimiter(per_minute=60, burst=2)
+    assert limiter.take('1.2.3.4') == 0
+    assert limiter.take('1.2.3.4') == 0
+    assert limiter.take('1.2.3.4') > 0
+    assert limiter.take('5.6.7.8') == 0
+
+
+def test_slots_are_limited_and_released(tmp_path):
+    controller = admission.AdmissionController(max_concurrent=2, queue_size=0, directory=str(tmp_path))
+    first, _ = controller.acquire()
+    second, _ = controller.acquire()
+    assert first is not None and second is not None
+    assert controller.acquire() == (None, 'fila_cheia')
+    first.release()
+    first.release()  # Idempotente
+    third, reason = controller.acquire()
+    assert third is not None and reason is None
+    second.release()
+    third.release()
+
+
+def test_queue_times_out(tmp_path):
+    controller = admission.AdmissionController(max_concurrent=1, queue_size=1, queue_timeout=0.05,
+                                               directory=str(tmp_path))
+    slot, _ = controller.acquire()
+    waits = []
+    assert controller.acquire(on_wait=waits.append) == (None, 'tempo_fila')
+    assert waits == [1, -1]
+    slot.release()
+
+
+def _flock_spy(monkeypatch):
+    calls = []
+    flock = admission.fcntl.flock
+    monkeypatch.setattr(admission.fcntl, 'flock', lambda handle, flags: (calls.append(flags), flock(handle, flags)))
+    return calls
+
+
+@pytest.mark.parametrize('proc_locks', [True, False])
+def test_in_use_counts_without_exclusive_locks(tmp_path, monkeypatch, proc_locks):
+    if not proc_locks:
+        monkeypatch.setattr(admission, 'PROC_LOCKS', str(tmp_path / 'sem_proc_locks'))
+    controller = admission.AdmissionController(max_concurrent=3, queue_size=0, directory=str(tmp_path))
+    slots = [controller.acquire()[0] for _ in range(2)]
+    calls = _flock_spy(monkeypatch)
+    assert controller.state()['em_processamento'] == 2
+    assert not [flags for flags in calls if flags & admission.fcntl.LOCK_EX]
+    for slot in slots:
+        slot.release()
+
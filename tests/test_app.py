@@ -0,0 +1,96 @@
+import io
+import time
+
+import pytest
+
+INVALID_PDF = b'%PDF-1.4\nsem paginas\n%%EOF\n'
+
+
+@pytest.fixture
+def app_module(fresh_import, monkeypatch):
+    monkeypatch.setenv('ADMISSION_ENABLED', '0')
+    return fresh_import('app')
+
+
+@pytest.fixture
+def async_app(fresh_import, monkeypatch):
+    monkeypatch.setenv('ADMISSION_ENABLED', '0')
+    monkeypatch.setenv('INGEST_MODE', 'async')
+    monkeypatch.setenv('EXTRACTION_WORKERS', '1')
+    module = fresh_import('app')
+    yield module
+    module.job_queue.shutdown()
+
+
+def _upload(client, content, name='doc.pdf'):
+    return client.post('/upload', data={'pdf_file': (io.BytesIO(content), name)},
+                       content_type='multipart/form-data')
+
+
+def _wait_job(client, job_id, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = client.get(f'/api/jobs/{job_id}').get_json()
+        if job['status'] in ('concluido', 'erro'):
+            return job
+        time.sleep(0.05)
+    raise AssertionError('job não terminou')
+
+
+def test_sync_upload_is_stored_and_searchable(app_module, make_pdf):
+    client = app_module.app.test_client()
+    with open(make_pdf('fatura.pdf', ['Valor total R$ 12,34 da fatura de São Paulo']), 'rb') as f:
+        response = _upload(client, f.read(), 'fatura.pdf')
+    assert response.status_code == 200
+    record_id = response.get_json()['record_id']
+    assert client.get('/api/search?q=sao paulo').get_json()['resultados'][0]['record_id'] == record_id
+    assert 'Valor total' in client.get(f'/api/registros/{record_id}/conteudo').get_json()['pdf_content']
+
+
+def test_search_snippet_escapes_markup_from_the_pdf(app_module, make_pdf):
+    client = app_module.app.test_client()
+    with open(make_pdf('fatura.pdf', ['Fatura <script>alert(1)</script> & energia']), 'rb') as f:
+        assert _upload(client, f.read(), 'fatura.pdf').status_code == 200
+    snippet = client.get('/api/search?q=energia').get_json()['resultados'][0]['trecho']
+    assert snippet.endswith('Fatura &lt;script&gt;alert(1)&lt;/script&gt; &amp; <mark>energia</mark>')
+    assert '<script>' not in snippet
+
+
+def test_sync_invalid_pdf_is_removed(app_module):
+    response = _upload(app_module.app.test_client(), INVALID_PDF)
+    assert response.status_code == 400
+    assert app_module.pdf_store.stats()['pdfs'] == 0
+
+
+def test_async_job_rejected_by_validation_removes_its_pdf(async_app):
+    client = async_app.app.test_client()
+    response = _upload(client, INVALID_PDF)
+    assert response.status_code == 202
+    job = _wait_job(client, response.get_json()['job_id'])
+    assert job['status'] == 'erro'
+    assert async_app.pdf_store.stats()['pdfs'] == 0
+
+
+def test_async_job_keeps_pdf_on_success(async_app, make_pdf):
+    client = async_app.app.test_client()
+    with open(make_pdf('ok.pdf', ['Conteudo valido do documento ' * 3]), 'rb') as f:
+        response = _upload(client, f.read(), 'ok.pdf')
+    job = _wait_job(client, response.get_json()['job_id'])
+    assert job['status'] == 'concluido'
+    assert async_app.pdf_store.stats()['pdfs'] == 1
+
+
+def test_async_upload_keeps_its_admission_slot_until_the_job_ends(fresh_import, monkeypatch, make_pdf):
+    import admission
+    monkeypatch.setattr(admission, 'ADMISSION_ENABLED', True)
+    monkeypatch.setenv('INGEST_MODE', 'async')
+    module = fresh_import('app')
+    finish = []
+    monkeypatch.setattr(module.job_queue, 'submit',
+                        lambda *args, context=None, on_done=None: finish.append(on_done) or 'job-1')
+    with open(make_pdf('doc.pdf', ['Conteudo do documento ' * 5]), 'rb') as f:
+        response = _upload(module.app.test_client(), f.read())
+    assert response.status_code == 202
+    assert module.admission_controller.state()['em_processamento'] == 1
+    finish[0]({'id': 'job-1'})
+    assert module.admission_controller.state()['em_processamento'] == 0
@@ -0,0 +1,37 @@
+import os
+import sys
+
+
+def test_does_not_load_the_web_app(fresh_import):
+    fresh_import('bulk_ingest')
+    assert 'app' not in sys.modules
+
+
+def test_files_are_copied_into_the_blob_store(fresh_import, make_pdf, tmp_path):
+    origem = tmp_path / 'origem'
+    origem.mkdir()
+    for i in range(3):
+        os.replace(make_pdf(f'doc{i}.pdf', [f'Documento numero {i} ' * 5]), origem / f'doc{i}.pdf')
+    bulk_ingest = fresh_import('bulk_ingest')
+
+    assert bulk_ingest.main([str(origem), '--workers', '1']) == 0
+    entries = list(sys.modules['pipeline'].record_store.iter_recent())
+    assert len(entries) == 3
+    for entry in entries:
+        arquivo = entry['data']['arquivo']
+        assert arquivo['caminho'] == sys.modules['pipeline'].pdf_store.path(arquivo['sha256'])
+        assert arquivo['caminho_origem'].startswith(str(origem))
+    # Os registros continuam válidos sem o diretório de origem
+    for path in origem.iterdir():
+        path.unlink()
+    assert all(os.path.exists(entry['data']['arquivo']['caminho']) for entry in entries)
+
+
+def test_invalid_pdf_is_not_kept_in_the_blob_store(fresh_import, tmp_path):
+    origem = tmp_path / 'origem'
+    origem.mkdir()
+    (origem / 'quebrado.pdf').write_bytes(b'%PDF-1.4\nnao e um pdf\n%%EOF\n')
+    bulk_ingest = fresh_import('bulk_ingest')
+
+    assert bulk_ingest.main([str(origem), '--workers', '1']) == 1
+    assert sys.modules['pipeline'].pdf_store.stats()['pdfs'] == 0
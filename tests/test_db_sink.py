@@ -0,0 +1,63 @@
+import json
+import sqlite3
+import time
+
+import db_sink
+from conftest import make_entry
+from db_sink import CAMPOS_TABLE, TABLE_NAME, DatabaseSink, record_to_field_rows
+
+
+def _wait_written(sink, count, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if sink.stats['gravados'] >= count:
+            return
+        time.sleep(0.02)
+    raise AssertionError('lotes não gravados')
+
+
+def test_batches_are_written_by_the_flush_threads(workdir):
+    sink = DatabaseSink('sqlite:///sink.db', batch_size=2, flush_interval=60, pool_size=2)
+    for i in range(5):
+        sink.submit(make_entry(f'registro-{i}', content=f'texto {i}'))
+    sink.flush()
+    _wait_written(sink, 5)
+    assert len(sink._threads) == 2
+    with sqlite3.connect(str(workdir / 'sink.db')) as conn:
+        assert conn.execute(f'SELECT COUNT(*) FROM {TABLE_NAME}').fetchone()[0] == 5
+
+
+def test_dead_letter_io_does_not_hold_the_buffer_lock(workdir, monkeypatch):
+    sink = DatabaseSink('sqlite:///sink.db', dead_letter_file=str(workdir / 'dead.jsonl'))
+    held = []
+
+    def spy_open(*args, **kwargs):
+        held.append(sink._lock.locked())
+        return open(*args, **kwargs)
+
+    monkeypatch.setattr(db_sink, 'open', spy_open, raising=False)
+    sink._dead_letter([make_entry('registro-1'), make_entry('registro-2')])
+    assert held == [False]
+    with open(workdir / 'dead.jsonl', encoding='utf-8') as f:
+        assert [json.loads(line)['id'] for line in f] == ['registro-1', 'registro-2']
+    assert sink.stats['dead_letter'] == 2
+
+
+def test_structured_fields_are_written_typed(workdir):
+    sink = DatabaseSink('sqlite:///sink.db', pool_size=1,
+                        field_types={'valor_total': 'decimal', 'vencimento': 'data', 'conta': 'codigo'})
+    campos = {'valor_total': '1234.56', 'vencimento': '2025-07-10', 'conta': '00123', 'uf': None}
+    sink.submit(make_entry('registro-1', campos=campos))
+    sink.flush()
+    _wait_written(sink, 1)
+    with sqlite3.connect(str(workdir / 'sink.db')) as conn:
+        rows = conn.execute(f'SELECT campo, tipo, valor_texto, valor_numero, valor_data FROM {CAMPOS_TABLE} '
+                            'ORDER BY campo').fetchall()
+    assert rows == [('conta', 'codigo', '00123', None, None),
+                    ('valor_total', 'decimal', None, 1234.56, None),
+                    ('vencimento', 'data', None, None, '2025-07-10')]
+
+
+def test_value_not_matching_its_type_is_kept_as_text():
+    rows = record_to_field_rows(make_entry('r1', campos={'vencimento': 'julho'}), {'vencimento': 'data'})
+    assert rows == [('r1', 'vencimento', 'texto', 'julho', None, None)]
@@ -0,0 +1,39 @@
+import csv
+import io
+import json
+
+from conftest import make_entry
+from db_sink import COLUMNS
+from export import csv_lines, mysql_literal, ndjson_lines, sql_dump
+
+
+def test_mysql_literal_escapes():
+    assert mysql_literal(None) == 'NULL'
+    assert mysql_literal(True) == '1'
+    assert mysql_literal("d'água\n") == "'d\\'água\\n'"
+
+
+def test_ndjson_round_trip():
+    entries = [make_entry('r1', 'texto'), make_entry('r2', 'outro')]
+    assert [json.loads(line) for line in ndjson_lines(entries)] == entries
+
+
+def test_csv_has_header_and_one_row_per_record():
+    rows = list(csv.reader(io.StringIO(''.join(csv_lines([make_entry('r1', 'texto', campos={'uf': 'SP'})])))))
+    assert rows[0][:len(COLUMNS)] == list(COLUMNS)
+    assert len(rows) == 2
+    assert json.loads(rows[1][rows[0].index('campos')]) == {'uf': 'SP'}
+
+
+def test_sql_dump_splits_inserts_by_batch():
+    dump = ''.join(sql_dump([make_entry(f'r{i}', 'texto') for i in range(5)], batch_rows=2))
+    assert dump.count('INSERT INTO') == 3
+    assert dump.count('ON DUPLICATE KEY UPDATE') == 3
+
+
+def test_sql_dump_inserts_typed_fields():
+    entry = make_entry('r1', 'texto', campos={'valor_total': '10.50', 'uf': 'SP'})
+    dump = ''.join(sql_dump([entry], field_types={'valor_total': 'decimal'}))
+    assert 'CREATE TABLE IF NOT EXISTS registros_pdf_campos' in dump
+    assert "('r1', 'valor_total', 'decimal', NULL, '10.50', NULL)" in dump
+    assert "('r1', 'uf', 'texto', 'SP', NULL, NULL)" in dump
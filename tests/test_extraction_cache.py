@@ -0,0 +1,62 @@
+import multiprocessing
+import sqlite3
+
+from extraction_cache import ExtractionCache
+
+
+def test_hit_and_miss_counters():
+    cache = ExtractionCache('cache.db', {'PyMuPDF': '1.0'})
+    assert cache.get('a' * 64) is None
+    cache.put('a' * 64, 'texto', ['PyMuPDF'])
+    assert cache.get('a' * 64) == ('texto', ['PyMuPDF'])
+    stats = cache.stats()
+    assert (stats['acertos'], stats['falhas'], stats['entradas']) == (1, 1, 1)
+
+
+def test_engine_versions_are_part_of_the_key():
+    ExtractionCache('cache.db', {'PyMuPDF': '1.0'}).put('a' * 64, 'texto', ['PyMuPDF'])
+    assert ExtractionCache('cache.db', {'PyMuPDF': '2.0'}).get('a' * 64) is None
+
+
+def test_lru_eviction_keeps_recent_entries():
+    cache = ExtractionCache('cache.db', {}, max_bytes=25)
+    for i, sha in enumerate('abc'):
+        cache.put(sha * 64, str(i) * 10, ['PyMuPDF'])
+    assert cache.get('a' * 64) is None
+    assert cache.get('c' * 64) == ('2' * 10, ['PyMuPDF'])
+    assert cache.stats()['bytes'] <= 25
+
+
+def test_lookups_do_not_write_until_flushed():
+    cache = ExtractionCache('cache.db', {})
+    cache.put('a' * 64, 'texto', ['PyMuPDF'])
+    observer = sqlite3.connect('cache.db')
+    before = observer.execute('PRAGMA data_version').fetchone()[0]
+    for _ in range(10):
+        cache.get('a' * 64)
+        cache.get('b' * 64)
+    assert observer.execute('PRAGMA data_version').fetchone()[0] == before
+    assert (cache.stats()['acertos'], cache.stats()['falhas']) == (10, 10)
+    assert observer.execute('PRAGMA data_version').fetchone()[0] != before
+    observer.close()
+
+
+def test_pending_access_protects_entry_from_eviction():
+    cache = ExtractionCache('cache.db', {}, max_bytes=25)
+    cache.put('a' * 64, 'a' * 10, ['PyMuPDF'])
+    cache.put('b' * 64, 'b' * 10, ['PyMuPDF'])
+    assert cache.get('a' * 64) is not None  # Acesso ainda só em memória
+    cache.put('c' * 64, 'c' * 10, ['PyMuPDF'])
+    assert cache.get('a' * 64) is not None
+    assert cache.get('b' * 64) is None
+    assert cache.stats()['remocoes'] == 1
+
+
+def test_lookups_in_a_child_process_are_written_before_it_exits():
+    cache = ExtractionCache('cache.db', {})
+    cache.put('a' * 64, 'texto', ['PyMuPDF'])
+    # Filho do pool: sai por os._exit, sem atexit
+    child = multiprocessing.get_context('fork').Process(target=cache.get, args=('a' * 64,))
+    child.start()
+    child.join()
+    assert cache.stats()['acertos'] == 1
@@ -0,0 +1,37 @@
+from datetime import date
+from decimal import Decimal
+
+from field_extraction import FieldExtractor, to_date, to_decimal
+
+TEXTO = """Vencimento: 15/04/2025
+Conta contrato nº 10.803.604
+Consumo do mês: 1.234 kWh
+Valor total R$ 1.234,56
+"""
+NOME = 'SP - SAO PAULO - SETE PRAIAS - 20582 - 10803604 - 01_04_2025.pdf'
+
+
+def test_converters():
+    assert to_decimal('1.234,56') == Decimal('1234.56')
+    assert to_decimal('1234.56') == Decimal('1234.56')
+    assert to_date('04/2025') == date(2025, 4, 1)
+    assert to_date('31/02/2025') is None
+
+
+def test_typed_row_from_text_and_filename():
+    row = FieldExtractor().extract(TEXTO, NOME)
+    assert row['valor_total'] == Decimal('1234.56')
+    assert row['vencimento'] == date(2025, 4, 15)
+    assert row['consumo_kwh'] == Decimal('1234')
+    assert row['uf'] == 'SP'
+    assert row['codigo_unidade'] == '20582'
+    # O nome do arquivo tem prioridade nos campos repetidos
+    assert row['conta'] == '10803604'
+    assert row['referencia'] == date(2025, 4, 1)
+
+
+def test_json_row_is_serializable():
+    row = FieldExtractor().extract_json(TEXTO, 'sem padrao.pdf')
+    assert row['valor_total'] == '1234.56'
+    assert row['vencimento'] == '2025-04-15'
+    assert row['uf'] is None
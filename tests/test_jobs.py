@@ -0,0 +1,57 @@
+import time
+
+from jobs import STATUS_CONCLUIDO, STATUS_ERRO, ExtractionJobQueue
+
+
+def _double(value):
+    if value < 0:
+        raise ValueError('valor negativo')
+    return value * 2
+
+
+def _wait(queue, job_id, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = queue.get(job_id)
+        if job['status'] in (STATUS_CONCLUIDO, STATUS_ERRO):
+            return job
+        time.sleep(0.02)
+    raise AssertionError('job não terminou')
+
+
+def test_completed_job_calls_on_complete(tmp_path):
+    queue = ExtractionJobQueue(_double, str(tmp_path / 'jobs'), max_workers=1,
+                               on_complete=lambda job, result: f"registro-{result}")
+    try:
+        job = _wait(queue, queue.submit(21, context={'arquivo': {'nome_original': 'a.pdf'}}))
+    finally:
+        queue.shutdown()
+    assert job['status'] == STATUS_CONCLUIDO
+    assert (job['resultado'], job['record_id']) == (42, 'registro-42')
+
+
+def test_failed_job_calls_on_error(tmp_path):
+    errors = []
+    queue = ExtractionJobQueue(_double, str(tmp_path / 'jobs'), max_workers=1,
+                               on_error=lambda job, error: errors.append((job['contexto'], type(error))))
+    try:
+        job = _wait(queue, queue.submit(-1, context={'novo': True}))
+    finally:
+        queue.shutdown()
+    assert job['status'] == STATUS_ERRO
+    assert job['erro'] == 'valor negativo'
+    assert errors == [({'novo': True}, ValueError)]
+
+
+def test_on_done_runs_after_success_and_failure(tmp_path):
+    done = []
+    queue = ExtractionJobQueue(_double, str(tmp_path / 'jobs'), max_workers=1)
+    try:
+        ok = _wait(queue, queue.submit(1, on_done=lambda job: done.append(job['id'])))
+        failed = _wait(queue, queue.submit(-1, on_done=lambda job: done.append(job['id'])))
+        deadline = time.monotonic() + 5
+        while len(done) < 2 and time.monotonic() < deadline:
+            time.sleep(0.02)
+    finally:
+        queue.shutdown()
+    assert sorted(done) == sorted([ok['id'], failed['id']])
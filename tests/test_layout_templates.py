@@ -0,0 +1,44 @@
+import pytest
+
+import layout_templates
+import sandbox
+from layout_templates import LayoutTemplates, learn
+from pdf_extraction import TEMPLATE_METHOD, extract_text_and_methods, template_regions
+
+FATURA = 'Valor total: R$ 1.234,56\nVencimento: 10/07/2025\nObservacao sem campo'
+
+
+@pytest.fixture
+def templated_pdf(make_pdf, monkeypatch):
+    """PDF de um emissor com modelo de layout aprendido e ativo"""
+    monkeypatch.setattr(sandbox, 'SANDBOX_ENABLED', False)
+    path = make_pdf('fatura.pdf', [FATURA])
+    templates = LayoutTemplates()
+    templates.add(learn('energia', [path]))
+    monkeypatch.setattr(layout_templates, '_active', templates)
+    return path
+
+
+def test_template_text_keeps_each_region(templated_pdf):
+    text, methods = extract_text_and_methods(templated_pdf)
+    assert methods == [TEMPLATE_METHOD]
+    modelo, regions = template_regions(text)
+    assert modelo == 'energia'
+    assert regions['valor_total'] == 'Valor total: R$ 1.234,56'
+    assert regions['vencimento'] == 'Vencimento: 10/07/2025'
+
+
+def test_templated_record_is_flagged_partial_with_region_fields(templated_pdf, fresh_import):
+    pipeline = fresh_import('pipeline')
+    text, methods = extract_text_and_methods(templated_pdf)
+    data = pipeline.extracted_data(text, methods, 'fatura.pdf')
+    assert data['conteudo_parcial'] is True
+    assert data['modelo_layout'] == 'energia'
+    assert data['campos']['valor_total'] == '1234.56'
+    assert data['campos']['vencimento'] == '2025-07-10'
+
+
+def test_chain_extraction_is_not_flagged(make_pdf, fresh_import):
+    pipeline = fresh_import('pipeline')
+    text, methods = extract_text_and_methods(make_pdf('outro.pdf', [FATURA]))
+    assert 'conteudo_parcial' not in pipeline.extracted_data(text, methods, 'outro.pdf')
@@ -0,0 +1,85 @@
+import pytest
+
+import pdf_extraction
+import sandbox
+from extraction_engines import ENGINES, Engine, register
+from pdf_extraction import count_pages, extract_text_and_methods, iter_pages, page_quality
+
+
+def test_page_quality():
+    assert page_quality('') == 0.0
+    assert page_quality('texto legível ' * 10) == 1.0
+    assert page_quality('�' * 50) == 0.0
+
+
+def test_count_pages(make_pdf):
+    assert count_pages(make_pdf('tres.pdf', ['um', 'dois', 'três'])) == 3
+
+
+def test_iter_pages_in_order_with_small_window(make_pdf):
+    path = make_pdf('paginas.pdf', [f'Conteudo da pagina {i} ' * 5 for i in range(1, 6)])
+    pages = list(iter_pages(path, window=2))
+    assert [page for page, *_ in pages] == [1, 2, 3, 4, 5]
+    assert all(engine == 'PyMuPDF' for _, engine, _, _ in pages)
+
+
+def test_extract_text_and_methods(make_pdf):
+    text, methods = extract_text_and_methods(make_pdf('doc.pdf', ['Valor total R$ 10,00 ' * 3]))
+    assert methods == ['PyMuPDF']
+    assert text.startswith('[Métodos de extração utilizados: PyMuPDF]')
+    assert '--- Página 1 (PyMuPDF) ---' in text
+
+
+def _slow_pages(module, pdf_path, page_numbers):
+    module.sleep(30)
+
+
+def _slow_count(module, pdf_path):
+    module.sleep(30)
+
+
+@pytest.fixture
+def hung_engine(monkeypatch):
+    """Motor mais barato da cadeia que nunca responde dentro do prazo; retorna os tempos limite registrados"""
+    monkeypatch.setattr(sandbox, 'SANDBOX_ENABLED', True)
+    monkeypatch.setenv('EXTRACTION_ENGINES', 'Lento,PyMuPDF')
+    monkeypatch.setenv('ENGINE_TIMEOUT_LENTO', '0.3')
+    register(Engine('Lento', 'time', 'motor-lento', _slow_pages, {'texto', 'contagem'}, cost=0, count=_slow_count))
+    # Workers ociosos criados antes do registro não conhecem o motor
+    sandbox.shutdown()
+    timeouts = []
+    original = pdf_extraction._record_timeout
+    monkeypatch.setattr(pdf_extraction, '_record_timeout',
+                        lambda engine, path, error: (timeouts.append(engine.name), original(engine, path, error)))
+    yield timeouts
+    del ENGINES['Lento']
+    sandbox.shutdown()
+
+
+def test_hung_engine_times_out_once_per_document(hung_engine, make_pdf):
+    text, methods = extract_text_and_methods(make_pdf('doc.pdf', ['Conteudo do documento ' * 5]))
+    assert methods == ['PyMuPDF']
+    assert hung_engine == ['Lento']
+
+
+def test_validation_and_extraction_share_timeouts(hung_engine, make_pdf, fresh_import):
+    pipeline = fresh_import('pipeline')
+    result = pipeline.process_pdf_job(make_pdf('doc.pdf', ['Conteudo do documento ' * 5]), 'a' * 64)
+    assert result['extraction_methods'] == ['PyMuPDF']
+    assert hung_engine == ['Lento']
+
+
+def test_page_count_and_first_pages_come_from_one_open(monkeypatch, make_pdf):
+    monkeypatch.setattr(sandbox, 'SANDBOX_ENABLED', False)
+    engine = ENGINES['PyMuPDF']
+    calls = []
+    monkeypatch.setattr(engine, 'count_func', lambda module, path: calls.append('contagem'))
+    monkeypatch.setattr(engine, 'pages_func', lambda module, path, pages: calls.append('paginas'))
+    text, methods = extract_text_and_methods(make_pdf('doc.pdf', ['Conteudo do documento ' * 5] * 3), max_pages=5)
+    assert methods == ['PyMuPDF']
+    assert calls == []
+
+
+def test_validation_happens_during_extraction(make_pdf):
+    with pytest.raises(ValueError, match='máximo 2 páginas'):
+        extract_text_and_methods(make_pdf('grande.pdf', ['um', 'dois', 'três']), max_pages=2)
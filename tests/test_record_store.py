@@ -0,0 +1,45 @@
+import pytest
+
+from conftest import make_entry
+from record_store import RecordStore
+
+
+def test_append_and_get_round_trip():
+    store = RecordStore('registros.db')
+    store.append(make_entry('r1', 'texto extraído', campos={'uf': 'SP'}))
+    entry = store.get('r1')
+    assert entry['data']['pdf_content'] == 'texto extraído'
+    assert entry['data']['campos'] == {'uf': 'SP'}
+    assert store.get_content('r1') == 'texto extraído'
+    assert store.get('inexistente') is None
+
+
+def test_identical_texts_are_stored_once():
+    store = RecordStore('registros.db')
+    store.append_many([make_entry('r1', 'mesmo texto'), make_entry('r2', 'mesmo texto')])
+    assert store._conn().execute('SELECT COUNT(*) FROM text_blobs').fetchone()[0] == 1
+
+
+def test_list_page_cursor_walks_all_records():
+    store = RecordStore('registros.db')
+    store.append_many([make_entry(f'r{i}', f'texto {i}', timestamp=f'2025-04-01T10:00:{i:02d}')
+                       for i in range(7)])
+    seen, cursor = [], None
+    while True:
+        items, cursor = store.list_page(limit=3, cursor=cursor)
+        seen.extend(item['id'] for item in items)
+        if cursor is None:
+            break
+    assert seen == [f'r{i}' for i in reversed(range(7))]
+
+
+def test_invalid_cursor_raises_value_error():
+    with pytest.raises(ValueError):
+        RecordStore('registros.db').list_page(cursor='invalido')
+
+
+def test_seq_range_follows_write_order():
+    store = RecordStore('registros.db')
+    store.append_many([make_entry(f'r{i}') for i in range(5)])
+    assert store.max_seq() == 5
+    assert [entry['id'] for entry in store.iter_seq_range(2, 4)] == ['r2', 'r3']
@@ -0,0 +1,21 @@
+import os
+
+import pytest
+
+import sandbox
+
+
+@pytest.fixture(autouse=True)
+def stop_workers():
+    yield
+    sandbox.shutdown()
+
+
+@pytest.mark.skipif(not sandbox._FORKSERVER, reason='sem forkserver nesta plataforma')
+def test_workers_are_not_forked_from_the_caller():
+    assert sandbox.run(os.getppid, timeout=30) != os.getpid()
+
+
+def test_calls_use_the_caller_working_directory(workdir):
+    (workdir / 'relativo.txt').write_text('conteúdo', encoding='utf-8')
+    assert sandbox.run(os.path.getsize, 'relativo.txt', timeout=30) == len('conteúdo'.encode('utf-8'))
@@ -0,0 +1,60 @@
+import sqlite3
+
+from conftest import make_entry
+from search_index import SearchIndex, build_match_query, make_snippet
+
+
+def test_accents_and_case_are_ignored():
+    contents = {'r1': 'Fatura de energia de São Paulo'}
+    index = SearchIndex('busca.db', content_loader=contents.get)
+    index.add(make_entry('r1', contents['r1'], nome='fatura.pdf'))
+    results, total = index.search('sao paulo')
+    assert total == 1
+    assert results[0]['record_id'] == 'r1'
+    assert results[0]['nome_original'] == 'fatura.pdf'
+    assert results[0]['trecho'] == 'Fatura de energia de <mark>São</mark> <mark>Paulo</mark>'
+
+
+def test_numbers_match_with_any_formatting():
+    index = SearchIndex('busca.db')
+    index.add(make_entry('r1', 'Conta 10.803.604 vencida'))
+    assert index.search('10803604')[1] == 1
+    assert index.search('10.803.604')[1] == 1
+
+
+def test_phrase_and_prefix_queries():
+    assert build_match_query('"valor total" ener*') == '"valor total" AND "ener"*'
+    index = SearchIndex('busca.db')
+    index.add_many([make_entry('r1', 'valor total da energia'), make_entry('r2', 'total do valor')])
+    assert [r['record_id'] for r in index.search('"valor total"')[0]] == ['r1']
+    assert index.search('ener*')[1] == 1
+
+
+def test_rebuild_replaces_the_index():
+    index = SearchIndex('busca.db')
+    index.add(make_entry('antigo', 'registro removido'))
+    assert index.rebuild([make_entry('novo', 'registro atual')]) == 1
+    assert index.search('removido')[1] == 0
+    assert index.search('atual')[1] == 1
+
+
+def test_index_does_not_keep_a_copy_of_the_text():
+    index = SearchIndex('busca.db')
+    index.add(make_entry('r1', 'conteudo extraido do documento'))
+    with sqlite3.connect('busca.db') as conn:
+        assert conn.execute('SELECT conteudo FROM docs').fetchall() == [(None,)]
+    assert index.search('documento')[0][0]['record_id'] == 'r1'
+
+
+def test_old_index_with_text_copy_is_recreated():
+    with sqlite3.connect('busca.db') as conn:
+        conn.execute('CREATE VIRTUAL TABLE docs USING fts5(record_id UNINDEXED, nome, conteudo, numeros)')
+    index = SearchIndex('busca.db')
+    assert not index.existed
+    assert index.rebuild([make_entry('r1', 'registro migrado')]) == 1
+    assert index.search('migrado')[1] == 1
+
+
+def test_snippet_marks_numbers_and_prefixes():
+    content = 'Conta 10.803.604 com energia ativa'
+    assert make_snippet(content, '10803604 ener*') == 'Conta <mark>10.803.604</mark> com <mark>energia</mark> ativa'
@@ -0,0 +1,21 @@
+from conftest import make_entry
+from record_store import RecordStore
+from snapshot import SnapshotManager, list_snapshots, restore
+
+
+def test_incremental_snapshots_restore_everything(tmp_path):
+    store = RecordStore('registros.db')
+    manager = SnapshotManager(store, str(tmp_path / 'backups'), full_every=10)
+    store.append_many([make_entry(f'r{i}', f'texto {i}') for i in range(3)])
+    first = manager.take()
+    assert first.full and (first.start, first.end) == (0, 3)
+    assert manager.take() is None  # Nada novo
+
+    store.append(make_entry('r3', 'texto 3'))
+    second = manager.take()
+    assert not second.full and (second.start, second.end) == (3, 4)
+    assert len(list_snapshots(str(tmp_path / 'backups'))) == 2
+
+    restored = RecordStore('restaurado.db')
+    assert restore(str(tmp_path / 'backups'), restored) == (2, 4)
+    assert restored.get('r3')['data']['pdf_content'] == 'texto 3'
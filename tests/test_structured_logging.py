@@ -0,0 +1,32 @@
+import json
+import subprocess
+import sys
+import textwrap
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def test_forked_children_send_records_to_the_owner(workdir):
+    # Em um interpretador separado: setup_logging troca os handlers do logger raiz
+    script = textwrap.dedent('''
+        import logging, os, sys
+        import structured_logging
+
+        structured_logging.setup_logging(log_file='app.log')
+        pid = os.fork()
+        if pid == 0:
+            logging.getLogger('filho').warning('registro do filho')
+            os._exit(0 if not structured_logging._listeners else 1)
+        _, status = os.waitpid(pid, 0)
+        logging.getLogger('pai').warning('registro do pai')
+        structured_logging.shutdown()
+        sys.exit(os.waitstatus_to_exitcode(status))
+    ''')
+    result = subprocess.run([sys.executable, '-c', script], cwd=workdir, capture_output=True,
+                            env={'PYTHONPATH': str(ROOT), 'PATH': ''}, timeout=60)
+    assert result.returncode == 0, result.stderr
+    with open(workdir / 'app.log', encoding='utf-8') as f:
+        records = [json.loads(line) for line in f]
+    assert sorted(r['msg'] for r in records) == ['registro do filho', 'registro do pai']
+    assert len({r['pid'] for r in records}) == 2
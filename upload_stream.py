@@ -0,0 +1,135 @@
+"""
+Recebimento de uploads em passagem única
+O corpo multipart é gravado direto em disco em blocos, calculando tamanho,
+SHA-256, cabeçalho e trailer à medida que os dados chegam
+"""
+
+import os
+import hashlib
+import zipfile
+import tempfile
+from flask import Request
+
+HEAD_SIZE = 1024  # O cabeçalho %PDF- pode aparecer em qualquer ponto do primeiro 1KB
+TAIL_SIZE = 1024  # O marcador %%EOF fica no último 1KB do arquivo
+
+
+class SpooledUpload:
+    """Arquivo temporário em disco que calcula hash e tamanho durante a escrita"""
+
+    def __init__(self, directory):
+        fd, self.path = tempfile.mkstemp(dir=directory, suffix='.part')
+        self._file = os.fdopen(fd, 'w+b')
+        self._sha256 = hashlib.sha256()
+        self.size = 0
+        self.head = b''
+        self.tail = b''
+        self.persisted = False
+
+    def write(self, data):
+        self._file.write(data)
+        self._sha256.update(data)
+        self.size += len(data)
+        if len(self.head) < HEAD_SIZE:
+            self.head += data[:HEAD_SIZE - len(self.head)]
+        if len(data) >= TAIL_SIZE:
+            self.tail = bytes(data[-TAIL_SIZE:])
+        else:
+            self.tail = (self.tail + data)[-TAIL_SIZE:]
+        return len(data)
+
+    @property
+    def sha256(self):
+        return self._sha256.hexdigest()
+
+    def persist(self, dest_path):
+        """Move o arquivo temporário para o destino final, sem copiar os dados"""
+        self._file.close()
+        os.replace(self.path, dest_path)
+        self.path = dest_path
+        self.persisted = True
+
+    def close(self):
+        # Uploads não aproveitados não deixam arquivos .part para trás
+        if not self._file.closed:
+            self._file.close()
+        if not self.persisted and os.path.exists(self.path):
+            os.remove(self.path)
+
+    def __getattr__(self, name):
+        # read/seek/tell/readline etc. são delegados ao arquivo em disco
+        return getattr(self._file, name)
+
+
+def spool_stream(stream, directory, chunk_size=64 * 1024):
+    """Copia um stream arbitrário para um SpooledUpload em blocos"""
+    upload = SpooledUpload(directory)
+    try:
+        for chunk in iter(lambda: stream.read(chunk_size), b''):
+            upload.write(chunk)
+    except Exception:
+        upload.close()
+        raise
+    upload.seek(0)
+    return upload
+
+
+def iter_zip_pdfs(upload, directory, max_member_size, max_members):
+    """Extrai os PDFs de um ZIP um a um para disco; gera (nome, SpooledUpload ou None, erro)
+
+    Cada membro é descompactado em blocos direto para um arquivo temporário,
+    sem carregar o arquivo compactado inteiro na memória.
+    """
+    try:
+        archive = zipfile.ZipFile(upload)
+    except zipfile.BadZipFile:
+        yield getattr(upload, 'filename', 'arquivo.zip'), None, "Arquivo ZIP inválido"
+        return
+    with archive:
+        members = [info for info in archive.infolist() if not info.is_dir()]
+        for count, info in enumerate(members):
+            name = os.path.basename(info.filename)
+            if count >= max_members:
+                yield name, None, f"Limite de {max_members} arquivos por lote excedido"
+                continue
+            if not name.lower().endswith('.pdf'):
+                yield name, None, "Tipo de arquivo não permitido. Use apenas PDF."
+                continue
+            # O tamanho declarado limita a leitura de ZipExtFile (proteção contra ZIP bombs)
+            if info.file_size > max_member_size:
+                yield name, None, "Arquivo muito grande"
+                continue
+            try:
+                with archive.open(info) as member:
+                    spooled = spool_stream(member, directory)
+            except (zipfile.BadZipFile, NotImplementedError, RuntimeError) as e:
+                yield name, None, f"Erro ao descompactar: {str(e)}"
+                continue
+            yield name, spooled, None
+
+
+def check_pdf_envelope(upload):
+    """Verifica o cabeçalho %PDF- e o trailer %%EOF sem abrir o documento"""
+    if b'%PDF-' not in upload.head:
+        return False, "Arquivo não possui cabeçalho PDF válido"
+    if b'%%EOF' not in upload.tail:
+        return False, "PDF truncado ou corrompido (trailer ausente)"
+    return True, None
+
+
+class StreamingRequest(Request):
+    """Request que grava os arquivos enviados direto na pasta de uploads"""
+
+    upload_folder = 'uploads'
+    # Endpoints de envio em lote aceitam corpos maiores que MAX_CONTENT_LENGTH
+    batch_endpoints = ()
+    batch_max_content_length = None
+
+    @property
+    def max_content_length(self):
+        if self.endpoint in self.batch_endpoints:
+            return self.batch_max_content_length
+        return super().max_content_length
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return SpooledUpload(self.upload_folder)